@@ -1,16 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import re
 import string
-import random
 import json
+import logging
+import threading
 from datetime import datetime
 from nltk.chat.util import Chat, reflections
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.pipeline import make_pipeline
-from collections import defaultdict
+
+from inference import InferenceResult, top_k_predictions
+from intent_matcher import IntentMatcher
+from response_cache import ResponseCache
+from learned_index import LearnedIndex
+from learned_store import LearnedPairLog
+from near_duplicates import NearDuplicateIndex
+from retrain_scheduler import RetrainScheduler, ServingModel, fit_tfidf_nb
+from session_store import HistoryFilter
+from session_backends import open_session_store
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
 class NextopsonSupportBot:
     def __init__(self):
@@ -68,15 +76,42 @@ class NextopsonSupportBot:
             ('Property inspection', 'Schedule property visits directly with sellers through our platform. We recommend thorough inspection before proceeding.'),
         ]
         
+        # Predefined patterns (none yet; everything goes through the model)
+        self.pairs = []
+        self.matcher = IntentMatcher(self.pairs, mode='search')
+        
         # Store conversation context
-        self.conversations = defaultdict(list)
+        self.conversations = open_session_store(max_history=5)
         
-        # Store new learned responses
+        # Store new learned responses; the log appends one line per learned pair
         self.learned_responses = []
+        self.learned_log = LearnedPairLog('learned_responses.jsonl')
         
         # Load learned data from file if exists
         self.load_learned_data()
         
+        # Predictions per (cleaned input, model version); retraining bumps the version
+        self.model = ServingModel(None, 0)
+        self.response_cache = ResponseCache(max_size=10000, ttl=3600)
+        
+        # Learned pairs are answerable from this index as soon as they are taught
+        self.learned_index = LearnedIndex()
+        self.learned_index.add_many((self.preprocess_input(q), a) for q, a in self.learned_responses)
+        self._model_lock = threading.Lock()
+        
+        # Paraphrases of known questions are caught before they are learned
+        self.near_duplicates = NearDuplicateIndex(threshold=0.8)
+        for pair in self.train_data:
+            self.near_duplicates.add(self.preprocess_input(pair[0]), pair)
+        
+        # Bursts of /learn calls are folded into one background refit
+        self.retrainer = RetrainScheduler(
+            snapshot=self._training_snapshot,
+            fit=fit_tfidf_nb,
+            validate=self.validate_model,
+            install=self.install_model
+        )
+        
         # Initialize the model
         self.initialize_model()
         
@@ -93,27 +128,60 @@ class NextopsonSupportBot:
         }
 
     def load_learned_data(self):
-        """Load previously learned responses from file"""
+        """Load previously learned responses (newest answer per question) from the log"""
         try:
-            with open('learned_responses.json', 'r') as f:
-                self.learned_responses = json.load(f)
-                # Add learned responses to training data
-                self.train_data.extend(self.learned_responses)
-        except FileNotFoundError:
-            pass
-
-    def save_learned_data(self):
-        """Save learned responses to file"""
-        with open('learned_responses.json', 'w') as f:
-            json.dump(self.learned_responses, f)
+            self.learned_responses = self.learned_log.load()
+            # Add learned responses to training data
+            self.train_data.extend(self.learned_responses)
+        except Exception as e:
+            logger.error(f"Error loading learned responses: {str(e)}")
 
     def learn_new_response(self, question, answer):
-        """Learn new question-answer pair"""
+        """Learn new question-answer pair (answerable at once, folded into the model later).
+
+        A near-duplicate of a known question with the same answer is merged
+        into it rather than learned again; one with a different answer is
+        learned and reported as conflicting.
+        """
         new_pair = (question, answer)
-        self.learned_responses.append(new_pair)
-        self.train_data.append(new_pair)
-        self.save_learned_data()
-        self.initialize_model()
+        cleaned = self.preprocess_input(question)
+        with self._model_lock:
+            matches = self.near_duplicates.query(cleaned)
+            for (known_question, known_answer), similarity in matches:
+                if known_answer == answer:
+                    return {'learned': False, 'duplicate_of': known_question, 'similarity': similarity}
+            self.learned_responses.append(new_pair)
+            self.train_data.append(new_pair)
+            self.learned_index.add(cleaned, answer)
+            self.near_duplicates.add(cleaned, new_pair)
+        self.learned_log.append(question, answer)
+        self.retrainer.request()
+        result = {'learned': True}
+        if matches:
+            (known_question, _), similarity = matches[0]
+            logger.warning(f"Learned answer for {question!r} conflicts with {known_question!r}")
+            result.update({'conflicts_with': known_question, 'similarity': similarity})
+        return result
+
+    def _training_snapshot(self):
+        with self._model_lock:
+            return list(self.train_data)
+
+    def validate_model(self, pipeline, pairs, sample_size=200, tolerance=0.05):
+        """Reject a retrained model whose accuracy on known pairs falls below the current one"""
+        step = max(1, len(pairs) // sample_size)
+        sample = pairs[::step]
+        questions = [question for question, _ in sample]
+        answers = [answer for _, answer in sample]
+        accuracy = sum(p == a for p, a in zip(pipeline.predict(questions), answers)) / len(sample)
+        current = self.model.pipeline
+        if current is None:
+            return True
+        baseline = sum(p == a for p, a in zip(current.predict(questions), answers)) / len(sample)
+        if accuracy < baseline - tolerance:
+            logger.warning(f"Retrained accuracy {accuracy:.2f} is below current {baseline:.2f}")
+            return False
+        return True
 
     def get_topic(self, text):
         """Identify the topic of the conversation"""
@@ -125,16 +193,13 @@ class NextopsonSupportBot:
 
     def maintain_context(self, session_id, user_input, response):
         """Maintain conversation context"""
-        self.conversations[session_id].append({
+        # The store keeps only the last 5 interactions for context
+        self.conversations.append(session_id, {
             'user_input': user_input,
             'bot_response': response,
             'timestamp': datetime.now().isoformat(),
             'topic': self.get_topic(user_input)
         })
-        
-        # Keep only last 5 interactions for context
-        if len(self.conversations[session_id]) > 5:
-            self.conversations[session_id].pop(0)
 
     def get_response_with_context(self, session_id, user_input):
         """Get response considering conversation context"""
@@ -157,54 +222,52 @@ class NextopsonSupportBot:
                 }
             
             # Check predefined patterns
-            for pattern, responses in self.pairs:
-                if re.search(pattern, cleaned_input, re.IGNORECASE):
-                    response = random.choice(responses)
-                    self.maintain_context(session_id, user_input, response)
-                    return {
-                        'response': response,
-                        'confidence': 1,
-                        'needs_learning': False
-                    }
+            response = self.matcher.respond(cleaned_input)
+            if response:
+                self.maintain_context(session_id, user_input, response)
+                return {
+                    'response': response,
+                    'confidence': 1,
+                    'needs_learning': False
+                }
             
             # Get context from previous conversations
-            context = self.conversations.get(session_id, [])
+            context = self.conversations.history(session_id)
             recent_topic = context[-1]['topic'] if context else None
             
-            # Use ML model for prediction
-            vectorized_input = [cleaned_input]
-            try:
-                # Get prediction probabilities
-                proba = self.pipeline.predict_proba(vectorized_input)[0]
-                max_proba = max(proba)
-                
-                if max_proba >= self.confidence_threshold:
-                    predicted_response = self.pipeline.predict(vectorized_input)[0]
-                    
-                    # If the topic matches recent context, increase confidence
-                    if recent_topic and recent_topic == self.get_topic(predicted_response):
-                        max_proba += 0.1
-                    
-                    self.maintain_context(session_id, user_input, predicted_response)
-                    return {
-                        'response': predicted_response,
-                        'confidence': float(max_proba),
-                        'needs_learning': False
-                    }
-                else:
-                    # Low confidence response
-                    return {
-                        'response': "I'm not entirely sure about this. Would you like me to learn the correct response?",
-                        'confidence': float(max_proba),
-                        'needs_learning': True
-                    }
-                
-            except Exception as e:
+            # Use ML model for prediction; recently learned pairs may answer better
+            result = self.infer(cleaned_input)
+            learned, similarity = self.learned_index.lookup(cleaned_input)
+            if learned is not None and similarity > result.confidence:
+                result.top_k = [(learned, similarity)] + result.top_k
+            if not result.top_k:
                 return {
                     'response': "I'm not sure about this. Would you like to teach me the correct response?",
                     'confidence': 0,
                     'needs_learning': True
                 }
+
+            max_proba = result.confidence
+            if max_proba >= self.confidence_threshold:
+                predicted_response = result.prediction
+                
+                # If the topic matches recent context, increase confidence
+                if recent_topic and recent_topic == self.get_topic(predicted_response):
+                    max_proba += 0.1
+                
+                self.maintain_context(session_id, user_input, predicted_response)
+                return {
+                    'response': predicted_response,
+                    'confidence': float(max_proba),
+                    'needs_learning': False
+                }
+            else:
+                # Low confidence response
+                return {
+                    'response': "I'm not entirely sure about this. Would you like me to learn the correct response?",
+                    'confidence': float(max_proba),
+                    'needs_learning': True
+                }
             
         except Exception as e:
             return {
@@ -213,6 +276,25 @@ class NextopsonSupportBot:
                 'needs_learning': True
             }
 
+    def infer(self, cleaned_input, top_k=3):
+        """Classify preprocessed input with a single predict_proba call"""
+        # Read the model once so a concurrent hot-swap cannot change it mid-request
+        model = self.model
+        result = InferenceResult(cleaned_input, model.version)
+        result.normalized_text = cleaned_input
+        key = (cleaned_input, model.version, top_k)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            result.top_k = cached
+            return result
+        with result.timed('predict'):
+            try:
+                result.top_k = top_k_predictions(model.pipeline, [cleaned_input], top_k)[0]
+                self.response_cache.put(key, result.top_k)
+            except Exception:
+                result.top_k = []
+        return result
+
     def preprocess_input(self, text):
         """Clean user input"""
         text = text.lower()
@@ -224,12 +306,24 @@ class NextopsonSupportBot:
         inappropriate_words = set(['fuck', 'shit', 'damn', 'bitch', 'ass'])
         return any(word in text.split() for word in inappropriate_words)
 
+    @property
+    def pipeline(self):
+        return self.model.pipeline
+
+    @property
+    def model_version(self):
+        return self.model.version
+
+    def install_model(self, pipeline):
+        """Atomically serve a fitted pipeline under the next version number"""
+        with self._model_lock:
+            self.model = ServingModel(pipeline, self.model.version + 1)
+        # Entries are keyed by version, so this only frees memory
+        self.response_cache.clear()
+
     def initialize_model(self):
         """Initialize and train the model"""
-        self.pipeline = make_pipeline(TfidfVectorizer(), MultinomialNB())
-        X_train = [x[0] for x in self.train_data]
-        y_train = [x[1] for x in self.train_data]
-        self.pipeline.fit(X_train, y_train)
+        self.install_model(fit_tfidf_nb(self.train_data))
 
 # Initialize bot
 support_bot = NextopsonSupportBot()
@@ -255,8 +349,10 @@ def learn():
     if not question or not answer:
         return jsonify({'error': 'Both question and answer are required'}), 400
     
-    support_bot.learn_new_response(question, answer)
-    return jsonify({'message': 'Successfully learned new response'})
+    result = support_bot.learn_new_response(question, answer)
+    if not result['learned']:
+        return jsonify({'message': 'An equivalent question is already known', **result})
+    return jsonify({'message': 'Successfully learned new response', **result})
 
 @app.route('/conversation_history', methods=['GET'])
 def get_conversation_history():
@@ -264,8 +360,34 @@ def get_conversation_history():
     if not session_id:
         return jsonify({'error': 'Session ID is required'}), 400
     
-    history = support_bot.conversations.get(session_id, [])
-    return jsonify(history)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+        match = HistoryFilter(request.args.get('since'), request.args.get('until'), request.args.get('topic'))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, since or until'}), 400
+    match = match or None
+    store = support_bot.conversations
+    stream = request.args.get('format') == 'jsonl'
+    try:
+        items, next_cursor = store.page(session_id, request.args.get('cursor'), 200 if stream else limit, match)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    if stream:
+        # Stream the whole (filtered) history a page at a time, in constant memory
+        def generate(items, cursor):
+            while True:
+                for item in items:
+                    yield json.dumps(item.to_dict() if hasattr(item, 'to_dict') else item) + '\n'
+                if cursor is None:
+                    return
+                items, cursor = store.page(session_id, cursor, 200, match)
+        return Response(stream_with_context(generate(items, next_cursor)), mimetype='application/x-ndjson')
+    
+    return jsonify({
+        'history': [item.to_dict() if hasattr(item, 'to_dict') else item for item in items],
+        'next_cursor': next_cursor
+    })
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
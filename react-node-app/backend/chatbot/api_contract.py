@@ -0,0 +1,135 @@
+"""Request validation and response bodies shared by the Flask and ASGI apps"""
+import os
+import logging
+from datetime import datetime
+
+import request_log
+
+logger = logging.getLogger(__name__)
+
+# Largest /chat/batch array accepted in one request
+MAX_BATCH_ITEMS = 1000
+
+
+def configure_logging():
+    """Queued logging: text to stderr, sampled JSON lines to LOG_FILE (see request_log.py)"""
+    request_log.configure(
+        path=os.environ.get('LOG_FILE', 'chatbot_api.log'),
+        sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', '1.0')),
+        max_field=int(os.environ.get('LOG_MAX_FIELD_CHARS', '512')),
+        max_bytes=int(os.environ.get('LOG_MAX_BYTES', str(10 * 2 ** 20))),
+        rotate_seconds=float(os.environ.get('LOG_ROTATE_SECONDS', '86400')),
+        backup_count=int(os.environ.get('LOG_BACKUP_COUNT', '7'))
+    )
+
+
+def error_body(message):
+    return {
+        "error": message,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def parse_chat_request(data):
+    """(user_input, user_id, None) for a valid /chat payload, else (None, None, (error body, status))"""
+    if not data:
+        logger.warning("No data provided in request")
+        return None, None, (error_body("No data provided"), 400)
+    user_input = data.get('user_input', '') if isinstance(data, dict) else None
+    if not user_input or not isinstance(user_input, str):
+        logger.warning(f"Invalid user input: {user_input}")
+        return None, None, (error_body("Invalid or missing user input"), 400)
+    return user_input, data.get('user_id', 'default'), None
+
+
+def parse_batch_request(data, max_items=MAX_BATCH_ITEMS):
+    """([(user_input, user_id, error body or None), ...], None) for a /chat/batch payload,
+    else (None, (error body, status)).
+
+    Each element is validated like a /chat payload; an invalid element
+    only fails its own item.
+    """
+    if not isinstance(data, list):
+        logger.warning("Batch request is not a JSON array")
+        return None, (error_body("Expected a JSON array of chat payloads"), 400)
+    if not data:
+        logger.warning("No data provided in batch request")
+        return None, (error_body("No data provided"), 400)
+    if len(data) > max_items:
+        logger.warning(f"Batch of {len(data)} items exceeds {max_items}")
+        return None, (error_body(f"At most {max_items} items per batch"), 413)
+    items = []
+    for item in data:
+        user_input, user_id, error = parse_chat_request(item)
+        items.append((user_input, user_id, error[0] if error else None))
+    return items, None
+
+
+def chat_body(response):
+    return {
+        "response": response,
+        "timestamp": datetime.now().isoformat(),
+        "status": "success"
+    }
+
+
+def batch_body(items, responses):
+    """Per-item results in request order; responses line up with the valid items"""
+    responses = iter(responses)
+    results = []
+    for _, _, error in items:
+        if error:
+            results.append({"error": error["error"], "status": "error"})
+        else:
+            results.append({"response": next(responses), "status": "success"})
+    return {
+        "results": results,
+        "timestamp": datetime.now().isoformat(),
+        "status": "success"
+    }
+
+
+def health_body(chatbot, **extra):
+    body = {
+        "status": "healthy",
+        "response_cache": chatbot.response_cache.stats(),
+        "sessions": chatbot.conversation_memory.stats()
+    }
+    if getattr(chatbot, 'batcher', None) is not None:
+        body["micro_batching"] = chatbot.batcher.stats()
+    if getattr(chatbot, 'inference_pool', None) is not None:
+        body["inference_pool"] = chatbot.inference_pool.stats()
+    body["logging"] = request_log.stats()
+    body.update(extra)
+    body["timestamp"] = datetime.now().isoformat()
+    return body
+
+
+def docs_body():
+    return {
+        "name": "Nextopson Chatbot API",
+        "version": "1.0",
+        "endpoints": {
+            "/chat": {
+                "method": "POST",
+                "description": "Send a message to the chatbot",
+                "payload": {
+                    "user_input": "string (required)",
+                    "user_id": "string (optional)"
+                }
+            },
+            "/chat/batch": {
+                "method": "POST",
+                "description": f"Send up to {MAX_BATCH_ITEMS} messages at once; results come back in order",
+                "payload": [{
+                    "user_input": "string (required)",
+                    "user_id": "string (optional)"
+                }]
+            },
+            "/health": {
+                "method": "GET",
+                "description": "Check API health status"
+            }
+        },
+        "timestamp": datetime.now().isoformat()
+    }
@@ -1,49 +1,65 @@
 # app.py
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import sys
+import time
 import logging
-from datetime import datetime
+from startup_report import StartupReport
 
-# Import the NextopsonSupportBot class
-from nextopson_bot import NextopsonSupportBot, initialize_bot
+# `python app.py --startup-report` prints per-phase wall time and RSS, then exits
+startup = StartupReport(enabled='--startup-report' in sys.argv)
+
+with startup.phase('import flask'):
+    from flask import Flask, jsonify, request, g
+    from flask_cors import CORS
+
+with startup.phase('import api_contract'):
+    import request_log
+    from api_contract import (configure_logging, parse_chat_request, parse_batch_request, chat_body, batch_body,
+                              error_body, health_body, docs_body)
+
+# The bot is shared per process through the provider
+with startup.phase('import nextopson_bot'):
+    from bot_provider import get_bot
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('chatbot_api.log'),
-        logging.StreamHandler()
-    ]
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app and chatbot
 app = Flask(__name__)
 CORS(app)
 
-# Initialize the chatbot
+# Initialize the chatbot (built once per process, before fork under gunicorn --preload)
 try:
-    chatbot = initialize_bot()
+    chatbot = get_bot(startup)
+    with startup.phase('warmup'):
+        chatbot.warmup()
     logger.info("Chatbot initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize chatbot: {str(e)}")
     raise
 
-# Request logging middleware
+# Request logging middleware: one sampled JSON record per request, written off the request path
 @app.before_request
-def log_request_info():
-    logger.info('Headers: %s', request.headers)
-    logger.info('Body: %s', request.get_data())
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def log_request_info(response):
+    if request_log.sampled(response.status_code):
+        request_log.log_request(
+            request.method, request.path, response.status_code,
+            time.perf_counter() - g.get('request_started', time.perf_counter()),
+            remote=request.remote_addr,
+            user_agent=request.user_agent.string,
+            body=request.get_data(cache=True)
+        )
+    return response
 
 # Error handler for all exceptions
 @app.errorhandler(Exception)
 def handle_error(error):
     logger.error(f"An error occurred: {str(error)}", exc_info=True)
-    return jsonify({
-        "error": "An internal server error occurred",
-        "timestamp": datetime.now().isoformat()
-    }), 500
+    return jsonify(error_body("An internal server error occurred")), 500
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -58,75 +74,64 @@ def chat():
     """
     try:
         # Get and validate request data
-        data = request.get_json()
-        if not data:
-            logger.warning("No data provided in request")
-            return jsonify({
-                "error": "No data provided",
-                "timestamp": datetime.now().isoformat()
-            }), 400
-        
-        # Extract and validate user input
-        user_input = data.get('user_input', '')
-        if not user_input or not isinstance(user_input, str):
-            logger.warning(f"Invalid user input: {user_input}")
-            return jsonify({
-                "error": "Invalid or missing user input",
-                "timestamp": datetime.now().isoformat()
-            }), 400
-        
-        # Extract optional user ID
-        user_id = data.get('user_id', 'default')
+        user_input, user_id, error = parse_chat_request(request.get_json())
+        if error:
+            body, status = error
+            return jsonify(body), status
         
         # Get response from chatbot
-        logger.info(f"Processing chat request - User ID: {user_id}, Input: {user_input}")
+        logger.debug(f"Processing chat request - User ID: {user_id}, Input: {user_input}")
         response = chatbot.get_response(user_input, user_id)
         
         # Return response
-        return jsonify({
-            "response": response,
-            "timestamp": datetime.now().isoformat(),
-            "status": "success"
-        })
+        return jsonify(chat_body(response))
     
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
-        return jsonify({
-            "error": "An error occurred processing your request",
-            "timestamp": datetime.now().isoformat()
-        }), 500
+        return jsonify(error_body("An error occurred processing your request")), 500
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """
+    Handle many chat messages in one request
+
+    Expected JSON payload: an array of /chat payloads
+    [
+        {"user_input": "string", "user_id": "string" (optional)},
+        ...
+    ]
+    """
+    try:
+        items, error = parse_batch_request(request.get_json(silent=True))
+        if error:
+            body, status = error
+            return jsonify(body), status
+
+        valid = [(user_input, user_id) for user_input, user_id, item_error in items if not item_error]
+        logger.info(f"Processing chat batch - {len(valid)} of {len(items)} items valid")
+        responses = chatbot.respond_many([user_input for user_input, _ in valid],
+                                         [user_id for _, user_id in valid]) if valid else []
+
+        return jsonify(batch_body(items, responses))
+
+    except Exception as e:
+        logger.error(f"Error processing chat batch: {str(e)}", exc_info=True)
+        return jsonify(error_body("An error occurred processing your request")), 500
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint to verify API is running"""
-    return jsonify({
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat()
-    })
+    return jsonify(health_body(chatbot))
 
 @app.route('/', methods=['GET'])
 def api_docs():
     """Return basic API documentation"""
-    return jsonify({
-        "name": "Nextopson Chatbot API",
-        "version": "1.0",
-        "endpoints": {
-            "/chat": {
-                "method": "POST",
-                "description": "Send a message to the chatbot",
-                "payload": {
-                    "user_input": "string (required)",
-                    "user_id": "string (optional)"
-                }
-            },
-            "/health": {
-                "method": "GET",
-                "description": "Check API health status"
-            }
-        },
-        "timestamp": datetime.now().isoformat()
-    })
+    return jsonify(docs_body())
 
 if __name__ == '__main__':
+    if startup.enabled:
+        startup.print()
+        sys.exit(0)
+
     logger.info("Starting Nextopson Chatbot API")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
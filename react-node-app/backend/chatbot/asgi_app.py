@@ -0,0 +1,316 @@
+"""ASGI serving mode for the Nextopson chatbot API.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 2
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi_app:app
+
+Serves the same /chat, /chat/batch, /health and / contract as app.py. Connections,
+body reads and JSON handling run on the event loop, so an idle client
+costs a socket, not a worker thread. get_response runs on a bounded pool
+of INFERENCE_THREADS threads. At most INFERENCE_QUEUE further requests
+wait for a free thread; past that /chat answers 503 at once instead of
+queueing without bound, which keeps tail latency predictable under bursts.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+import request_log
+from api_contract import (configure_logging, parse_chat_request, parse_batch_request, chat_body, batch_body,
+                          error_body, health_body, docs_body)
+from bot_provider import get_bot
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', os.cpu_count() or 2))
+INFERENCE_QUEUE = int(os.environ.get('INFERENCE_QUEUE', '64'))
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', '10'))
+MAX_BODY_BYTES = 64 * 1024
+MAX_BATCH_BODY_BYTES = 2 * 1024 * 1024
+
+
+class Overloaded(Exception):
+    """Every inference thread is busy and the wait queue is full"""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before its request body was read"""
+
+
+class InferenceExecutor:
+    """Bounded thread pool with admission control for CPU-bound bot calls.
+
+    Counters are only touched on the event loop thread, so they need no lock.
+    """
+
+    def __init__(self, threads, max_pending, timeout, name='inference'):
+        self.name = name
+        self.threads = threads
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _pool(self):
+        # Threads do not survive gunicorn's fork, so each worker builds its own pool
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix=self.name)
+            self._pid = os.getpid()
+        return self._executor
+
+    def _done(self, _):
+        self.in_flight -= 1
+        self.completed += 1
+
+    async def run(self, fn, *args):
+        """fn(*args) on the pool; raises Overloaded or asyncio.TimeoutError"""
+        if self.in_flight >= self.threads + self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        self.in_flight += 1
+        future = asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        # A timed-out call keeps its thread until it finishes; count it until then
+        future.add_done_callback(self._done)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
+
+    def stats(self):
+        return {
+            'threads': self.threads,
+            'max_pending': self.max_pending,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts
+        }
+
+
+# Initialize the chatbot (built once per process, before fork under gunicorn --preload)
+try:
+    chatbot = get_bot()
+    chatbot.warmup()
+    logger.info("Chatbot initialized successfully")
+except Exception as e:
+    logger.error(f"Failed to initialize chatbot: {str(e)}")
+    raise
+
+inference = InferenceExecutor(INFERENCE_THREADS, INFERENCE_QUEUE, REQUEST_TIMEOUT)
+# Health probes gather stats that may block (SQLite queries, a session server round trip).
+# They run on their own small pool, so they neither stall the loop nor queue behind inference.
+health_probes = InferenceExecutor(1, 8, REQUEST_TIMEOUT, name='health')
+
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+
+
+async def send_json(send, body, status=200, headers=()):
+    payload = json.dumps(body).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode('ascii'))
+        ] + CORS_HEADERS + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def read_body(receive, limit=MAX_BODY_BYTES):
+    """Request body, or None once it exceeds limit bytes; raises ClientDisconnected"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def chat(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return await send_json(send, error_body("Request body too large"), 413)
+    scope['log_body'] = body
+    try:
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        user_input, user_id, error = parse_chat_request(data)
+        if error:
+            body, status = error
+            return await send_json(send, body, status)
+
+        logger.debug(f"Processing chat request - User ID: {user_id}, Input: {user_input}")
+        response = await inference.run(chatbot.get_response, user_input, user_id)
+        await send_json(send, chat_body(response))
+    except Overloaded:
+        logger.warning("Rejected chat request: inference queue is full")
+        await send_json(send, error_body("Server is busy, please retry"), 503, [(b'retry-after', b'1')])
+    except asyncio.TimeoutError:
+        logger.error(f"Chat request timed out after {inference.timeout}s")
+        await send_json(send, error_body("The request took too long to process"), 504)
+    except Exception as e:
+        logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
+        await send_json(send, error_body("An error occurred processing your request"), 500)
+
+
+async def chat_batch(scope, receive, send):
+    body = await read_body(receive, MAX_BATCH_BODY_BYTES)
+    if body is None:
+        return await send_json(send, error_body("Request body too large"), 413)
+    scope['log_body'] = body
+    try:
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        items, error = parse_batch_request(data)
+        if error:
+            body, status = error
+            return await send_json(send, body, status)
+
+        valid = [(user_input, user_id) for user_input, user_id, item_error in items if not item_error]
+        logger.info(f"Processing chat batch - {len(valid)} of {len(items)} items valid")
+        # One batch holds one inference thread, like a single /chat request
+        responses = await inference.run(chatbot.respond_many, [user_input for user_input, _ in valid],
+                                        [user_id for _, user_id in valid]) if valid else []
+        await send_json(send, batch_body(items, responses))
+    except Overloaded:
+        logger.warning("Rejected chat batch: inference queue is full")
+        await send_json(send, error_body("Server is busy, please retry"), 503, [(b'retry-after', b'1')])
+    except asyncio.TimeoutError:
+        logger.error(f"Chat batch timed out after {inference.timeout}s")
+        await send_json(send, error_body("The request took too long to process"), 504)
+    except Exception as e:
+        logger.error(f"Error processing chat batch: {str(e)}", exc_info=True)
+        await send_json(send, error_body("An error occurred processing your request"), 500)
+
+
+async def health_check(scope, receive, send):
+    # inference counters belong to the loop thread, so they are read here
+    probe = partial(health_body, chatbot, inference=inference.stats())
+    try:
+        body = await health_probes.run(probe)
+    except Overloaded:
+        return await send_json(send, error_body("Health checks are backing up"), 503, [(b'retry-after', b'1')])
+    except asyncio.TimeoutError:
+        return await send_json(send, error_body("Health check timed out"), 504)
+    await send_json(send, body)
+
+
+async def api_docs(scope, receive, send):
+    await send_json(send, docs_body())
+
+
+ROUTES = {
+    '/chat': ('POST', chat),
+    '/chat/batch': ('POST', chat_batch),
+    '/health': ('GET', health_check),
+    '/': ('GET', api_docs)
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            inference.shutdown()
+            health_probes.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    started = time.perf_counter()
+    status = 500
+
+    async def send_and_record(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        await send(message)
+
+    try:
+        await dispatch(scope, receive, send_and_record)
+    except ClientDisconnected:
+        # Nobody is left to answer; no inference slot was taken
+        status = 499
+    finally:
+        if request_log.sampled(status):
+            headers = dict(scope.get('headers') or ())
+            request_log.log_request(
+                scope['method'], scope['path'], status, time.perf_counter() - started,
+                remote=(scope.get('client') or ('', 0))[0],
+                user_agent=headers.get(b'user-agent', b''),
+                body=scope.get('log_body', b'')
+            )
+
+
+def headers_only(send):
+    """send for a HEAD request: the GET response's headers (content-length included), no body"""
+    async def send_headers(message):
+        if message['type'] == 'http.response.body':
+            message = {'type': 'http.response.body', 'body': b''}
+        await send(message)
+    return send_headers
+
+
+async def dispatch(scope, receive, send):
+    route = ROUTES.get(scope['path'])
+    if route is None:
+        return await send_json(send, error_body("Not found"), 404)
+    method, handler = route
+    if scope['method'] == 'OPTIONS':
+        # CORS preflight, as flask_cors answers it for app.py
+        return await send_json(send, {}, 200, [
+            (b'access-control-allow-methods', f"{method}, OPTIONS".encode('ascii')),
+            (b'access-control-allow-headers', b'content-type')
+        ])
+    if scope['method'] != method and not (method == 'GET' and scope['method'] == 'HEAD'):
+        return await send_json(send, error_body("Method not allowed"), 405, [(b'allow', method.encode('ascii'))])
+    if scope['method'] == 'HEAD':
+        send = headers_only(send)
+    try:
+        await handler(scope, receive, send)
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        logger.error(f"An error occurred: {str(e)}", exc_info=True)
+        await send_json(send, error_body("An internal server error occurred"), 500)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("Starting Nextopson Chatbot API (ASGI)")
+    uvicorn.run(app, host='0.0.0.0', port=5000)
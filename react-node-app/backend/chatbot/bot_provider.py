@@ -0,0 +1,57 @@
+import gc
+import os
+import logging
+import threading
+
+from nextopson_bot import initialize_bot
+
+logger = logging.getLogger(__name__)
+
+# One bot per process. When built before a fork (gunicorn --preload) the
+# instance is inherited by every worker and shared copy-on-write.
+_bot = None
+_lock = threading.Lock()
+
+
+def _reset_lock_after_fork():
+    # A lock held by another thread at fork time would never be released in the child
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_lock_after_fork)
+
+
+def get_bot(startup_report=None):
+    """Return the process-wide bot, building it on first use"""
+    global _bot
+    if _bot is None:
+        with _lock:
+            if _bot is None:
+                _bot = initialize_bot(startup_report)
+                logger.info(f"Bot built in process {os.getpid()}")
+    return _bot
+
+
+def is_initialized():
+    """Check whether the bot has been built in this process"""
+    return _bot is not None
+
+
+def preload():
+    """Build the bot and freeze the heap before workers are forked.
+
+    gc.freeze() moves every live object into the permanent generation so
+    the collector in the workers never touches (and so never copies) the
+    pages holding the trained model.
+    """
+    bot = get_bot()
+    # Inference processes started by warmup are the master's; each worker starts its own
+    if bot.inference_pool is not None:
+        bot.inference_pool.stop()
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+        logger.info(f"Froze {gc.get_freeze_count()} objects before fork")
+    return bot
@@ -1,13 +1,15 @@
 from flask import Flask, request, jsonify
 import re
 import string
-import random
-import pickle
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.pipeline import make_pipeline
 import os
 
+from model_store import ModelStore, fingerprint, pipeline_spec
+from inference import InferenceResult, top_k_predictions
+from intent_matcher import IntentMatcher
+
 app = Flask(__name__)
 
 class NextopsonSupportBot:
@@ -27,6 +29,7 @@ class NextopsonSupportBot:
             # ... (rest of your pairs)
         ]
         
+        self.matcher = IntentMatcher(self.pairs, mode='search')
         self.initialize_model()
 
     def get_response(self, user_input):
@@ -45,22 +48,20 @@ class NextopsonSupportBot:
                     "confidence": 1.0
                 }
             
-            for pattern, responses in self.pairs:
-                if re.search(pattern, cleaned_input, re.IGNORECASE):
-                    return {
-                        "response": random.choice(responses),
-                        "confidence": 1.0
-                    }
+            response = self.matcher.respond(cleaned_input)
+            if response:
+                return {
+                    "response": response,
+                    "confidence": 1.0
+                }
             
-            vectorized_input = [cleaned_input]
-            try:
-                prediction = self.pipeline.predict(vectorized_input)[0]
-                confidence = max(self.pipeline.predict_proba(vectorized_input)[0])
+            result = self.infer(cleaned_input)
+            if result.top_k:
                 return {
-                    "response": prediction,
-                    "confidence": float(confidence)
+                    "response": result.prediction,
+                    "confidence": result.confidence
                 }
-            except Exception:
+            else:
                 return {
                     "response": "Could you please provide more details about your query? I'm here to help with all Nextopson-related questions.",
                     "confidence": 0.0
@@ -72,6 +73,17 @@ class NextopsonSupportBot:
                 "confidence": 0.0
             }
 
+    def infer(self, cleaned_input, top_k=3):
+        """Classify preprocessed input with a single predict_proba call"""
+        result = InferenceResult(cleaned_input)
+        result.normalized_text = cleaned_input
+        with result.timed('predict'):
+            try:
+                result.top_k = top_k_predictions(self.pipeline, [cleaned_input], top_k)[0]
+            except Exception:
+                result.top_k = []
+        return result
+
     def preprocess_input(self, text):
         text = text.lower()
         text = re.sub(r'[^\w\s]', '', text)
@@ -82,14 +94,22 @@ class NextopsonSupportBot:
         return any(word in text.split() for word in inappropriate_words)
 
     def initialize_model(self):
+        store = ModelStore()
+        key = fingerprint(self.train_data, {'preprocess': 'raw'},
+                          pipeline_spec(vectorizer=('TfidfVectorizer', {}), classifier=('MultinomialNB', {})))
+
+        # Reuse the saved model when the training data is unchanged
+        self.pipeline = store.load(key)
+        if self.pipeline is not None:
+            return
+
         self.pipeline = make_pipeline(TfidfVectorizer(), MultinomialNB())
         X_train = [x[0] for x in self.train_data]
         y_train = [x[1] for x in self.train_data]
         self.pipeline.fit(X_train, y_train)
         
         # Save the model
-        with open('chatbot_model.pkl', 'wb') as f:
-            pickle.dump(self.pipeline, f)
+        store.save(key, self.pipeline)
 
 # Initialize bot
 support_bot = NextopsonSupportBot()
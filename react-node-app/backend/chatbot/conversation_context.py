@@ -0,0 +1,55 @@
+class ConversationContext:
+    """Recent-conversation context for one user, read from the session store on first use.
+
+    Behaves like the dict _get_conversation_context used to build
+    (interaction_count, previous_sentiments, topics), but requests that
+    never look at it never touch the store. Topic counts come from the
+    store's running counters instead of rescanning the history.
+    """
+
+    __slots__ = ('_store', '_user_id', '_history', '_counters')
+
+    KEYS = ('interaction_count', 'previous_sentiments', 'topics')
+
+    def __init__(self, store, user_id):
+        self._store = store
+        self._user_id = user_id
+        self._history = None
+        self._counters = None
+
+    def _load(self):
+        if self._history is None:
+            self._history, self._counters = self._store.summary(self._user_id)
+
+    @property
+    def interaction_count(self):
+        self._load()
+        return len(self._history)
+
+    @property
+    def previous_sentiments(self):
+        self._load()
+        return [interaction.sentiment for interaction in self._history]
+
+    @property
+    def topics(self):
+        self._load()
+        return {key[1]: count for key, count in self._counters.items() if key[0] == 'topic'}
+
+    def __bool__(self):
+        return self.interaction_count > 0
+
+    def __getitem__(self, key):
+        if key not in self.KEYS or not self:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """The original context dict ({} for a user without history)"""
+        return {key: getattr(self, key) for key in self.KEYS} if self else {}
@@ -0,0 +1,133 @@
+import re
+import time
+from datetime import datetime
+
+_TOKEN_RE = re.compile(r'\w+')
+_WORD_LIST_RE = re.compile(r'^\\b\(([\w|]+)\)\\b$')
+
+
+def _word_alternatives(pattern):
+    """Words of a `\\b(w1|w2|...)\\b` pattern, or None for anything more complex"""
+    m = _WORD_LIST_RE.match(pattern)
+    if not m:
+        return None
+    words = m.group(1).split('|')
+    return words if all(words) else None
+
+
+class FeatureRecord:
+    """Compact analysis of one input"""
+
+    __slots__ = ('sentiment', 'property_type', 'has_location', 'has_price',
+                 'word_count', 'is_question', 'timestamp')
+
+    def __init__(self, sentiment, property_type, has_location, has_price,
+                 word_count, is_question, timestamp):
+        self.sentiment = sentiment
+        self.property_type = property_type
+        self.has_location = has_location
+        self.has_price = has_price
+        self.word_count = word_count
+        self.is_question = is_question
+        self.timestamp = timestamp
+
+    # Dict-style access keeps existing analysis['sentiment'] callers working
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def with_timestamp(self, timestamp):
+        """Copy of this record stamped with a new time"""
+        return FeatureRecord(self.sentiment, self.property_type, self.has_location,
+                             self.has_price, self.word_count, self.is_question, timestamp)
+
+    def to_dict(self):
+        """Analysis dict in the original format, with a formatted timestamp"""
+        data = {key: getattr(self, key) for key in self.__slots__}
+        data['timestamp'] = datetime.fromtimestamp(self.timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        return data
+
+
+class FeatureExtractor:
+    """Extracts all analysis fields from an input in one scan of its tokens.
+
+    Each `\\b(word|word)\\b` pattern is turned into a word -> category
+    table, so sentiment, property type, location and price come from a
+    single pass over the tokens. Categories keep the first-match priority of
+    the pattern dicts they were built from; any pattern that is not a plain
+    word list is still evaluated as a compiled regex.
+    """
+
+    def __init__(self, sentiment_patterns, property_types, location_pattern, price_pattern):
+        self.sentiments = list(sentiment_patterns)
+        self.property_types = list(property_types)
+        # word -> {slot: (rank, category)}; rank is the category's position in its dict
+        self._lookup = {}
+        self._regex_fallbacks = []
+
+        self._add_categories('sentiment', sentiment_patterns)
+        self._add_categories('property_type', property_types)
+        self._add_categories('has_location', {True: location_pattern})
+        self._add_categories('has_price', {True: price_pattern})
+
+    def _add_categories(self, slot, patterns):
+        for rank, (category, pattern) in enumerate(patterns.items()):
+            words = _word_alternatives(pattern)
+            if words is None:
+                self._regex_fallbacks.append((slot, rank, category, re.compile(pattern, re.IGNORECASE)))
+                continue
+            for word in words:
+                # A word listed under several categories belongs to the first one
+                self._lookup.setdefault(word.lower(), {}).setdefault(slot, (rank, category))
+
+    def _scan(self, text):
+        """Best (rank, category) per slot, plus every property type seen"""
+        best = {}
+        property_hits = set()
+        lookup = self._lookup
+        for token in _TOKEN_RE.findall(text.lower()):
+            hits = lookup.get(token)
+            if not hits:
+                continue
+            for slot, hit in hits.items():
+                if slot == 'property_type':
+                    property_hits.add(hit[1])
+                current = best.get(slot)
+                if current is None or hit[0] < current[0]:
+                    best[slot] = hit
+        for slot, rank, category, regex in self._regex_fallbacks:
+            current = best.get(slot)
+            improves = current is None or rank < current[0]
+            if (improves or slot == 'property_type') and regex.search(text):
+                if slot == 'property_type':
+                    property_hits.add(category)
+                if improves:
+                    best[slot] = (rank, category)
+        return best, property_hits
+
+    def extract(self, text, timestamp=None):
+        """Analyze one input"""
+        best, _ = self._scan(text)
+        return FeatureRecord(
+            sentiment=best['sentiment'][1] if 'sentiment' in best else 'neutral',
+            property_type=best['property_type'][1] if 'property_type' in best else 'general',
+            has_location='has_location' in best,
+            has_price='has_price' in best,
+            word_count=len(text.split()),
+            is_question='?' in text,
+            timestamp=time.time() if timestamp is None else timestamp
+        )
+
+    def extract_many(self, texts):
+        """Analyze a batch of inputs sharing one timestamp"""
+        now = time.time()
+        return [self.extract(text, now) for text in texts]
+
+    def property_type_hits(self, text):
+        """Every property type mentioned in text"""
+        _, hits = self._scan(text)
+        return hits
@@ -0,0 +1,32 @@
+"""Gunicorn settings for the Nextopson chatbot API.
+
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi_app:app
+
+The app (and with it the trained bot) is loaded once in the master and
+shared copy-on-write by the forked workers. Each worker writes its own
+LOG_FILE, named after its slot (chatbot_api.w0.log, chatbot_api.w1.log, ...),
+so a restarted worker takes over its predecessor's file and backups.
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before any fork
+    import bot_provider
+    bot_provider.preload()
+
+
+def pre_fork(server, worker):
+    # Runs in the master: give the new worker the lowest slot no live worker holds
+    taken = {getattr(other, 'log_slot', None) for other in server.WORKERS.values()}
+    worker.log_slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    import request_log
+    request_log.set_process_tag(f"w{worker.log_slot}")
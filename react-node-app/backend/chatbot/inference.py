@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class InferenceResult:
+    """Everything computed for one input in a single inference pass"""
+
+    def __init__(self, text, model_version=None):
+        self.text = text
+        self.model_version = model_version
+        self.normalized_text = ''
+        self.analysis = None
+        self.top_k = []
+        self.timings = {}
+
+    @property
+    def prediction(self):
+        """Best class, or None if the input was not classified"""
+        return self.top_k[0][0] if self.top_k else None
+
+    @property
+    def confidence(self):
+        """Probability of the best class"""
+        return self.top_k[0][1] if self.top_k else 0.0
+
+    @contextmanager
+    def timed(self, stage):
+        """Record the wall time of a stage in milliseconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = (time.perf_counter() - start) * 1000
+
+    def to_dict(self):
+        return {
+            'text': self.text,
+            'normalized_text': self.normalized_text,
+            'analysis': self.analysis.to_dict() if hasattr(self.analysis, 'to_dict') else self.analysis,
+            'top_k': [{'label': label, 'probability': prob} for label, prob in self.top_k],
+            'prediction': self.prediction,
+            'confidence': self.confidence,
+            'model_version': self.model_version,
+            'timings_ms': dict(self.timings)
+        }
+
+
+def top_k_predictions(pipeline, texts, k=3):
+    """Top-k (label, probability) pairs per text from a single predict_proba call.
+
+    The best class is the argmax of predict_proba, which is what
+    pipeline.predict returns, so there is no need to call both.
+    """
+    return top_k_from_proba(pipeline.predict_proba(texts), pipeline.classes_, k)
+
+
+def top_k_from_proba(proba, classes, k=3):
+    """Top-k (label, probability) pairs for each row of a predict_proba matrix"""
+    results = []
+    for row in proba:
+        if k == 1:
+            order = [int(np.argmax(row))]
+        else:
+            # Stable sort keeps argmax tie-breaking (lowest class index wins)
+            order = np.argsort(-row, kind='stable')[:k]
+        results.append([(classes[i], float(row[i])) for i in order])
+    return results
@@ -0,0 +1,339 @@
+"""Process-pool inference against a model in shared memory.
+
+Each inference process attaches to a SharedForest block (see
+shared_model.py) and normalizes and classifies inputs sent to it over its
+stdin/stdout pipes as length-prefixed pickles. A caller borrows an idle
+process for one request, so with one process per core concurrent requests
+run in parallel instead of taking turns on the GIL, while the model is in
+memory once.
+
+Enable it for the bot with NEXTOPSON_INFERENCE_PROCESSES=<n>. Measure
+throughput with:
+
+    python inference_pool.py --benchmark [--processes N] [--threads T]
+"""
+import os
+import sys
+import time
+import queue
+import pickle
+import select
+import struct
+import logging
+import argparse
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+# Seconds to wait for a process to attach to the model, and for a reply to a request
+START_TIMEOUT = 60
+REQUEST_TIMEOUT = float(os.environ.get('NEXTOPSON_INFERENCE_TIMEOUT', '10'))
+
+
+def _write_message(stream, obj):
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_message(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise EOFError("Inference process closed its pipe")
+    (size,) = _HEADER.unpack(header)
+    return pickle.loads(stream.read(size))
+
+
+def _read_exactly(fd, size, deadline):
+    chunks = []
+    while size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            raise TimeoutError("Inference process did not reply in time")
+        chunk = os.read(fd, size)
+        if not chunk:
+            raise EOFError("Inference process closed its pipe")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _read_reply(fd, timeout):
+    """Next message from an inference process, waiting at most timeout seconds.
+
+    Reads the raw pipe rather than its buffered reader, so select() sees
+    every byte that has not been consumed.
+    """
+    deadline = time.monotonic() + timeout
+    (size,) = _HEADER.unpack(_read_exactly(fd, _HEADER.size, deadline))
+    return pickle.loads(_read_exactly(fd, size, deadline))
+
+
+class InferenceError(Exception):
+    """An inference process failed a request but is still usable"""
+
+
+class _Worker:
+    """One inference process and its pipes"""
+
+    def __init__(self, setup, timeout=START_TIMEOUT):
+        here = os.path.dirname(os.path.abspath(__file__))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [here, env.get('PYTHONPATH')]))
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(here, 'inference_pool.py'), '--worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env
+        )
+        try:
+            _write_message(self.process.stdin, setup)
+            ready = _read_reply(self.process.stdout.fileno(), timeout)
+        except Exception:
+            self.kill()
+            raise
+        if ready != 'ready':
+            self.kill()
+            raise RuntimeError(f"Inference process failed to start: {ready}")
+
+    def request(self, texts, top_k, timeout):
+        _write_message(self.process.stdin, (texts, top_k))
+        reply = _read_reply(self.process.stdout.fileno(), timeout)
+        if isinstance(reply, Exception):
+            raise InferenceError(f"{type(reply).__name__}: {reply}")
+        return reply
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def stop(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class InferencePool:
+    """Processes that return (normalized text, top-k classes) for raw inputs.
+
+    Processes start on first use in each process, so a pool built before
+    gunicorn forks gives every worker its own processes, all attached to
+    the same shared model. If they cannot be started the pool disables
+    itself (see `available`) rather than retrying on every request.
+    """
+
+    def __init__(self, manifest, normalizer, processes=None, nltk_path=None, timeout=REQUEST_TIMEOUT):
+        self.processes = processes or os.cpu_count() or 1
+        self.timeout = timeout
+        # nltk_path: where a WordNet fallback in the normalizer finds its corpus
+        self._setup = {'manifest': manifest, 'normalizer': normalizer, 'nltk_path': nltk_path}
+        self._idle = queue.Queue()
+        self._workers = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self.failure = None
+        self.requests = 0
+        self.restarts = 0
+
+    @property
+    def available(self):
+        return self.failure is None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.failure is not None:
+                raise RuntimeError(f"Inference pool is disabled: {self.failure}")
+            # Handles inherited through a fork belong to the parent's processes
+            self._idle = queue.Queue()
+            self._workers = []
+            try:
+                for _ in range(self.processes):
+                    self._workers.append(_Worker(self._setup))
+            except Exception as e:
+                for worker in self._workers:
+                    worker.stop()
+                self._workers = []
+                self.failure = str(e)
+                logger.error(f"Could not start inference processes, disabling the pool: {str(e)}")
+                raise
+            for worker in self._workers:
+                self._idle.put(worker)
+            self._pid = os.getpid()
+            logger.info(f"Started {self.processes} inference processes in {self._pid}")
+
+    def _replace(self, worker):
+        """Kill a broken process and start another in its place; the pool shrinks if that fails"""
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            try:
+                replacement = _Worker(self._setup)
+            except Exception as e:
+                logger.error(f"Could not replace inference process: {str(e)}")
+                if not self._workers:
+                    self.failure = str(e)
+                return
+            self._workers.append(replacement)
+            self.restarts += 1
+        self._idle.put(replacement)
+
+    def infer_many(self, texts, top_k=3):
+        """[(normalized text, [(label, probability), ...])] for each raw input"""
+        self._ensure_started()
+        try:
+            worker = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No inference process free within {self.timeout}s")
+        try:
+            result = worker.request(list(texts), top_k, self.timeout)
+        except InferenceError:
+            # The process reported the error and is ready for the next request
+            self._idle.put(worker)
+            raise
+        except Exception as e:
+            # Died, hung or out of step with its pipe; only a healthy process goes back
+            logger.error(f"Inference process {worker.process.pid} failed: {e!r}")
+            self._replace(worker)
+            raise
+        self._idle.put(worker)
+        self.requests += 1
+        return result
+
+    def infer(self, text, top_k=3):
+        return self.infer_many([text], top_k)[0]
+
+    def stop(self):
+        """Stop this process's inference processes (they restart on next use)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._pid = None
+
+    def stats(self):
+        return {
+            'processes': len(self._workers) if self._pid == os.getpid() else 0,
+            'idle': self._idle.qsize() if self._pid == os.getpid() else 0,
+            'requests': self.requests,
+            'restarts': self.restarts,
+            'disabled': self.failure
+        }
+
+
+def _serve():
+    """Inference process: setup message, then (texts, top_k) requests until stdin closes"""
+    from shared_model import ForestView
+    from inference import top_k_from_proba
+
+    requests, replies = sys.stdin.buffer, os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    # Anything printed by libraries must not corrupt the reply stream
+    sys.stdout = sys.stderr
+    try:
+        setup = _read_message(requests)
+        if setup.get('nltk_path'):
+            import nltk
+            nltk.data.path[:] = setup['nltk_path']
+        model = ForestView(setup['manifest'])
+        normalizer = setup['normalizer']
+    except Exception as e:
+        _write_message(replies, e)
+        return 1
+    _write_message(replies, 'ready')
+
+    while True:
+        try:
+            texts, top_k = _read_message(requests)
+        except EOFError:
+            break
+        try:
+            normalized = normalizer.normalize_many(texts)
+            top = top_k_from_proba(model.predict_proba(normalized), model.classes_, top_k)
+            _write_message(replies, list(zip(normalized, top)))
+        except Exception as e:
+            _write_message(replies, e)
+    model.close()
+    return 0
+
+
+def benchmark(processes, threads, requests=2000):
+    """Requests per second for in-process inference and for the pool"""
+    from bot_provider import get_bot
+    from shared_model import SharedForest
+    from inference import top_k_predictions
+
+    bot = get_bot()
+    texts = [f"how do i list my {n % 3 + 1}bhk apartment near the metro station {n}" for n in range(requests)]
+
+    def run(infer):
+        position = iter(range(requests))
+        lock = threading.Lock()
+
+        def loop():
+            while True:
+                with lock:
+                    n = next(position, None)
+                if n is None:
+                    return
+                infer(texts[n])
+
+        pool_threads = [threading.Thread(target=loop) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in pool_threads:
+            thread.start()
+        for thread in pool_threads:
+            thread.join()
+        return requests / (time.perf_counter() - started)
+
+    def in_process(text):
+        normalized = bot.preprocess_input(text)
+        return normalized, top_k_predictions(bot.pipeline, [normalized], 1)[0]
+
+    shared = SharedForest.export(bot.pipeline)
+    pool = InferencePool(shared.manifest, bot.normalizer, processes, bot.nltk_path)
+    try:
+        pool.infer('warm up')
+        return {'in_process': run(in_process), 'pool': run(lambda text: pool.infer(text, 1)),
+                'shared_mb': shared.manifest['nbytes'] / 2 ** 20}
+    finally:
+        pool.stop()
+        shared.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Process-pool inference')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--benchmark', action='store_true', help='Compare in-process and pool throughput')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args(argv)
+    if args.worker:
+        return _serve()
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    result = benchmark(args.processes, args.threads, args.requests)
+    print(f"In-process ({args.threads} threads): {result['in_process']:.0f} req/s")
+    print(f"Pool ({args.processes} processes, {args.threads} threads): {result['pool']:.0f} req/s")
+    print(f"Shared model: {result['shared_mb']:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
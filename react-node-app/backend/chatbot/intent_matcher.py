@@ -0,0 +1,205 @@
+import re
+import random
+import logging
+from collections import defaultdict
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+')
+_LEFT_ANCHORS = (sre_constants.AT_BOUNDARY, sre_constants.AT_BEGINNING,
+                 sre_constants.AT_BEGINNING_STRING)
+_RIGHT_ANCHORS = (sre_constants.AT_BOUNDARY, sre_constants.AT_END,
+                  sre_constants.AT_END_STRING)
+_REPEATS = tuple(op for op in (getattr(sre_constants, 'MAX_REPEAT', None),
+                               getattr(sre_constants, 'MIN_REPEAT', None),
+                               getattr(sre_constants, 'POSSESSIVE_REPEAT', None)) if op is not None)
+
+
+def _is_boundary(item, anchors):
+    """True if item guarantees a word boundary next to its neighbour"""
+    op, av = item
+    if op is sre_constants.AT:
+        return av in anchors
+    if op is sre_constants.LITERAL:
+        return not _WORD_RE.match(chr(av))
+    return False
+
+
+def _whole_words(literal, left_bounded, right_bounded):
+    """Words of a literal run that any match must contain as complete tokens"""
+    words = []
+    for m in _WORD_RE.finditer(literal):
+        left = m.start() > 0 or left_bounded
+        right = m.end() < len(literal) or right_bounded
+        word = m.group().lower()
+        # Non-ASCII words can case-fold in ways a plain lower() lookup misses
+        if left and right and word.isascii():
+            words.append(word)
+    return words
+
+
+def _better(current, candidate):
+    if candidate is None:
+        return current
+    if current is None:
+        return candidate
+    # Prefer the set whose weakest keyword is the most selective
+    return candidate if min(map(len, candidate)) > min(map(len, current)) else current
+
+
+def required_keywords(parsed, left_bounded=False, right_bounded=False):
+    """Set of whole words of which every match contains at least one, or None.
+
+    None means no such set could be derived and the pattern must always be
+    tried. The analysis is conservative: it only trusts word boundaries it
+    can see (\\b, string anchors or non-word characters inside a literal).
+    """
+    items = list(parsed)
+    best = None
+    run = []
+    run_left = left_bounded
+    for i, (op, av) in enumerate(items):
+        item_left = _is_boundary(items[i - 1], _LEFT_ANCHORS) if i else left_bounded
+        item_right = _is_boundary(items[i + 1], _RIGHT_ANCHORS) if i + 1 < len(items) else right_bounded
+
+        if op is sre_constants.LITERAL:
+            if not run:
+                run_left = item_left
+            run.append(chr(av))
+            if i + 1 < len(items) and items[i + 1][0] is sre_constants.LITERAL:
+                continue
+            words = _whole_words(''.join(run), run_left, item_right)
+            if words:
+                best = _better(best, {max(words, key=len)})
+            run = []
+        elif op is sre_constants.SUBPATTERN:
+            best = _better(best, required_keywords(av[-1], item_left, item_right))
+        elif op is sre_constants.BRANCH:
+            branches = [required_keywords(b, item_left, item_right) for b in av[1]]
+            if branches and all(b is not None for b in branches):
+                best = _better(best, set().union(*branches))
+        elif op in _REPEATS and av[0] >= 1:
+            # Later repetitions start right after the previous one, so only a single repeat keeps the context
+            single = av[1] == 1
+            best = _better(best, required_keywords(av[2], item_left and single, item_right and single))
+    return best
+
+
+class IntentMatcher:
+    """Compiled first-match intent matcher for (pattern, responses) pairs.
+
+    Drop-in replacement for nltk's Chat.respond (mode='match', anchored at
+    the start of the input) and for sequential re.search loops
+    (mode='search'). All patterns are indexed once by the whole words a
+    match must contain; an input only runs the regexes of patterns whose
+    keywords it contains (plus the few patterns with no derivable keyword),
+    in pair order, so the first matching pair wins exactly as before and the
+    cost stays flat as the pattern list grows.
+    """
+
+    def __init__(self, pairs, reflections=None, mode='match', flags=re.IGNORECASE):
+        if mode not in ('match', 'search'):
+            raise ValueError(f"Unknown match mode: {mode}")
+        self.mode = mode
+        self.flags = flags
+        self._reflections = reflections or {}
+        self._reflection_regex = self._compile_reflections()
+        self._patterns = []
+        self._responses = []
+        self._keyword_index = defaultdict(list)
+        self._unindexed = []
+        for pair in pairs:
+            self.add(*pair)
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def add(self, pattern, responses):
+        """Append a pair; it has the lowest priority of all pairs"""
+        index = len(self._patterns)
+        self._patterns.append(re.compile(pattern, self.flags))
+        self._responses.append(list(responses))
+
+        keywords = None
+        if self.flags & re.IGNORECASE:
+            try:
+                keywords = required_keywords(sre_parse.parse(pattern, self.flags),
+                                             left_bounded=self.mode == 'match')
+            except Exception as e:
+                logger.debug(f"No keyword prefilter for pattern {pattern!r}: {str(e)}")
+        if keywords:
+            for keyword in keywords:
+                self._keyword_index[keyword].append(index)
+        else:
+            self._unindexed.append(index)
+
+    def candidates(self, text):
+        """Indexes of the pairs that could match text, in pair order"""
+        found = set(self._unindexed)
+        for token in set(_WORD_RE.findall(text.lower())):
+            found.update(self._keyword_index.get(token, ()))
+        return sorted(found)
+
+    def match(self, text):
+        """Return (pair index, match object) of the first matching pair, or (None, None)"""
+        if not text:
+            return None, None
+        for index in self.candidates(text):
+            pattern = self._patterns[index]
+            m = pattern.match(text) if self.mode == 'match' else pattern.search(text)
+            if m:
+                return index, m
+        return None, None
+
+    def responses(self, index):
+        return self._responses[index]
+
+    def respond(self, text):
+        """Pick a response for the first matching pair, like Chat.respond"""
+        index, m = self.match(text)
+        if index is None:
+            return None
+        return self.render(index, m)
+
+    def render(self, index, m):
+        """Pick a random response of pair index and fill in its wildcards from m"""
+        resp = random.choice(self._responses[index])
+        if '%' in resp:
+            resp = self._wildcards(resp, m)
+
+        # fix munged punctuation at the end
+        if resp[-2:] == "?.":
+            resp = resp[:-2] + "."
+        if resp[-2:] == "??":
+            resp = resp[:-2] + "?"
+        return resp
+
+    def _compile_reflections(self):
+        if not self._reflections:
+            return None
+        sorted_refl = sorted(self._reflections, key=len, reverse=True)
+        return re.compile(
+            r"\b({})\b".format("|".join(map(re.escape, sorted_refl))), re.IGNORECASE
+        )
+
+    def _substitute(self, text):
+        if self._reflection_regex is None:
+            return text.lower()
+        return self._reflection_regex.sub(
+            lambda mo: self._reflections[mo.string[mo.start():mo.end()]], text.lower()
+        )
+
+    def _wildcards(self, response, match):
+        pos = response.find("%")
+        while pos >= 0:
+            num = int(response[pos + 1:pos + 2])
+            response = response[:pos] + self._substitute(match.group(num)) + response[pos + 2:]
+            pos = response.find("%")
+        return response
@@ -0,0 +1,241 @@
+"""Compact conversation memory records.
+
+update_memory used to keep a dict per turn holding the input, the full
+response string, the whole analysis dict and a confidence. An
+InteractionRecord keeps the same information in fixed slots: sentiment and
+property type as small codes, the response as an interned intent ID (or the
+string itself once the codebook is full) and the timestamp as a float.
+
+Compare the memory held per session with:
+
+    python interaction_record.py --benchmark [--sessions N]
+"""
+import sys
+import time
+import argparse
+import threading
+import tracemalloc
+
+
+class Codebook:
+    """Interns strings as small integer codes, shared by every record in the process.
+
+    Codes are never reassigned, since records keep them for their whole
+    life. Once limit values are interned, code() returns any new value
+    itself and value() passes it back, so such records hold their own
+    string instead of growing the codebook.
+    """
+
+    def __init__(self, values=(), limit=None):
+        self.limit = limit
+        self._values = []
+        self._codes = {}
+        self._lock = threading.Lock()
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self._values)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    if self.limit is not None and len(self._values) >= self.limit:
+                        return value
+                    code = len(self._values)
+                    self._values.append(value)
+                    self._codes[value] = code
+        return code
+
+    def value(self, code):
+        if code is None or isinstance(code, str):
+            return code
+        return self._values[code]
+
+
+SENTIMENTS = Codebook(['neutral', 'positive', 'negative', 'urgent'])
+PROPERTY_TYPES = Codebook(['general', 'residential', 'commercial', 'land'])
+# Intent IDs for the responses the bot gives most. Pattern responses can
+# echo the user's words, so the set is open-ended and has to be bounded.
+MAX_RESPONSE_CODES = 4096
+RESPONSES = Codebook(limit=MAX_RESPONSE_CODES)
+
+
+class InteractionRecord:
+    """One conversation turn"""
+
+    __slots__ = ('input', 'response_id', 'sentiment_code', 'property_type_code',
+                 'confidence', 'timestamp', 'topic_codes')
+
+    def __init__(self, input, response, sentiment='neutral', property_type='general',
+                 confidence=0.0, timestamp=None, topics=()):
+        self.input = input
+        self.response_id = RESPONSES.code(response) if response is not None else None
+        self.sentiment_code = SENTIMENTS.code(sentiment)
+        self.property_type_code = PROPERTY_TYPES.code(property_type)
+        self.confidence = float(confidence)
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # Property types mentioned in the input, counted by the session store
+        self.topic_codes = tuple(sorted(PROPERTY_TYPES.code(topic) for topic in topics))
+
+    @classmethod
+    def from_dict(cls, interaction, topics=()):
+        """Build a record from an update_memory interaction dict"""
+        analysis = interaction.get('analysis') or {}
+        timestamp = analysis.get('timestamp')
+        return cls(
+            interaction.get('input', ''),
+            interaction.get('response'),
+            analysis.get('sentiment', 'neutral'),
+            analysis.get('property_type', 'general'),
+            interaction.get('confidence', 0.0),
+            timestamp if isinstance(timestamp, float) else None,
+            topics
+        )
+
+    @property
+    def response(self):
+        return RESPONSES.value(self.response_id)
+
+    @property
+    def sentiment(self):
+        return SENTIMENTS.value(self.sentiment_code)
+
+    @property
+    def property_type(self):
+        return PROPERTY_TYPES.value(self.property_type_code)
+
+    @property
+    def topics(self):
+        return [PROPERTY_TYPES.value(code) for code in self.topic_codes]
+
+    def counter_keys(self):
+        """Keys the session store counts for this turn"""
+        return [('sentiment', self.sentiment)] + [('topic', topic) for topic in self.topics]
+
+    @property
+    def analysis(self):
+        return {
+            'sentiment': self.sentiment,
+            'property_type': self.property_type,
+            'timestamp': self.timestamp
+        }
+
+    # Dict-style access keeps interaction.get('input') callers working
+    def get(self, key, default=None):
+        if key in ('input', 'response', 'confidence', 'analysis', 'sentiment', 'property_type',
+                   'timestamp', 'topics'):
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def to_dict(self):
+        return {
+            'input': self.input,
+            'response': self.response,
+            'analysis': self.analysis,
+            'confidence': self.confidence
+        }
+
+    def to_row(self):
+        """Plain values for storage outside this process (codes are process-local)"""
+        return [self.input, self.response, self.sentiment, self.property_type,
+                self.confidence, self.timestamp, self.topics]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+def _measure(build):
+    """Bytes allocated by build() and still referenced by its result"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return sessions, after - before
+
+
+def benchmark(sessions=20000, turns=5):
+    """Bytes per session for dict interactions vs InteractionRecord"""
+    from datetime import datetime
+    from collections import deque
+
+    base_responses = [f"Answer number {i} about listing, fees and verification on Nextopson." for i in range(40)]
+    suffix = " We have extensive residential property listings you might be interested in."
+    now = time.time()
+
+    def turn_input(user, turn):
+        return f"user {user} asks about property listing number {turn}"
+
+    def build_dicts():
+        store = {}
+        for user in range(sessions):
+            history = store[f"user-{user}"] = deque(maxlen=turns)
+            for turn in range(turns):
+                history.append({
+                    'input': turn_input(user, turn),
+                    # Enhanced responses are fresh strings on every request
+                    'response': base_responses[(user + turn) % 40] + suffix,
+                    'analysis': {
+                        'sentiment': 'neutral',
+                        'property_type': 'residential',
+                        'has_location': False,
+                        'has_price': False,
+                        'word_count': 7,
+                        'is_question': False,
+                        'timestamp': datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+                    },
+                    'confidence': 0.5 + turn / 100
+                })
+        return store
+
+    def build_records():
+        store = {}
+        for user in range(sessions):
+            history = store[f"user-{user}"] = deque(maxlen=turns)
+            for turn in range(turns):
+                history.append(InteractionRecord(
+                    turn_input(user, turn),
+                    base_responses[(user + turn) % 40] + suffix,
+                    'neutral', 'residential', 0.5 + turn / 100, now
+                ))
+        return store
+
+    results = {}
+    for name, build in (('dict', build_dicts), ('record', build_records)):
+        store, used = _measure(build)
+        results[name] = used / sessions
+        del store
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compact interaction records')
+    parser.add_argument('--benchmark', action='store_true', help='Compare bytes per session')
+    parser.add_argument('--sessions', type=int, default=20000)
+    parser.add_argument('--turns', type=int, default=5)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    results = benchmark(args.sessions, args.turns)
+    print(f"{args.sessions} sessions x {args.turns} turns")
+    print(f"  dict interactions: {results['dict']:8.0f} bytes/session")
+    print(f"  InteractionRecord: {results['record']:8.0f} bytes/session")
+    print(f"  saving:            {1 - results['record'] / results['dict']:8.1%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
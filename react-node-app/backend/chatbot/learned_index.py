@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+
+class LearnedIndex:
+    """Nearest-question index over pairs taught through /learn.
+
+    The classifier cannot take a new answer without a refit (each answer is
+    its own class) and, even after one, a class with a single example rarely
+    clears the confidence threshold. Learned pairs are therefore answered
+    from this index: a stateless HashingVectorizer turns a question into a
+    unit vector in O(len) time and a lookup is a sparse dot product against
+    the learned questions. New rows are stacked into blocks lazily, and
+    blocks are merged once there are too many, so adding a pair never
+    copies the whole index.
+    """
+
+    def __init__(self, threshold=0.6, n_features=2 ** 18, max_blocks=8):
+        self.threshold = threshold
+        self.max_blocks = max_blocks
+        self.vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False,
+                                            norm='l2', ngram_range=(1, 2),
+                                            token_pattern=r'(?u)\b\w+\b')
+        self._lock = threading.Lock()
+        self._blocks = []
+        self._pending = []
+        self._answers = []
+
+    def __len__(self):
+        return len(self._answers)
+
+    def add(self, question, answer):
+        """Make a pair answerable immediately"""
+        self.add_many([(question, answer)])
+
+    def add_many(self, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return
+        rows = self.vectorizer.transform([question for question, _ in pairs])
+        with self._lock:
+            self._pending.append(rows)
+            self._answers.extend(answer for _, answer in pairs)
+
+    def _matrices(self):
+        """Blocks covering every answer, in order (caller holds the lock)"""
+        if self._pending:
+            self._blocks.append(sp.vstack(self._pending, format='csr'))
+            self._pending = []
+            if len(self._blocks) > self.max_blocks:
+                self._blocks = [sp.vstack(self._blocks, format='csr')]
+        return list(self._blocks)
+
+    def lookup(self, question):
+        """(answer, cosine similarity) of the closest learned question, or (None, best score)"""
+        with self._lock:
+            if not self._answers:
+                return None, 0.0
+            blocks, answers = self._matrices(), self._answers
+        query = self.vectorizer.transform([question]).T
+        scores = np.concatenate([(block @ query).toarray().ravel() for block in blocks])
+        # Latest pair wins a tie, so re-teaching a question replaces its answer
+        best = len(scores) - 1 - int(np.argmax(scores[::-1]))
+        if scores[best] < self.threshold:
+            return None, float(scores[best])
+        return answers[best], float(scores[best])
@@ -0,0 +1,326 @@
+"""Append-only log of pairs taught through /learn.
+
+Each learned pair is one JSON line, appended with a single write to a file
+opened O_APPEND, so learning costs O(1) I/O however large the knowledge
+base grows. Loading streams the file a few MB at a time and keeps the newest
+answer for each question; a torn final line from a crash is skipped.
+Once the log holds compact_ratio times more lines than distinct
+questions, it is rewritten without the superseded lines on a background
+thread and atomically swapped in.
+
+A learned_responses.json written by older versions is imported on first
+load. Measure append and load cost with:
+
+    python learned_store.py --benchmark [--pairs N]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def pair_key(question):
+    """Questions differing only in case or surrounding whitespace are the same question"""
+    return question.strip().lower()
+
+
+def _fsync_directory(directory):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class LearnedPairLog:
+    """JSONL log of (question, answer) pairs with dedup on load and compaction"""
+
+    def __init__(self, path='learned_responses.jsonl', legacy_path='learned_responses.json',
+                 fsync=True, compact_ratio=2.0, compact_min_lines=1000):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.fsync = fsync
+        self.compact_ratio = compact_ratio
+        self.compact_min_lines = compact_min_lines
+        self._lock = threading.Lock()
+        self._fd = None
+        self._keys = set()
+        self._compacting = False
+        self.lines = 0
+        self.appends = 0
+        self.compactions = 0
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    # Loading
+
+    def _iter_lines(self, f, limit=None, chunk_size=1 << 22):
+        """Pairs from an open log, reading at most limit bytes, a few MB at a time"""
+        remaining = float('inf') if limit is None else limit
+        while remaining > 0:
+            lines = f.readlines(min(chunk_size, remaining))
+            if not lines:
+                return
+            if limit is not None:
+                # readlines() may run past the limit by whole lines; drop those
+                kept = 0
+                for line in lines:
+                    if len(line) > remaining:
+                        remaining = 0
+                        break
+                    remaining -= len(line)
+                    kept += 1
+                lines = lines[:kept]
+                if not lines:
+                    return
+            try:
+                # JSON strings never hold a raw newline, so a chunk parses as one array
+                pairs = json.loads(b'[' + b','.join(lines) + b']')
+            except ValueError:
+                pairs = []
+                for line in lines:
+                    try:
+                        pairs.append(json.loads(line))
+                    except ValueError:
+                        self.skipped += 1
+                        logger.warning(f"Skipping corrupt learned pair in {self.path}")
+            for pair in pairs:
+                # Valid JSON that is not a [question, answer] pair of strings is skipped too
+                if type(pair) is list and len(pair) == 2 and type(pair[0]) is str and type(pair[1]) is str:
+                    yield pair
+                else:
+                    self.skipped += 1
+                    logger.warning(f"Skipping malformed learned pair in {self.path}")
+
+    def _latest(self, f, limit=None):
+        """({question key: [question, answer]} keeping the newest answer, lines read).
+
+        Keys are ordered by when each question was last taught, so a
+        re-taught question moves after the ones taught since it first was.
+        """
+        pairs = {}
+        lines = 0
+        for pair in self._iter_lines(f, limit):
+            # pair_key(), inlined: this runs once per line of the log
+            key = pair[0].strip().lower()
+            pairs.pop(key, None)
+            pairs[key] = pair
+            lines += 1
+        return pairs, lines
+
+    def load(self):
+        """Distinct learned [question, answer] pairs, newest answer per question, in teach order"""
+        self._import_legacy()
+        pairs, lines = {}, 0
+        if os.path.exists(self.path):
+            self._truncate_torn_tail()
+            with open(self.path, 'rb') as f:
+                pairs, lines = self._latest(f)
+        with self._lock:
+            self._keys = set(pairs)
+            self.lines = lines
+        self.maybe_compact()
+        return list(pairs.values())
+
+    def _truncate_torn_tail(self):
+        """Cut a partial final line so the next append starts on a fresh line"""
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            position = max(0, size - 65536)
+            while True:
+                f.seek(position)
+                newline = f.read(size - position).rfind(b'\n')
+                if newline >= 0 or position == 0:
+                    break
+                position = max(0, position - 65536)
+            f.truncate(position + newline + 1 if newline >= 0 else 0)
+        logger.warning(f"Truncated a partially written learned pair at the end of {self.path}")
+
+    def _import_legacy(self):
+        """Convert a whole-file learned_responses.json into the log once"""
+        if not self.legacy_path or os.path.exists(self.path) or not os.path.exists(self.legacy_path):
+            return
+        try:
+            with open(self.legacy_path, 'r') as f:
+                pairs = json.load(f)
+            self._write_file(self.path, (self._line(q, a) for q, a in pairs))
+            os.replace(self.legacy_path, self.legacy_path + '.migrated')
+            logger.info(f"Imported {len(pairs)} learned pairs from {self.legacy_path}")
+        except Exception as e:
+            logger.error(f"Error importing {self.legacy_path}: {str(e)}")
+
+    # Appending
+
+    @staticmethod
+    def _line(question, answer):
+        return json.dumps([question, answer], separators=(',', ':')).encode('utf-8') + b'\n'
+
+    def _open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def append(self, question, answer):
+        """Durably record one pair with a single appended line"""
+        line = self._line(question, answer)
+        with self._lock:
+            fd = self._open()
+            os.write(fd, line)
+            if self.fsync:
+                os.fsync(fd)
+            self._keys.add(pair_key(question))
+            self.lines += 1
+            self.appends += 1
+        self.maybe_compact()
+
+    # Compaction
+
+    def needs_compaction(self):
+        return (self.lines >= self.compact_min_lines
+                and self.lines > self.compact_ratio * max(1, len(self._keys)))
+
+    def maybe_compact(self):
+        """Start a background compaction if superseded lines dominate the log"""
+        with self._lock:
+            if self._compacting or not self.needs_compaction():
+                return False
+            self._compacting = True
+        threading.Thread(target=self._compact_in_background, name='learned-compaction', daemon=True).start()
+        return True
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Learned pair compaction failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _write_file(self, path, lines):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for line in lines:
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+    def compact(self):
+        """Rewrite the log with one line per question.
+
+        The bulk of the rewrite happens without the lock; lines appended
+        meanwhile are copied over under the lock just before the swap.
+        """
+        if not os.path.exists(self.path):
+            return 0
+        with self._lock:
+            end = os.path.getsize(self.path)
+        with open(self.path, 'rb') as f:
+            pairs, _ = self._latest(f, limit=end)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            for question, answer in pairs.values():
+                out.write(self._line(question, answer))
+            with self._lock:
+                with open(self.path, 'rb') as f:
+                    f.seek(end)
+                    tail = f.read()
+                out.write(tail)
+                out.flush()
+                os.fsync(out.fileno())
+                os.replace(tmp_path, self.path)
+                _fsync_directory(os.path.dirname(os.path.abspath(self.path)))
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                before = self.lines
+                self.lines = len(pairs) + tail.count(b'\n')
+                self.compactions += 1
+        logger.info(f"Compacted learned pairs from {before} to {self.lines} lines")
+        return before - self.lines
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def stats(self):
+        return {
+            'pairs': len(self._keys),
+            'lines': self.lines,
+            'appends': self.appends,
+            'compactions': self.compactions,
+            'skipped': self.skipped
+        }
+
+
+def benchmark(pairs=1000000, appends=1000):
+    """Load time for a log of `pairs` lines and per-append cost afterwards"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'learned_responses.jsonl')
+        log = LearnedPairLog(path, legacy_path=None, compact_min_lines=float('inf'))
+        # Every tenth line re-teaches an earlier question
+        log._write_file(path, (LearnedPairLog._line(f"question {n % (pairs - pairs // 10)}", f"answer {n}")
+                               for n in range(pairs)))
+        size = os.path.getsize(path)
+
+        started = time.perf_counter()
+        loaded = log.load()
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for n in range(appends):
+            log.append(f"new question {n}", f"new answer {n}")
+        append_seconds = (time.perf_counter() - started) / appends
+
+        started = time.perf_counter()
+        removed = log.compact()
+        compact_seconds = time.perf_counter() - started
+        log.close()
+        return {
+            'lines': pairs,
+            'pairs': len(loaded),
+            'megabytes': size / 2 ** 20,
+            'load_seconds': load_seconds,
+            'append_us': append_seconds * 1e6,
+            'compact_seconds': compact_seconds,
+            'compacted_lines': removed
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Learned pair log')
+    parser.add_argument('--benchmark', action='store_true', help='Measure load, append and compaction cost')
+    parser.add_argument('--pairs', type=int, default=1000000)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    result = benchmark(args.pairs)
+    print(f"Loaded {result['pairs']} distinct pairs from {result['lines']} lines "
+          f"({result['megabytes']:.1f} MB) in {result['load_seconds'] * 1000:.0f} ms")
+    print(f"Append (fsync'd): {result['append_us']:.0f} us")
+    print(f"Compaction removed {result['compacted_lines']} lines in {result['compact_seconds'] * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Precomputed lemma table.
+
+Built once at image build time from the NLTK bundle, so serving workers do
+not need to load WordNet:
+
+    python lemma_table.py build [--out PATH]
+
+The table is a sorted `word<TAB>lemma` text file (an empty lemma means the
+word is its own lemma). Workers memory-map it and binary-search it, so its
+pages live in the shared page cache rather than in each worker's heap.
+"""
+import os
+import sys
+import mmap
+import hashlib
+import logging
+import argparse
+from functools import lru_cache
+
+from nltk_bundle import DEFAULT_BUNDLE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLE_PATH = os.environ.get(
+    'NEXTOPSON_LEMMA_TABLE',
+    os.path.join(DEFAULT_BUNDLE_DIR, 'lemma_table.tsv')
+)
+# Set NEXTOPSON_WORDNET_FALLBACK=0 to never load WordNet in serving workers
+WORDNET_FALLBACK = os.environ.get('NEXTOPSON_WORDNET_FALLBACK', '1') != '0'
+
+
+class LemmaTable:
+    """Memory-mapped word -> lemma lookup with an optional WordNet fallback.
+
+    Exposes lemmatize() like WordNetLemmatizer (noun POS only, which is
+    all preprocess_input uses).
+    """
+
+    def __init__(self, path=None, fallback=None, cache_size=50000):
+        self.path = path or DEFAULT_TABLE_PATH
+        self.fallback = fallback
+        self.cache_size = cache_size
+        self._open()
+
+    def _open(self):
+        self.misses = 0
+        self._digest = None
+        with open(self.path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.path) else b''
+        self.lemmatize = lru_cache(maxsize=self.cache_size)(self._lemmatize)
+
+    def __getstate__(self):
+        # The mapping and the cache are per process; a copy reopens the table by path
+        return {'path': self.path, 'fallback': self.fallback, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __contains__(self, word):
+        return self._find(word.encode('utf-8')) is not None
+
+    def _find(self, key):
+        """Binary search the sorted table for key; return its lemma bytes or None"""
+        mm = self._mm
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b'\n', 0, mid) + 1
+            end = mm.find(b'\n', start)
+            if end == -1:
+                end = len(mm)
+            word, _, lemma = mm[start:end].partition(b'\t')
+            if word == key:
+                return lemma or word
+            if word < key:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+    def _lemmatize(self, word):
+        lemma = self._find(word.encode('utf-8'))
+        if lemma is not None:
+            return lemma.decode('utf-8')
+        self.misses += 1
+        if self.fallback is not None:
+            return self.fallback.lemmatize(word)
+        return word
+
+    def digest(self):
+        """SHA-256 of the table contents, so model keys change when it is rebuilt"""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self._mm).hexdigest()
+        return self._digest
+
+    def cache_info(self):
+        return self.lemmatize.cache_info()
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+
+def load_lemma_table(path=None, fallback=None):
+    """Open the lemma table, or return fallback if it has not been built"""
+    path = path or DEFAULT_TABLE_PATH
+    if not os.path.exists(path):
+        logger.warning(f"Lemma table not found at {path}; lemmatizing with WordNet")
+        return fallback
+    return LemmaTable(path, fallback if WORDNET_FALLBACK else None)
+
+
+def candidate_words(vocabulary=()):
+    """Training vocabulary plus WordNet nouns and their regular plurals"""
+    from nltk.corpus import wordnet
+
+    words = set(vocabulary)
+    for lemma in wordnet.all_lemma_names(pos=wordnet.NOUN):
+        if not lemma.isalpha():
+            continue
+        words.add(lemma)
+        words.add(lemma + 's')
+        if lemma.endswith(('s', 'x', 'z', 'ch', 'sh', 'o')):
+            words.add(lemma + 'es')
+        if lemma.endswith('y'):
+            words.add(lemma[:-1] + 'ies')
+    # Irregular plurals (children, mice, ...)
+    words.update(wordnet._exception_map[wordnet.NOUN])
+    return words
+
+
+def build_table(path=None, vocabulary=(), lemmatizer=None):
+    """Write the sorted lemma table for vocabulary and common English nouns"""
+    path = path or DEFAULT_TABLE_PATH
+    if lemmatizer is None:
+        from nltk_bundle import load_bundle
+        lemmatizer = load_bundle().lemmatizer
+
+    entries = []
+    for word in candidate_words(vocabulary):
+        if not word or '\t' in word or '\n' in word:
+            continue
+        lemma = lemmatizer.lemmatize(word)
+        entries.append((word.encode('utf-8'), b'' if lemma == word else lemma.encode('utf-8')))
+    entries.sort()
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\n'.join(word + b'\t' + lemma for word, lemma in entries))
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote {len(entries)} lemmas to {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+    return len(entries)
+
+
+def training_vocabulary(bot):
+    """Tokens of the bot's training questions before lemmatization"""
+    from text_normalizer import clean, tokenize
+
+    texts = [question for question, _ in bot.train_data]
+    vocabulary = set()
+    for text in texts:
+        vocabulary.update(tokenize(clean(text)))
+    return vocabulary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the precomputed lemma table')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--out', help='Table path (default: NEXTOPSON_LEMMA_TABLE or <bundle>/lemma_table.tsv)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from nextopson_bot import NextopsonSupportBot
+    bot = NextopsonSupportBot(load_model=False, use_lemma_table=False)
+    build_table(args.out, training_vocabulary(bot), bot.lemmatizer)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
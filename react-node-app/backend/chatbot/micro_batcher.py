@@ -0,0 +1,201 @@
+"""Micro-batching of concurrent calls into one vectorized call.
+
+Requests submitted from many threads are collected for up to `window`
+seconds after the first one arrives, or until `max_batch` are waiting,
+and then handed to fn(items) together. Each caller gets back its own
+element of the result list. For sklearn pipelines this turns many
+one-row predict_proba calls into a single call, at the cost of up to
+`window` seconds of extra latency per request. A caller whose batch has
+not come back within `timeout` seconds (a stuck or slow batch thread)
+stops waiting and calls fn([item]) itself.
+
+Compare throughput and latency with and without batching:
+
+    python micro_batcher.py --benchmark [--threads T] [--window-ms W]
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ('item', 'submitted', 'done', 'result', 'error', 'abandoned')
+
+    def __init__(self, item):
+        self.item = item
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class MicroBatcher:
+    """Groups concurrent submit() calls into batched fn(items) calls on one thread"""
+
+    def __init__(self, fn, window=0.002, max_batch=32, timeout=1.0, sample_size=10000):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+        # Recent batch sizes and queue delays, for stats()
+        self._sizes = deque(maxlen=sample_size)
+        self._delays = deque(maxlen=sample_size)
+        self.batches = 0
+        self.items = 0
+        self.timeouts = 0
+
+    def _ensure_worker(self):
+        # The worker thread does not survive gunicorn's fork; start one per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            threading.Thread(target=self._run, name='micro-batcher', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, item):
+        """fn([item, ...])[i] for this item, computed in a batch with concurrent callers"""
+        self._ensure_worker()
+        request = _Request(item)
+        self._queue.put(request)
+        if not request.done.wait(self.timeout):
+            request.abandoned = True
+            self.timeouts += 1
+            logger.warning(f"No batch result after {self.timeout}s; calling directly")
+            return self.fn([item])[0]
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        """First waiting request plus whatever arrives within the window"""
+        batch = [self._queue.get()]
+        deadline = batch[0].submitted + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [request for request in self._collect() if not request.abandoned]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                results = self.fn([request.item for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                logger.error(f"Batched call of {len(batch)} items failed: {str(e)}")
+                for request in batch:
+                    request.error = e
+            self.batches += 1
+            self.items += len(batch)
+            self._sizes.append(len(batch))
+            self._delays.extend(started - request.submitted for request in batch)
+            for request in batch:
+                request.done.set()
+
+    def stats(self):
+        sizes = sorted(self._sizes)
+        delays = sorted(self._delays)
+
+        def percentile(values, fraction):
+            return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+        return {
+            'window_ms': self.window * 1000,
+            'max_batch': self.max_batch,
+            'timeouts': self.timeouts,
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': sum(sizes) / len(sizes) if sizes else 0.0,
+            'max_batch_size': sizes[-1] if sizes else 0,
+            'queue_delay_ms_p50': percentile(delays, 0.5) * 1000,
+            'queue_delay_ms_p99': percentile(delays, 0.99) * 1000
+        }
+
+
+def benchmark(threads=16, requests=4000, window=0.002, max_batch=32):
+    """Throughput and latency of one-row predict_proba calls, direct and micro-batched"""
+    from bot_provider import get_bot
+    from inference import top_k_predictions
+
+    bot = get_bot()
+    texts = bot.preprocess_many([f"how do i list my {n % 3 + 1}bhk apartment near station {n}"
+                                 for n in range(requests)])
+
+    def run(call):
+        position = iter(range(requests))
+        lock = threading.Lock()
+        latencies = []
+
+        def loop():
+            while True:
+                with lock:
+                    n = next(position, None)
+                if n is None:
+                    return
+                start = time.perf_counter()
+                call(texts[n])
+                latencies.append(time.perf_counter() - start)
+
+        workers = [threading.Thread(target=loop) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'rps': requests / elapsed,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000
+        }
+
+    direct = run(lambda text: top_k_predictions(bot.pipeline, [text], 1)[0])
+    batcher = MicroBatcher(lambda items: top_k_predictions(bot.pipeline, items, 1), window, max_batch)
+    batched = run(batcher.submit)
+    return direct, batched, batcher.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-batched inference')
+    parser.add_argument('--benchmark', action='store_true', help='Compare direct and batched predict_proba')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    parser.add_argument('--max-batch', type=int, default=32)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    direct, batched, stats = benchmark(args.threads, args.requests, args.window_ms / 1000, args.max_batch)
+    for name, result in (('direct', direct), ('batched', batched)):
+        print(f"{name:>8}: {result['rps']:.0f} req/s, p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    print(f"Mean batch {stats['mean_batch_size']:.1f}, queue delay p50 {stats['queue_delay_ms_p50']:.1f} ms "
+          f"/ p99 {stats['queue_delay_ms_p99']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Default location for trained model artifacts
+DEFAULT_MODEL_DIR = os.environ.get(
+    'NEXTOPSON_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_artifacts')
+)
+
+
+def _sklearn_version():
+    # Imported lazily so importing the store does not pull in sklearn
+    import sklearn
+    return sklearn.__version__
+
+
+def pipeline_spec(**steps):
+    """Fingerprint form of a pipeline, from step=(estimator class name, constructor params)"""
+    return {name: {'class': estimator, 'params': dict(params)} for name, (estimator, params) in steps.items()}
+
+
+def fingerprint(train_data, preprocess_settings, pipeline_params):
+    """Content hash identifying a trained pipeline.
+
+    preprocess_settings must include the version of whatever normalizes
+    the training text; pipeline_params comes from pipeline_spec().
+    """
+    payload = {
+        'train_data': [list(pair) for pair in train_data],
+        'preprocess': preprocess_settings,
+        'pipeline': pipeline_params,
+        # Pickled estimators are only safe to load with the same sklearn
+        'sklearn': _sklearn_version(),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ModelStore:
+    """Content-addressed on-disk store for trained pipelines"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or DEFAULT_MODEL_DIR
+
+    def _artifact_path(self, key):
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _metadata_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def exists(self, key):
+        """Check whether an artifact exists for the key"""
+        return os.path.exists(self._artifact_path(key))
+
+    def load(self, key):
+        """Load the pipeline stored under key, or None if there is none"""
+        path = self._artifact_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                pipeline = pickle.load(f)
+            logger.info(f"Loaded model artifact {key[:12]} from {path}")
+            return pipeline
+        except Exception as e:
+            logger.error(f"Failed to load model artifact {path}: {str(e)}")
+            return None
+
+    def save(self, key, pipeline, metadata=None):
+        """Atomically write a pipeline artifact and its metadata"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_atomic(self._artifact_path(key),
+                           lambda f: pickle.dump(pipeline, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+        info = dict(metadata or {})
+        info.update({
+            'key': key,
+            'sklearn': _sklearn_version(),
+            'created_at': datetime.now().isoformat()
+        })
+        self._write_atomic(self._metadata_path(key),
+                           lambda f: f.write(json.dumps(info, indent=2).encode('utf-8')))
+        logger.info(f"Saved model artifact {key[:12]} to {self.directory}")
+        return self._artifact_path(key)
+
+    def list_artifacts(self):
+        """Return metadata for all stored artifacts"""
+        artifacts = []
+        if not os.path.isdir(self.directory):
+            return artifacts
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r') as f:
+                    artifacts.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return artifacts
+
+    def _write_atomic(self, path, writer):
+        # Write to a temp file in the same directory, then rename over the target
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,185 @@
+"""Near-duplicate detection for Q/A pairs with MinHash and LSH banding.
+
+A question is reduced to its set of words, and a MinHash signature of
+num_perm values estimates the Jaccard similarity of two such sets. The
+signature is cut into bands. Two questions become candidates when any
+band matches exactly, so a lookup touches only the questions sharing a
+bucket instead of the whole corpus. Candidates are then kept if their
+estimated similarity reaches the threshold.
+
+Deduplicate an existing learned-pairs log (stop the bot first, it keeps
+the log open for appending):
+
+    python near_duplicates.py learned_responses.jsonl [--threshold 0.8] [--write]
+"""
+import os
+import re
+import sys
+import json
+import zlib
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Universal hashing modulo a Mersenne prime; a * h stays below 2**63
+_PRIME = (1 << 31) - 1
+
+
+def normalize(text):
+    """Lowercase and strip punctuation, as the bots' preprocess_input does"""
+    return ' '.join(re.sub(r'[^\w\s]', '', text.lower()).split())
+
+
+def shingles(text):
+    """Stable 32-bit hashes of the distinct words of normalized text"""
+    return {zlib.crc32(word.encode('utf-8')) for word in text.split()}
+
+
+class NearDuplicateIndex:
+    """LSH index answering "which stored questions look like this one?"
+
+    With the default 16 bands of 4 rows, pairs at Jaccard 0.7 become
+    candidates with probability 0.98 and pairs at 0.3 with 0.12.
+    """
+
+    def __init__(self, threshold=0.7, num_perm=64, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm).astype(np.uint64)
+        self._lock = threading.Lock()
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self._items = []
+
+    def __len__(self):
+        return len(self._items)
+
+    def signature(self, text):
+        hashes = np.fromiter(shingles(text), dtype=np.uint64)
+        if not len(hashes):
+            return None
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+    def add(self, text, item):
+        """Index normalized text; item is what queries return for it"""
+        signature = self.signature(text)
+        if signature is None:
+            return
+        keys = self._band_keys(signature)
+        with self._lock:
+            position = len(self._items)
+            self._items.append(item)
+            self._signatures.append(signature)
+            for buckets, key in zip(self._buckets, keys):
+                buckets.setdefault(key, []).append(position)
+
+    def query(self, text, threshold=None):
+        """[(item, estimated Jaccard)] of stored questions at or above threshold, most similar first"""
+        threshold = self.threshold if threshold is None else threshold
+        signature = self.signature(text)
+        if signature is None:
+            return []
+        keys = self._band_keys(signature)
+        with self._lock:
+            candidates = set()
+            for buckets, key in zip(self._buckets, keys):
+                candidates.update(buckets.get(key, ()))
+            scored = [(self._items[position], float(np.mean(self._signatures[position] == signature)))
+                      for position in candidates]
+        matches = [(item, similarity) for item, similarity in scored if similarity >= threshold]
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def stats(self):
+        with self._lock:
+            sizes = [len(members) for buckets in self._buckets for members in buckets.values()]
+        return {
+            'questions': len(self._items),
+            'buckets': len(sizes),
+            'largest_bucket': max(sizes, default=0)
+        }
+
+
+def dedup_pairs(pairs, threshold=0.7, keep='last', preprocess=normalize):
+    """Split (question, answer) pairs into (kept, duplicates, conflicts).
+
+    pairs must be in the order they were taught. A near-duplicate question
+    with the same answer as a kept one is dropped and listed in duplicates
+    as (dropped pair, kept pair). One with a different answer is kept, as
+    learn_new_response would learn it, and listed in conflicts as (pair,
+    kept pair it conflicts with) for someone to resolve. With keep='last'
+    the most recently taught pair of a group survives, which matches how
+    re-teaching a question replaces its answer.
+    """
+    pairs = list(pairs)
+    ordered = pairs[::-1] if keep == 'last' else pairs
+    index = NearDuplicateIndex(threshold)
+    kept, duplicates, conflicts = [], [], []
+    for pair in ordered:
+        text = preprocess(pair[0])
+        matches = index.query(text)
+        same = [known for known, _ in matches if known[1] == pair[1]]
+        if same:
+            duplicates.append((pair, same[0]))
+            continue
+        if matches:
+            conflicts.append((pair, matches[0][0]))
+        index.add(text, pair)
+        kept.append(pair)
+    if keep == 'last':
+        kept.reverse()
+    return kept, duplicates, conflicts
+
+
+def _read_pairs(path):
+    if path.endswith('.jsonl'):
+        from learned_store import LearnedPairLog
+        # Exact repeats are already collapsed here, in the order each question was last taught
+        return LearnedPairLog(path, legacy_path=None, compact_min_lines=float('inf')).load()
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find near-duplicate questions in a learned-pairs file')
+    parser.add_argument('path', help='learned_responses.jsonl (or a JSON list of pairs)')
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--keep', choices=['first', 'last'], default='last')
+    parser.add_argument('--write', action='store_true', help='Rewrite the file without the duplicates')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    pairs = _read_pairs(args.path)
+    kept, duplicates, conflicts = dedup_pairs(pairs, args.threshold, args.keep)
+    for (question, _), (kept_question, _) in duplicates:
+        print(f"{question!r} duplicates {kept_question!r}")
+    for (question, _), (kept_question, _) in conflicts:
+        print(f"{question!r} conflicts with {kept_question!r} (kept, answers differ)")
+    print(f"{len(duplicates)} of {len(pairs)} pairs are near-duplicates, {len(conflicts)} conflict")
+
+    if args.write and duplicates:
+        from learned_store import LearnedPairLog
+        if args.path.endswith('.jsonl'):
+            lines = (LearnedPairLog._line(question, answer) for question, answer in kept)
+        else:
+            lines = [json.dumps(kept).encode('utf-8')]
+        LearnedPairLog(args.path, legacy_path=None)._write_file(args.path, lines)
+        print(f"Rewrote {os.path.basename(args.path)} with {len(kept)} pairs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,20 @@
-import re
-import string
-import random
-import json
+import os
+import time
 import logging
-from datetime import datetime
-from nltk.chat.util import Chat, reflections
-from sklearn.naive_bayes import MultinomialNB
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.pipeline import make_pipeline
-from collections import defaultdict
-import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-from sklearn.preprocessing import LabelEncoder
-import tensorflow as tf
-from tensorflow.keras.preprocessing.text import Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+from nltk.chat.util import reflections
+
+from model_store import ModelStore, fingerprint, pipeline_spec
+from nltk_bundle import load_bundle
+from lemma_table import LemmaTable, load_lemma_table
+from inference import InferenceResult, top_k_predictions
+from intent_matcher import IntentMatcher
+from feature_extractor import FeatureExtractor
+from text_normalizer import TextNormalizer, NORMALIZER_VERSION
+from response_cache import ResponseCache
+from interaction_record import InteractionRecord
+from conversation_context import ConversationContext
+from startup_report import NULL_REPORT
 
 
 # Set up logging
@@ -30,11 +24,155 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+INVALID_INPUT_RESPONSE = "I couldn't understand that. How can I help you with Nextopson's services?"
+ERROR_RESPONSE = "I'm having trouble processing your question. Could you please rephrase it?"
+
+# Question/answer pairs the classifier is trained on
+TRAIN_DATA = [
+    # Basic Information
+    ('What is Nextopson?', 'Nextopson is a zero-brokerage real estate platform that directly connects property buyers and sellers. We make property transactions simple and cost-effective.'),
+    ('How does Nextopson work?', 'Nextopson lets you list and find properties without any brokerage fees. Simply sign up, browse listings, or post your property to get started.'),
+    ('Why choose Nextopson?', 'Nextopson offers zero brokerage, direct buyer-seller connection, verified listings, and a hassle-free property transaction experience.'),
+    
+    # Property Listing
+    ('How do I list my property?', 'To list your property on Nextopson: 1) Sign up/Login 2) Click "Post Property" 3) Fill in property details 4) Upload photos 5) Submit for verification. Need help with any step?'),
+    ('What details do I need to list?', 'You\'ll need to provide property location, type, size, price, amenities, and high-quality photos. Would you like a detailed listing guide?'),
+    ('How long does listing take?', 'Property listing takes just 10-15 minutes. Our verification process typically completes within 24 hours.'),
+    
+    # Property Search
+    ('How to search properties?', 'Use our search filters to find properties by location, type, budget, and amenities. You can also save searches and get alerts for new matches.'),
+    ('Can I save properties?', 'Yes! Create a free account to save favorite properties, set alerts, and track property updates.'),
+    ('How to contact sellers?', 'Click "Contact Seller" on any listing to send a message or request property details directly through our platform.'),
+    
+    # Fees and Pricing
+    ('What are the fees?', 'Nextopson is completely free! We charge zero brokerage and no hidden fees for listing or searching properties.'),
+    ('Is there any commission?', 'No commission at all! Nextopson operates on a zero-brokerage model to make property transactions more affordable.'),
+    ('Are there premium services?', 'All our core services are free. We may offer optional premium features for enhanced visibility in the future.'),
+    
+    # Safety and Verification
+    ('Are listings verified?', 'Yes, our team verifies all property listings to ensure authenticity. We check property documents and seller credentials.'),
+    ('Is it safe to use Nextopson?', 'Absolutely! We verify all listings, secure your data, and facilitate safe communication between buyers and sellers.'),
+    ('How to report issues?', 'Use the "Report" button on listings or contact our support team through the help center for immediate assistance.'),
+    
+    # Account Management
+    ('How to create account?', 'Click "Sign Up" on nextopson.com, enter your details, verify your email, and start using our services immediately.'),
+    ('Edit my listing', 'Log in to your account, go to "My Listings," select the property, and click "Edit" to update any information.'),
+    ('Delete my listing', 'Access "My Listings" in your account, find the property, and use the "Delete Listing" option to remove it.'),
+    
+    # Support
+    ('Contact support', 'You can reach our support team through: 1) Help Center 2) support@nextopson.com 3) In-app chat 4) Customer care number.'),
+    ('Technical issues', 'For technical issues, please try refreshing the page or clearing your browser cache. If the problem persists, contact our support team.'),
+    ('Forgot password', 'Click "Forgot Password" on the login page, enter your registered email, and follow the reset instructions sent to you.'),
+    
+    # Documents
+    ('Required documents', 'For listing: Property ownership proof, tax receipts, and ID proof. For buying: Just create an account to start viewing properties.'),
+    ('Document verification', 'Our team verifies all property documents within 24 hours of submission to ensure authenticity.'),
+    ('Update documents', 'Log in, go to "My Listings," select your property, and use the "Update Documents" option to add or modify documents.'),
+    
+    # Navigation
+    ('Find my listings', 'After logging in, click on "My Account" and select "My Listings" to view all your property listings.'),
+    ('View saved properties', 'Access your saved properties through "My Account" → "Favorites" after logging in.'),
+    ('Search filters', 'Use our advanced filters for location, property type, price range, amenities, and more to find your perfect property.'),
+    
+    # Property Transaction
+    ('How to buy property?', 'Browse listings, contact sellers directly, negotiate, and proceed with documentation. Our team can guide you through each step.'),
+    ('Payment process', 'Payments are handled directly between buyers and sellers. We recommend secure payment methods and can provide guidance on the process.'),
+    ('Property inspection', 'Schedule property visits directly with sellers through our platform. We recommend thorough inspection before proceeding.'),
+
+    # New Additional Training Data
+    
+    # Mobile App
+    ('Is there a mobile app?', 'Yes, Nextopson is available on both iOS and Android. Download our app to search properties and manage listings on the go.'),
+    ('App features', 'Our mobile app offers property search, instant notifications, chat with sellers/buyers, and easy listing management.'),
+    ('App not working', 'Try updating the app to the latest version, check your internet connection, or clear the app cache. Contact support if issues persist.'),
+    
+    # Virtual Services
+    ('Virtual tour', 'Many properties offer virtual tours. Look for the "360° View" icon on listings to explore properties virtually.'),
+    ('Online documentation', 'You can upload and verify documents online through our secure platform. We accept digital signatures for most documents.'),
+    ('Video calling', 'Use our built-in video calling feature to have virtual meetings with property owners or buyers.'),
+    
+    # Property Types
+    ('Types of properties', 'We list residential properties (apartments, houses, villas), commercial spaces (offices, shops), and land/plots.'),
+    ('Residential options', 'Browse apartments, independent houses, villas, penthouses, studio apartments, and more in our residential section.'),
+    ('Commercial properties', 'Find offices, retail spaces, warehouses, industrial properties, and commercial land in our commercial section.'),
+    
+    # Location Based
+    ('Popular locations', 'View trending localities, upcoming areas, and premium locations in your city with our location guides.'),
+    ('Nearby amenities', 'Each listing shows nearby schools, hospitals, markets, and public transport options within a 5km radius.'),
+    ('Area guides', 'Access detailed area guides with information about locality, infrastructure, prices, and future development plans.'),
+    
+    # Pricing and Loans
+    ('Price negotiation', 'You can negotiate directly with sellers through our platform. We provide price trends to help make informed decisions.'),
+    ('Home loans', 'Compare home loan offers from multiple banks through our platform. We have partnered with leading financial institutions.'),
+    ('EMI calculator', 'Use our EMI calculator to estimate monthly payments based on loan amount, interest rate, and tenure.'),
+    
+    # Legal
+    ('Legal verification', 'We help verify property legal status and documentation. Optional legal assistance is available through our partner lawyers.'),
+    ('Property ownership', 'We verify property ownership and ensure all listings have clear titles before they go live on our platform.'),
+    ('Legal documents', 'Get guidance on required legal documents like sale deed, property tax receipts, NOC, and occupancy certificate.'),
+    
+    # Premium Features
+    ('Featured listing', 'Boost your property visibility with our featured listing option. Your property appears at the top of search results.'),
+    ('Premium membership', 'Premium members get priority support, advanced analytics, and exclusive access to pre-launch properties.'),
+    ('Marketing services', 'We offer professional photography, 3D tours, and social media promotion for premium listings.'),
+    
+    # Rental Properties
+    ('Rental listing', 'List your property for rent with detailed terms, preferred tenant profile, and rental agreement requirements.'),
+    ('Tenant verification', 'We offer tenant verification services including background checks and document verification.'),
+    ('Rental agreement', 'Access standard rental agreement templates or get customized agreements through our legal partners.'),
+    
+    # Investment
+    ('Investment advice', 'Our market insights and property analytics help you make informed investment decisions.'),
+    ('ROI calculator', 'Calculate potential returns on your property investment using our ROI calculator tool.'),
+    ('Market trends', 'Access real-time market trends, price history, and future projections for different localities.'),
+    
+    # Additional Services
+    ('Interior design', 'Connect with our partner interior designers for home renovation and decoration services.'),
+    ('Packers and movers', 'Book verified packers and movers through our platform for hassle-free relocation.'),
+    ('Property management', 'Our property management services help you maintain and manage your property remotely.'),
+    
+    # Support Queries
+    ('Response time', 'We typically respond to queries within 2 hours during business hours (9 AM - 6 PM).'),
+    ('Feedback', 'Share your feedback through our app/website or email us at feedback@nextopson.com'),
+    ('File complaint', 'Report issues or file complaints through our grievance redressal system for quick resolution.')
+]
+
+
 class NextopsonSupportBot:
-    def __init__(self):
-        #Initialize conversation memory
-        self.conversation_memory = defaultdict(list)
+    def __init__(self, model_store=None, load_model=True, startup_report=None, use_lemma_table=True,
+                 session_store=None, inference_processes=None, batch_window_ms=None):
+        report = startup_report or NULL_REPORT
+
+        # Trained pipelines are shared between processes through the model store
+        self.model_store = model_store or ModelStore()
+        self.model_version = None
+
+        # Optional process pool for normalization and classification (0 disables it)
+        if inference_processes is None:
+            inference_processes = int(os.environ.get('NEXTOPSON_INFERENCE_PROCESSES', '0'))
+        self.inference_processes = inference_processes
+        self.inference_pool = None
+        self._shared_model = None
+
+        # Optional micro-batching of concurrent predict_proba calls (a 0 ms window disables it)
+        if batch_window_ms is None:
+            batch_window_ms = float(os.environ.get('NEXTOPSON_BATCH_WINDOW_MS', '0'))
+        self.batcher = None
+        if batch_window_ms > 0:
+            from micro_batcher import MicroBatcher
+            self.batcher = MicroBatcher(self._predict_batch, batch_window_ms / 1000,
+                                        int(os.environ.get('NEXTOPSON_MAX_BATCH', '32')),
+                                        float(os.environ.get('NEXTOPSON_BATCH_TIMEOUT_MS', '1000')) / 1000)
+
+        # Cache of deterministic per-input work, keyed by normalized input and model version
+        self.response_cache = ResponseCache(max_size=10000, ttl=3600)
+
+        #Initialize conversation memory (bounded, idle sessions expire; see session_backends)
         self.memory_size = 5
+        if session_store is None:
+            from session_backends import open_session_store
+            session_store = open_session_store(max_history=self.memory_size)
+        self.conversation_memory = session_store
         
         # Sentiment patterns
         self.sentiment_patterns = {
@@ -43,17 +181,16 @@ class NextopsonSupportBot:
             'urgent': r'\b(urgent|asap|emergency|immediately|quick|hurry)\b'
         }
         
-        # Initialize NLTK components
-        try:
-            nltk.download('punkt')
-            nltk.download('wordnet')
-            nltk.download('stopwords')
-            self.stop_words = set(stopwords.words('english'))
-            self.lemmatizer = WordNetLemmatizer()
-        except Exception as e:
-            logger.error(f"NLTK initialization error: {str(e)}")
-            self.stop_words = set()
-            self.lemmatizer = None
+        # Load NLTK components from the offline bundle (no network access)
+        with report.phase('nltk setup'):
+            resources = load_bundle()
+            self.nltk_path = [resources.directory]
+            self.stop_words = resources.stop_words
+            # Precomputed lemmas; WordNet is only loaded for words missing from the table
+            if use_lemma_table:
+                self.lemmatizer = load_lemma_table(fallback=resources.lemmatizer)
+            else:
+                self.lemmatizer = resources.lemmatizer
         
         # Property type patterns
         self.property_types = {
@@ -66,114 +203,43 @@ class NextopsonSupportBot:
         self.location_patterns = r'\b(near|location|area|city|locality|address)\b'
         self.price_patterns = r'\b(price|cost|budget|expensive|cheap|affordable)\b'
 
-        self.train_data = [
-            # Basic Information
-            ('What is Nextopson?', 'Nextopson is a zero-brokerage real estate platform that directly connects property buyers and sellers. We make property transactions simple and cost-effective.'),
-            ('How does Nextopson work?', 'Nextopson lets you list and find properties without any brokerage fees. Simply sign up, browse listings, or post your property to get started.'),
-            ('Why choose Nextopson?', 'Nextopson offers zero brokerage, direct buyer-seller connection, verified listings, and a hassle-free property transaction experience.'),
-            
-            # Property Listing
-            ('How do I list my property?', 'To list your property on Nextopson: 1) Sign up/Login 2) Click "Post Property" 3) Fill in property details 4) Upload photos 5) Submit for verification. Need help with any step?'),
-            ('What details do I need to list?', 'You\'ll need to provide property location, type, size, price, amenities, and high-quality photos. Would you like a detailed listing guide?'),
-            ('How long does listing take?', 'Property listing takes just 10-15 minutes. Our verification process typically completes within 24 hours.'),
-            
-            # Property Search
-            ('How to search properties?', 'Use our search filters to find properties by location, type, budget, and amenities. You can also save searches and get alerts for new matches.'),
-            ('Can I save properties?', 'Yes! Create a free account to save favorite properties, set alerts, and track property updates.'),
-            ('How to contact sellers?', 'Click "Contact Seller" on any listing to send a message or request property details directly through our platform.'),
-            
-            # Fees and Pricing
-            ('What are the fees?', 'Nextopson is completely free! We charge zero brokerage and no hidden fees for listing or searching properties.'),
-            ('Is there any commission?', 'No commission at all! Nextopson operates on a zero-brokerage model to make property transactions more affordable.'),
-            ('Are there premium services?', 'All our core services are free. We may offer optional premium features for enhanced visibility in the future.'),
-            
-            # Safety and Verification
-            ('Are listings verified?', 'Yes, our team verifies all property listings to ensure authenticity. We check property documents and seller credentials.'),
-            ('Is it safe to use Nextopson?', 'Absolutely! We verify all listings, secure your data, and facilitate safe communication between buyers and sellers.'),
-            ('How to report issues?', 'Use the "Report" button on listings or contact our support team through the help center for immediate assistance.'),
-            
-            # Account Management
-            ('How to create account?', 'Click "Sign Up" on nextopson.com, enter your details, verify your email, and start using our services immediately.'),
-            ('Edit my listing', 'Log in to your account, go to "My Listings," select the property, and click "Edit" to update any information.'),
-            ('Delete my listing', 'Access "My Listings" in your account, find the property, and use the "Delete Listing" option to remove it.'),
-            
-            # Support
-            ('Contact support', 'You can reach our support team through: 1) Help Center 2) support@nextopson.com 3) In-app chat 4) Customer care number.'),
-            ('Technical issues', 'For technical issues, please try refreshing the page or clearing your browser cache. If the problem persists, contact our support team.'),
-            ('Forgot password', 'Click "Forgot Password" on the login page, enter your registered email, and follow the reset instructions sent to you.'),
-            
-            # Documents
-            ('Required documents', 'For listing: Property ownership proof, tax receipts, and ID proof. For buying: Just create an account to start viewing properties.'),
-            ('Document verification', 'Our team verifies all property documents within 24 hours of submission to ensure authenticity.'),
-            ('Update documents', 'Log in, go to "My Listings," select your property, and use the "Update Documents" option to add or modify documents.'),
-            
-            # Navigation
-            ('Find my listings', 'After logging in, click on "My Account" and select "My Listings" to view all your property listings.'),
-            ('View saved properties', 'Access your saved properties through "My Account" → "Favorites" after logging in.'),
-            ('Search filters', 'Use our advanced filters for location, property type, price range, amenities, and more to find your perfect property.'),
-            
-            # Property Transaction
-            ('How to buy property?', 'Browse listings, contact sellers directly, negotiate, and proceed with documentation. Our team can guide you through each step.'),
-            ('Payment process', 'Payments are handled directly between buyers and sellers. We recommend secure payment methods and can provide guidance on the process.'),
-            ('Property inspection', 'Schedule property visits directly with sellers through our platform. We recommend thorough inspection before proceeding.'),
+        # Precompiled extractor for all analysis fields
+        self.features = FeatureExtractor(
+            self.sentiment_patterns, self.property_types,
+            self.location_patterns, self.price_patterns
+        )
 
-            # New Additional Training Data
-            
-            # Mobile App
-            ('Is there a mobile app?', 'Yes, Nextopson is available on both iOS and Android. Download our app to search properties and manage listings on the go.'),
-            ('App features', 'Our mobile app offers property search, instant notifications, chat with sellers/buyers, and easy listing management.'),
-            ('App not working', 'Try updating the app to the latest version, check your internet connection, or clear the app cache. Contact support if issues persist.'),
-            
-            # Virtual Services
-            ('Virtual tour', 'Many properties offer virtual tours. Look for the "360° View" icon on listings to explore properties virtually.'),
-            ('Online documentation', 'You can upload and verify documents online through our secure platform. We accept digital signatures for most documents.'),
-            ('Video calling', 'Use our built-in video calling feature to have virtual meetings with property owners or buyers.'),
-            
-            # Property Types
-            ('Types of properties', 'We list residential properties (apartments, houses, villas), commercial spaces (offices, shops), and land/plots.'),
-            ('Residential options', 'Browse apartments, independent houses, villas, penthouses, studio apartments, and more in our residential section.'),
-            ('Commercial properties', 'Find offices, retail spaces, warehouses, industrial properties, and commercial land in our commercial section.'),
-            
-            # Location Based
-            ('Popular locations', 'View trending localities, upcoming areas, and premium locations in your city with our location guides.'),
-            ('Nearby amenities', 'Each listing shows nearby schools, hospitals, markets, and public transport options within a 5km radius.'),
-            ('Area guides', 'Access detailed area guides with information about locality, infrastructure, prices, and future development plans.'),
-            
-            # Pricing and Loans
-            ('Price negotiation', 'You can negotiate directly with sellers through our platform. We provide price trends to help make informed decisions.'),
-            ('Home loans', 'Compare home loan offers from multiple banks through our platform. We have partnered with leading financial institutions.'),
-            ('EMI calculator', 'Use our EMI calculator to estimate monthly payments based on loan amount, interest rate, and tenure.'),
-            
-            # Legal
-            ('Legal verification', 'We help verify property legal status and documentation. Optional legal assistance is available through our partner lawyers.'),
-            ('Property ownership', 'We verify property ownership and ensure all listings have clear titles before they go live on our platform.'),
-            ('Legal documents', 'Get guidance on required legal documents like sale deed, property tax receipts, NOC, and occupancy certificate.'),
-            
-            # Premium Features
-            ('Featured listing', 'Boost your property visibility with our featured listing option. Your property appears at the top of search results.'),
-            ('Premium membership', 'Premium members get priority support, advanced analytics, and exclusive access to pre-launch properties.'),
-            ('Marketing services', 'We offer professional photography, 3D tours, and social media promotion for premium listings.'),
-            
-            # Rental Properties
-            ('Rental listing', 'List your property for rent with detailed terms, preferred tenant profile, and rental agreement requirements.'),
-            ('Tenant verification', 'We offer tenant verification services including background checks and document verification.'),
-            ('Rental agreement', 'Access standard rental agreement templates or get customized agreements through our legal partners.'),
-            
-            # Investment
-            ('Investment advice', 'Our market insights and property analytics help you make informed investment decisions.'),
-            ('ROI calculator', 'Calculate potential returns on your property investment using our ROI calculator tool.'),
-            ('Market trends', 'Access real-time market trends, price history, and future projections for different localities.'),
-            
-            # Additional Services
-            ('Interior design', 'Connect with our partner interior designers for home renovation and decoration services.'),
-            ('Packers and movers', 'Book verified packers and movers through our platform for hassle-free relocation.'),
-            ('Property management', 'Our property management services help you maintain and manage your property remotely.'),
-            
-            # Support Queries
-            ('Response time', 'We typically respond to queries within 2 hours during business hours (9 AM - 6 PM).'),
-            ('Feedback', 'Share your feedback through our app/website or email us at feedback@nextopson.com'),
-            ('File complaint', 'Report issues or file complaints through our grievance redressal system for quick resolution.')
-        ]
+        # Property term normalization
+        self.property_terms = {
+            'apt': 'apartment',
+            'prop': 'property',
+            'comm': 'commercial',
+            'resi': 'residential',
+            'loc': 'location',
+            '1bhk': 'one bhk',
+            '2bhk': 'two bhk',
+            '3bhk': 'three bhk'
+        }
+
+        self.normalizer = TextNormalizer(self.stop_words, self.lemmatizer, self.property_terms)
+
+        # ML pipeline hyperparameters (stop words are already removed by the normalizer)
+        self.vectorizer_params = {
+            'ngram_range': (1, 2),
+            'max_features': 5000,
+            'min_df': 1,
+            'max_df': 0.95
+        }
+        self.classifier_params = {
+            'n_estimators': 50,
+            'max_depth': 10,
+            'min_samples_split': 5,
+            'min_samples_leaf': 1,
+            'class_weight': 'balanced',
+            'random_state': 42
+        }
+
+        self.train_data = list(TRAIN_DATA)
 
  
 
@@ -256,13 +322,59 @@ class NextopsonSupportBot:
         ]
 
         # Initialize model and chat
-        self.initialize_model()
-        self.chat = Chat(self.pairs, reflections)
+        if load_model:
+            with report.phase('model load/training'):
+                self.initialize_model()
+        with report.phase('pattern compilation'):
+            self.chat = IntentMatcher(self.pairs, reflections)
+
+    def preprocess_settings(self):
+        """Settings that change the output of preprocess_input"""
+        table = self.lemmatizer if isinstance(self.lemmatizer, LemmaTable) else None
+        return {
+            'normalizer': NORMALIZER_VERSION,
+            # Stop words, lemmas and the fallback tokenizer come from NLTK
+            'nltk': nltk.__version__,
+            'lemmatize': self.lemmatizer is not None,
+            # Lemmas come from this table, and from WordNet for words missing from it
+            'lemma_table': table.digest() if table else None,
+            'wordnet_fallback': table.fallback is not None if table else None,
+            'stop_words': sorted(self.stop_words),
+            'property_terms': self.property_terms
+        }
+
+    def model_key(self):
+        """Artifact key for the current training data and settings"""
+        return fingerprint(
+            self.train_data,
+            self.preprocess_settings(),
+            pipeline_spec(vectorizer=('TfidfVectorizer', self.vectorizer_params),
+                          classifier=('RandomForestClassifier', self.classifier_params))
+        )
 
     def initialize_model(self):
-        """Initialize and train enhanced ML models"""
+        """Load the trained pipeline from the model store, training only on a miss"""
+        key = self.model_key()
+        pipeline = self.model_store.load(key)
+        if pipeline is not None:
+            self.set_pipeline(pipeline, key)
+            logger.info(f"Model {key[:12]} loaded from artifact store")
+            return
+
+        logger.warning(f"No model artifact for {key[:12]}, training in-process")
+        self.train_model()
+
+    def train_model(self):
+        """Train and validate the ML pipeline"""
+        # Training-only dependencies; serving processes that load an artifact never import them
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.pipeline import make_pipeline
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import classification_report
+
         # Prepare data
-        X_train = [self.preprocess_input(x[0]) for x in self.train_data]
+        X_train = self.preprocess_many([x[0] for x in self.train_data])
         y_train = [x[1] for x in self.train_data]
         
         # Split data for validation
@@ -271,98 +383,87 @@ class NextopsonSupportBot:
         )
         
         # Enhanced ML Pipeline
-        self.pipeline = make_pipeline(
-            TfidfVectorizer(
-                ngram_range=(1, 2),
-                max_features=5000,
-                stop_words='english',
-                min_df=1,
-                max_df=0.95
-            ),
-            RandomForestClassifier(
-                n_estimators=50,
-                max_depth=10,
-                min_samples_split=5,
-                min_samples_leaf=1,
-                class_weight='balanced',
-                random_state=42
-            )
+        pipeline = make_pipeline(
+            TfidfVectorizer(**self.vectorizer_params),
+            RandomForestClassifier(**self.classifier_params)
         )
         
         try:
-            self.pipeline.fit(X_train, y_train)
+            pipeline.fit(X_train, y_train)
             
             # Validate model
-            val_pred = self.pipeline.predict(X_val)
+            val_pred = pipeline.predict(X_val)
             validation_report = classification_report(y_val, val_pred,zero_division=1)
             logger.info(f"Model validation report:\n{validation_report}")
             
+            self.set_pipeline(pipeline, self.model_key())
             logger.info("Model initialized successfully")
+            return validation_report
         except Exception as e:
             logger.error(f"Model initialization error: {str(e)}")
             raise
 
+    def set_pipeline(self, pipeline, version):
+        """Install a trained pipeline and drop responses cached for the old one"""
+        self.pipeline = pipeline
+        self.model_version = version
+        self.response_cache.clear()
+        if self.inference_processes:
+            self._share_pipeline(pipeline)
+
+    def _share_pipeline(self, pipeline):
+        """Export the pipeline to shared memory and point a fresh inference pool at it"""
+        from shared_model import SharedForest
+        from inference_pool import InferencePool
+
+        self.close_inference_pool()
+        try:
+            self._shared_model = SharedForest.export(pipeline)
+            self.inference_pool = InferencePool(self._shared_model.manifest, self.normalizer,
+                                                self.inference_processes, self.nltk_path)
+        except Exception as e:
+            logger.error(f"Inference pool disabled: {str(e)}")
+            self.close_inference_pool()
+
+    def close_inference_pool(self):
+        if self.inference_pool is not None:
+            self.inference_pool.stop()
+            self.inference_pool = None
+        if self._shared_model is not None:
+            self._shared_model.close()
+            self._shared_model = None
+
+    def save_model(self):
+        """Write the trained pipeline to the model store"""
+        return self.model_store.save(self.model_version, self.pipeline, {
+            'samples': len(self.train_data),
+            'preprocess': {'lemmatize': self.lemmatizer is not None}
+        })
+
 
     def preprocess_input(self, text):
         """Enhanced input preprocessing"""
-        if not text:
-            return ""
-        
-        # Convert to lowercase
-        text = text.lower()
-        
-        # Remove special characters but keep question marks and basic punctuation
-        text = re.sub(r'[^\w\s?.!,]', '', text)
-        
-        # Tokenization and lemmatization
-        if self.lemmatizer:
-            tokens = word_tokenize(text)
-            tokens = [self.lemmatizer.lemmatize(token) for token in tokens 
-                     if token not in self.stop_words]
-        else:
-            tokens = text.split()
-        
-        # Property term normalization
-        property_terms = {
-            'apt': 'apartment',
-            'prop': 'property',
-            'comm': 'commercial',
-            'resi': 'residential',
-            'loc': 'location',
-            '1bhk': 'one bhk',
-            '2bhk': 'two bhk',
-            '3bhk': 'three bhk'
-        }
-        
-        normalized_tokens = [property_terms.get(token, token) for token in tokens]
-        return ' '.join(normalized_tokens)
+        return self.normalizer.normalize(text)
+
+    def preprocess_many(self, texts):
+        """Preprocess a batch of inputs"""
+        return self.normalizer.normalize_many(texts)
 
     def analyze_input(self, text):
         """Analyze user input for patterns and context"""
-        analysis = {
-            'sentiment': self.detect_sentiment(text),
-            'property_type': self.detect_property_type(text),
-            'has_location': bool(re.search(self.location_patterns, text, re.IGNORECASE)),
-            'has_price': bool(re.search(self.price_patterns, text, re.IGNORECASE)),
-            'word_count': len(text.split()),
-            'is_question': '?' in text,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        return analysis
+        return self.features.extract(text)
+
+    def analyze_many(self, texts):
+        """Analyze a batch of inputs"""
+        return self.features.extract_many(texts)
 
     def detect_sentiment(self, text):
         """Detect sentiment in user input"""
-        for sentiment, pattern in self.sentiment_patterns.items():
-            if re.search(pattern, text, re.IGNORECASE):
-                return sentiment
-        return 'neutral'
+        return self.features.extract(text).sentiment
 
     def detect_property_type(self, text):
         """Detect property type from user input"""
-        for prop_type, pattern in self.property_types.items():
-            if re.search(pattern, text, re.IGNORECASE):
-                return prop_type
-        return 'general'
+        return self.features.extract(text).property_type
 
     def contains_inappropriate_language(self, text):
         """Check for inappropriate content"""
@@ -373,26 +474,49 @@ class NextopsonSupportBot:
         words = text.lower().split()
         return any(word in inappropriate_words for word in words)
 
-    def get_ml_response(self, user_input):
-        """Enhanced ML response generation"""
-        try:
-            # Preprocess input
-            cleaned_input = self.preprocess_input(user_input)
-            
-            # Get prediction and confidence
-            prediction = self.pipeline.predict([cleaned_input])[0]
-            confidence = max(self.pipeline.predict_proba([cleaned_input])[0])
-            
-            # Log prediction details for debugging
-            logger.debug(f"Input: {cleaned_input}")
-            logger.debug(f"Prediction: {prediction}")
-            logger.debug(f"Confidence: {confidence}")
-            
-            return prediction, float(confidence)
-            
-        except Exception as e:
-            logger.error(f"ML response error: {str(e)}")
-            return None, 0.0
+    def prepare(self, user_input):
+        """Preprocess and analyze input once, returning an unclassified result"""
+        result = InferenceResult(user_input, self.model_version)
+        with result.timed('preprocess'):
+            result.normalized_text = self.preprocess_input(user_input)
+        with result.timed('analyze'):
+            result.analysis = self.analyze_input(result.normalized_text)
+        return result
+
+    def _predict_batch(self, texts):
+        """Top-3 classes of each text from one predict_proba call (the micro-batcher's fn)"""
+        return top_k_predictions(self.pipeline, texts, 3)
+
+    def classify(self, result, top_k=3):
+        """Fill in the top-k classes with a single predict_proba call"""
+        with result.timed('predict'):
+            try:
+                if self.batcher is not None and top_k <= 3:
+                    # Shares one predict_proba call with concurrent requests
+                    result.top_k = self.batcher.submit(result.normalized_text)[:top_k]
+                else:
+                    result.top_k = top_k_predictions(self.pipeline, [result.normalized_text], top_k)[0]
+            except Exception as e:
+                logger.error(f"ML response error: {str(e)}")
+                result.top_k = []
+        return result
+
+    def infer(self, user_input, top_k=3):
+        """Single-pass inference: normalized text, analysis, top-k classes and timings"""
+        return self.classify(self.prepare(user_input), top_k)
+
+    def get_ml_response(self, cleaned_input):
+        """Enhanced ML response generation for already preprocessed input"""
+        result = InferenceResult(cleaned_input, self.model_version)
+        result.normalized_text = cleaned_input
+        self.classify(result, top_k=1)
+        
+        # Log prediction details for debugging
+        logger.debug(f"Input: {cleaned_input}")
+        logger.debug(f"Prediction: {result.prediction}")
+        logger.debug(f"Confidence: {result.confidence}")
+        
+        return result.prediction, result.confidence
 
 
     def get_contextual_fallback_response(self, analysis):
@@ -419,31 +543,19 @@ class NextopsonSupportBot:
 
     def update_memory(self, user_id, interaction):
         """Update conversation memory"""
-        self.conversation_memory[user_id].append(interaction)
-        if len(self.conversation_memory[user_id]) > self.memory_size:
-            self.conversation_memory[user_id].pop(0)
+        if isinstance(interaction, dict):
+            # Topics are found once here and then kept as running counts by the store
+            topics = self.features.property_type_hits(interaction.get('input', ''))
+            interaction = InteractionRecord.from_dict(interaction, topics)
+        self.conversation_memory.append(user_id, interaction)
 
     def _get_conversation_context(self, user_id):
-        """Get conversation context for user"""
-        if user_id in self.conversation_memory:
-            return {
-                'interaction_count': len(self.conversation_memory[user_id]),
-                'previous_sentiments': [i.get('analysis', {}).get('sentiment', 'neutral') 
-                                      for i in self.conversation_memory[user_id]],
-                'topics': self._analyze_frequent_topics(user_id)
-            }
-        return {}
+        """Get conversation context for user (loaded lazily on first access)"""
+        return ConversationContext(self.conversation_memory, user_id)
 
     def _analyze_frequent_topics(self, user_id):
         """Analyze frequent topics in conversation"""
-        topics = defaultdict(int)
-        if user_id in self.conversation_memory:
-            for interaction in self.conversation_memory[user_id]:
-                input_text = interaction.get('input', '')
-                for prop_type in self.property_types:
-                    if re.search(self.property_types[prop_type], input_text, re.IGNORECASE):
-                        topics[prop_type] += 1
-        return dict(topics)
+        return ConversationContext(self.conversation_memory, user_id).topics
 
     def enhance_response(self, base_response, analysis, context):
         """Enhance response with context and analysis"""
@@ -467,65 +579,227 @@ class NextopsonSupportBot:
 
         return response
 
+    def warmup(self, inputs=('hello', 'what are the fees', 'how do i list my property')):
+        """Run sample inputs through every stage so the first real request is not slow"""
+        warmup_user = '__warmup__'
+        for text in inputs:
+            self.get_response(text, warmup_user)
+        self.conversation_memory.pop(warmup_user)
+
+    def normalize_and_classify(self, user_input):
+        """(normalized input, top-1 classes or None).
+
+        With an inference pool both run in another process; otherwise only
+        normalization runs here and classification is left to _decide.
+        """
+        if self.inference_pool is not None and self.inference_pool.available:
+            try:
+                return self.inference_pool.infer(user_input, top_k=1)
+            except Exception as e:
+                logger.error(f"Inference pool error: {str(e)}; running in-process")
+        return self.preprocess_input(user_input), None
+
+    def _decide(self, cleaned_input, top_k=None):
+        """Deterministic part of get_response for a normalized input.
+
+        Cached per (normalized input, model version). Random response
+        selection and memory updates stay per request. top_k, when given,
+        is the input's classification from the inference pool.
+        """
+        key = (cleaned_input, self.model_version)
+        decision = self.response_cache.get(key)
+        if decision is not None:
+            return dict(decision, analysis=decision['analysis'].with_timestamp(time.time()))
+
+        decision = {
+            'analysis': self.analyze_input(cleaned_input),
+            'inappropriate': self.contains_inappropriate_language(cleaned_input),
+            'pattern': (None, None),
+            'prediction': None,
+            'confidence': 0.0
+        }
+        if not decision['inappropriate']:
+            decision['pattern'] = self.chat.match(cleaned_input)
+            if decision['pattern'][0] is None:
+                if top_k is not None:
+                    prediction, confidence = top_k[0] if top_k else (None, 0.0)
+                else:
+                    prediction, confidence = self.get_ml_response(cleaned_input)
+                decision['prediction'] = prediction
+                decision['confidence'] = confidence
+        self.response_cache.put(key, decision)
+        return decision
+
+    def _decide_many(self, cleaned_inputs, top_ks=None):
+        """_decide for a batch of normalized inputs.
+
+        Repeated inputs are decided once. Cache misses are analyzed in one
+        pass and those that reach the ML stage are classified with a single
+        predict_proba call, unless top_ks already holds their classes.
+        """
+        version = self.model_version
+        now = time.time()
+        decisions = [None] * len(cleaned_inputs)
+        misses = {}
+        for position, cleaned_input in enumerate(cleaned_inputs):
+            decision = self.response_cache.get((cleaned_input, version))
+            if decision is not None:
+                decisions[position] = dict(decision, analysis=decision['analysis'].with_timestamp(now))
+            else:
+                misses.setdefault(cleaned_input, []).append(position)
+        if not misses:
+            return decisions
+
+        texts = list(misses)
+        fresh = {}
+        unmatched = []
+        for text, analysis in zip(texts, self.analyze_many(texts)):
+            decision = {
+                'analysis': analysis,
+                'inappropriate': self.contains_inappropriate_language(text),
+                'pattern': (None, None),
+                'prediction': None,
+                'confidence': 0.0
+            }
+            if not decision['inappropriate']:
+                decision['pattern'] = self.chat.match(text)
+                if decision['pattern'][0] is None:
+                    unmatched.append(text)
+            fresh[text] = decision
+
+        if unmatched:
+            if top_ks is not None:
+                predictions = [top_ks[misses[text][0]] for text in unmatched]
+            else:
+                try:
+                    predictions = top_k_predictions(self.pipeline, unmatched, 1)
+                except Exception as e:
+                    logger.error(f"ML response error: {str(e)}")
+                    predictions = [[] for _ in unmatched]
+            for text, top_k in zip(unmatched, predictions):
+                fresh[text]['prediction'], fresh[text]['confidence'] = top_k[0] if top_k else (None, 0.0)
+
+        for text, decision in fresh.items():
+            self.response_cache.put((text, version), decision)
+            for position in misses[text]:
+                decisions[position] = decision
+        return decisions
+
+    def _respond(self, cleaned_input, decision, user_id):
+        """Response for a decided input, recording the interaction in user_id's memory"""
+        analysis = decision['analysis']
+
+        # Check for inappropriate language
+        if decision['inappropriate']:
+            return "Let's keep our conversation professional. How can I assist you with your property needs?"
+
+        # Get conversation context
+        context = self._get_conversation_context(user_id)
+
+        # Try pattern matching first
+        pattern_index, pattern_match = decision['pattern']
+        if pattern_index is not None:
+            chat_response = self.chat.render(pattern_index, pattern_match)
+            self.update_memory(user_id, {
+                'input': cleaned_input,
+                'response': chat_response,
+                'analysis': analysis,
+                'confidence': 0.5
+            })
+            return chat_response
+
+        # Use ML model
+        ml_response, confidence = decision['prediction'], decision['confidence']
+        if ml_response and confidence > 0.4:
+            enhanced_response = self.enhance_response(ml_response, analysis, context)
+            self.update_memory(user_id, {
+                'input': cleaned_input,
+                'response': enhanced_response,
+                'analysis': analysis,
+                'confidence': float(confidence)
+            })
+            return enhanced_response
+
+        # If confidence is low but we have a property type
+        if analysis['property_type'] != 'general':
+            return self.get_property_type_response(analysis['property_type'])
+
+        return self.get_contextual_fallback_response(analysis)
+
     def get_response(self, user_input, user_id='default'):
         """Main response generation method"""
         if not isinstance(user_input, str) or not user_input.strip():
-            return "I couldn't understand that. How can I help you with Nextopson's services?"
+            return INVALID_INPUT_RESPONSE
         
         try:
             # Clean and analyze input
-            cleaned_input = self.preprocess_input(user_input)
-            analysis = self.analyze_input(cleaned_input)
-            
-            # Check for inappropriate language
-            if self.contains_inappropriate_language(cleaned_input):
-                return "Let's keep our conversation professional. How can I assist you with your property needs?"
-            
-            # Get conversation context
-            context = self._get_conversation_context(user_id)
-            
-            # Try pattern matching first
-            chat_response = self.chat.respond(cleaned_input)
-            if chat_response:
-                self.update_memory(user_id, {
-                    'input': cleaned_input,
-                    'response': chat_response,
-                    'analysis': analysis,
-                    'confidence': 0.5
-                })
-                return chat_response
-            
-            # Use ML model
-            ml_response, confidence = self.get_ml_response(cleaned_input)
-            if ml_response and confidence > 0.4:
-                enhanced_response = self.enhance_response(ml_response, analysis, context)
-                self.update_memory(user_id, {
-                    'input': cleaned_input,
-                    'response': enhanced_response,
-                    'analysis': analysis,
-                    'confidence': float(confidence)
-                })
-                return enhanced_response
-            
-            # If confidence is low but we have a property type
-            if analysis['property_type'] != 'general':
-                return self.get_property_type_response(analysis['property_type'])
-                
-            return self.get_contextual_fallback_response(analysis)
+            cleaned_input, top_k = self.normalize_and_classify(user_input)
+            return self._respond(cleaned_input, self._decide(cleaned_input, top_k), user_id)
             
         except Exception as e:
             logger.error(f"Response generation error: {str(e)}")
-            return "I'm having trouble processing your question. Could you please rephrase it?"
-
-def initialize_bot():
+            return ERROR_RESPONSE
+
+    def normalize_and_classify_many(self, user_inputs):
+        """(normalized inputs, top-1 classes per input or None) for a batch"""
+        if self.inference_pool is not None and self.inference_pool.available:
+            try:
+                results = self.inference_pool.infer_many(user_inputs, top_k=1)
+                return [cleaned for cleaned, _ in results], [top_k for _, top_k in results]
+            except Exception as e:
+                logger.error(f"Inference pool error: {str(e)}; running in-process")
+        return self.preprocess_many(user_inputs), None
+
+    def respond_many(self, user_inputs, user_ids='default'):
+        """get_response for a batch of inputs, in input order.
+
+        Normalization, analysis and classification each run once over the
+        whole batch; responses are then built and recorded one input at a
+        time, so an input sees the memory left by earlier inputs of the same
+        user just as with sequential get_response calls. user_ids is one id
+        for every input or a list with one id per input.
+        """
+        user_inputs = list(user_inputs)
+        if isinstance(user_ids, str):
+            user_ids = [user_ids] * len(user_inputs)
+        elif len(user_ids) != len(user_inputs):
+            raise ValueError(f"Got {len(user_ids)} user ids for {len(user_inputs)} inputs")
+
+        responses = [INVALID_INPUT_RESPONSE] * len(user_inputs)
+        valid = [position for position, user_input in enumerate(user_inputs)
+                 if isinstance(user_input, str) and user_input.strip()]
+        if not valid:
+            return responses
+        try:
+            cleaned_inputs, top_ks = self.normalize_and_classify_many([user_inputs[position] for position in valid])
+            decisions = self._decide_many(cleaned_inputs, top_ks)
+        except Exception as e:
+            logger.error(f"Batch response generation error: {str(e)}")
+            for position in valid:
+                responses[position] = ERROR_RESPONSE
+            return responses
+
+        for position, cleaned_input, decision in zip(valid, cleaned_inputs, decisions):
+            try:
+                responses[position] = self._respond(cleaned_input, decision, user_ids[position])
+            except Exception as e:
+                logger.error(f"Response generation error: {str(e)}")
+                responses[position] = ERROR_RESPONSE
+        return responses
+
+def initialize_bot(startup_report=None):
     """Initialize the bot"""
     try:
-        bot = NextopsonSupportBot()
+        bot = NextopsonSupportBot(startup_report=startup_report)
         logger.info("Bot initialized successfully")
         return bot
     except Exception as e:
         logger.error(f"Bot initialization error: {str(e)}")
         raise
 
-# Initialize bot when module is loaded
-bot = initialize_bot()
\ No newline at end of file
+def __getattr__(name):
+    # Keep `nextopson_bot.bot` working without building a bot at import time
+    if name == 'bot':
+        from bot_provider import get_bot
+        return get_bot()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,162 @@
+"""Offline NLTK resource bundle.
+
+The bundle is built once, at image build time, with network access:
+
+    python nltk_bundle.py build [--dir DIR]
+    python nltk_bundle.py verify [--dir DIR]
+
+At runtime the bot loads it read-only from NEXTOPSON_NLTK_DATA (default
+./nltk_data) and never calls nltk.download().
+"""
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUNDLE_DIR = os.environ.get(
+    'NEXTOPSON_NLTK_DATA',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+)
+MANIFEST_NAME = 'MANIFEST.json'
+
+# Downloader package id -> resource path used by nltk.data.find
+RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+    'stopwords': 'corpora/stopwords'
+}
+
+
+class NLTKBundleError(RuntimeError):
+    """Raised when the NLTK bundle is missing or does not match its manifest"""
+
+
+class NLTKResources:
+    """Loaded NLTK components used by the bot"""
+
+    def __init__(self, stop_words, lemmatizer, directory):
+        self.stop_words = stop_words
+        self.lemmatizer = lemmatizer
+        self.directory = directory
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _bundle_files(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, directory)
+            if rel_path != MANIFEST_NAME:
+                yield rel_path.replace(os.sep, '/'), path
+
+
+def build_bundle(directory=None):
+    """Download the resources into directory and write a checksum manifest"""
+    import nltk
+
+    directory = directory or DEFAULT_BUNDLE_DIR
+    os.makedirs(directory, exist_ok=True)
+    for package in RESOURCES:
+        if not nltk.download(package, download_dir=directory, quiet=True, raise_on_error=True):
+            raise NLTKBundleError(f"Failed to download NLTK package {package!r}")
+
+    files = {}
+    for rel_path, path in sorted(_bundle_files(directory)):
+        files[rel_path] = {'sha256': _sha256(path), 'size': os.path.getsize(path)}
+
+    manifest = {
+        'nltk_version': nltk.__version__,
+        'resources': RESOURCES,
+        'files': files
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    logger.info(f"Built NLTK bundle with {len(files)} files in {directory}")
+    return manifest
+
+
+def read_manifest(directory=None):
+    """Read the bundle manifest, failing if the bundle is missing"""
+    directory = directory or DEFAULT_BUNDLE_DIR
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise NLTKBundleError(
+            f"NLTK bundle not found at {directory}; run `python nltk_bundle.py build` at build time"
+        )
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def verify_bundle(directory=None, checksums=False):
+    """Check every manifest file is present with the recorded size (and hash)"""
+    directory = directory or DEFAULT_BUNDLE_DIR
+    manifest = read_manifest(directory)
+    for rel_path, info in manifest['files'].items():
+        path = os.path.join(directory, *rel_path.split('/'))
+        if not os.path.exists(path):
+            raise NLTKBundleError(f"NLTK bundle file missing: {rel_path}")
+        if os.path.getsize(path) != info['size']:
+            raise NLTKBundleError(f"NLTK bundle file has wrong size: {rel_path}")
+        if checksums and _sha256(path) != info['sha256']:
+            raise NLTKBundleError(f"NLTK bundle file has wrong checksum: {rel_path}")
+    return manifest
+
+
+def load_bundle(directory=None, checksums=False):
+    """Point NLTK at the bundle only and load the components the bot needs"""
+    import nltk
+    from nltk.corpus import stopwords
+    from nltk.stem import WordNetLemmatizer
+
+    directory = os.path.abspath(directory or DEFAULT_BUNDLE_DIR)
+    manifest = verify_bundle(directory, checksums=checksums)
+
+    # Search nowhere else, so a missing resource fails instead of falling back
+    nltk.data.path[:] = [directory]
+    for package, resource in manifest['resources'].items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            raise NLTKBundleError(f"NLTK resource {package!r} missing from bundle {directory}")
+
+    return NLTKResources(
+        stop_words=set(stopwords.words('english')),
+        lemmatizer=WordNetLemmatizer(),
+        directory=directory
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or verify the offline NLTK bundle')
+    parser.add_argument('command', choices=['build', 'verify'])
+    parser.add_argument('--dir', help='Bundle directory (default: NEXTOPSON_NLTK_DATA or ./nltk_data)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        if args.command == 'build':
+            build_bundle(args.dir)
+        else:
+            manifest = verify_bundle(args.dir, checksums=True)
+            logger.info(f"NLTK bundle OK ({len(manifest['files'])} files)")
+    except NLTKBundleError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""Non-blocking, structured logging for the chatbot API.
+
+configure() sends every log record through a bounded in-memory queue to a
+QueueListener thread that does the formatting and the writes, so a request
+thread only pays for building the record and never waits on disk. When the
+queue is full, records are dropped and counted instead of blocking.
+
+The log file holds one JSON object per line. Long string fields (request
+bodies, user agents) are capped at max_field characters. The file rotates
+when it passes max_bytes or when it is rotate_seconds old, whichever comes
+first, and backup_count old files are kept. Rotating one file from
+several processes would rename it out from under the others, so each
+process writes a file of its own: the process that called configure()
+uses the path as given, and a process forked from it (a gunicorn worker
+after preload) switches to <name>.<tag><ext> on its first record. The tag
+is set with set_process_tag() (gunicorn.conf.py gives each worker slot a
+stable one) and defaults to pid<pid>.
+
+Each request produces one access record. A sample_rate fraction of them
+are kept; 5xx responses are always kept.
+
+Compare per-request logging overhead with the old synchronous setup:
+
+    python request_log.py --benchmark [--requests N] [--sample-rate R] [--disk-latency-ms D]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger('access')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_sample_rate = 1.0
+_handler = None
+_process_tag = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON line per record: time, level, logger, message and the record's `fields`"""
+
+    def __init__(self, max_field=512):
+        super().__init__()
+        self.max_field = max_field
+
+    def _cap(self, value):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        if isinstance(value, str) and len(value) > self.max_field:
+            return f"{value[:self.max_field]}... [{len(value) - self.max_field} more chars]"
+        return value
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': self._cap(record.getMessage())
+        }
+        for key, value in (getattr(record, 'fields', None) or {}).items():
+            entry[key] = self._cap(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizedTimedRotatingFileHandler(RotatingFileHandler):
+    """Rotates once the file passes max_bytes or is interval seconds old, with numbered backups"""
+
+    def __init__(self, filename, max_bytes, interval, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.interval = interval
+        self.path = self.baseFilename
+        self._pid = os.getpid()
+        self._schedule()
+
+    def _schedule(self):
+        # Like TimedRotatingFileHandler, an existing file's age counts from its last write
+        filename = self.baseFilename
+        started = os.stat(filename).st_mtime if os.path.exists(filename) else time.time()
+        self.rollover_at = started + self.interval
+
+    def _adopt(self):
+        """Move a forked process onto its own file; the inherited one is the parent's to rotate"""
+        if self.stream is not None:
+            # Flushed after every record, so closing writes nothing twice
+            self.stream.close()
+            self.stream = None
+        root, ext = os.path.splitext(self.path)
+        self.baseFilename = f"{root}.{_process_tag or f'pid{os.getpid()}'}{ext}"
+        self._pid = os.getpid()
+        self._schedule()
+
+    def _due(self, size):
+        if self.interval and time.time() >= self.rollover_at:
+            if self.stream.tell() > 0:
+                return True
+            # Nothing to rotate yet; start the next period from now
+            self.rollover_at = time.time() + self.interval
+        return self.maxBytes > 0 and self.stream.tell() + size >= self.maxBytes
+
+    def emit(self, record):
+        # RotatingFileHandler formats each record twice (size check, then write); format once here
+        try:
+            if self._pid != os.getpid():
+                self._adopt()
+            message = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if self._due(len(message)):
+                self.doRollover()
+                self.stream = self._open()
+            self.stream.write(message)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may be full of records; wait for room rather than fail to stop
+        self.queue.put(self._sentinel)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue that drops instead of blocking.
+
+    The listener thread does not survive gunicorn's fork, so each process
+    starts its own on first use.
+    """
+
+    def __init__(self, targets, max_queue=10000):
+        super().__init__(queue.Queue(max_queue))
+        self.targets = targets
+        self.max_queue = max_queue
+        self.listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Records queued before a fork belong to the parent's listener
+            self.queue = queue.Queue(self.max_queue)
+            self.listener = _Listener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Merge args and render the traceback now; both may change before the listener runs
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out what is queued and stop this process's listener"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+        for target in self.targets:
+            target.close()
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize() if self._pid == os.getpid() else 0,
+            'dropped': self.dropped
+        }
+
+
+def configure(path='chatbot_api.log', level=logging.INFO, sample_rate=1.0, max_field=512,
+              max_bytes=10 * 2 ** 20, rotate_seconds=86400, backup_count=7, max_queue=10000):
+    """Route all logging through one background writer: text to stderr, JSON lines to path"""
+    global _sample_rate, _handler
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    targets = [console]
+    if path:
+        log_file = SizedTimedRotatingFileHandler(path, max_bytes, rotate_seconds, backup_count)
+        log_file.setFormatter(JsonFormatter(max_field))
+        targets.append(log_file)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+        if isinstance(existing, AsyncQueueHandler):
+            existing.stop()
+    _handler = AsyncQueueHandler(targets, max_queue)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _sample_rate = sample_rate
+    atexit.register(_handler.stop)
+    return _handler
+
+
+def set_process_tag(tag):
+    """Name this forked process's log files <name>.<tag><ext> instead of by pid (call before it logs)"""
+    global _process_tag
+    _process_tag = str(tag)
+
+
+def sampled(status):
+    """Whether to log a request that ended with status; decide before building the record"""
+    return status >= 500 or _sample_rate >= 1 or random.random() < _sample_rate
+
+
+def log_request(method, path, status, duration, **fields):
+    """One structured access record for a finished request"""
+    fields.update(method=method, path=path, status=status, duration_ms=round(duration * 1000, 3))
+    access_logger.info(f"{method} {path} {status}", extra={'fields': fields})
+
+
+def stats():
+    return dict(_handler.stats() if _handler is not None else {'queued': 0, 'dropped': 0},
+                sample_rate=_sample_rate)
+
+
+def benchmark(requests=20000, sample_rate=1.0, pause=0.0002, disk_latency=0.0):
+    """Mean and p99 microseconds of logging per request, old synchronous setup vs the queue.
+
+    Requests are `pause` seconds apart (the time spent serving them), which
+    is when the listener thread catches up. disk_latency adds that many
+    seconds to every flush, as a slow or busy disk would.
+    """
+    headers = ("Host: localhost:5000\r\nUser-Agent: Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36\r\n"
+               "Accept: application/json\r\nContent-Type: application/json\r\nContent-Length: 61\r\n"
+               "Origin: http://localhost:3000\r\nAccept-Encoding: gzip, deflate, br\r\n")
+    body = b'{"user_input": "how do i list my 2bhk apartment", "user_id": "u1"}'
+
+    def measure(log_one):
+        latencies = []
+        for n in range(requests):
+            start = time.perf_counter()
+            log_one(n)
+            latencies.append(time.perf_counter() - start)
+            if pause:
+                time.sleep(pause)
+        latencies.sort()
+        return {
+            'mean_us': sum(latencies) / len(latencies) * 1e6,
+            'p99_us': latencies[int(len(latencies) * 0.99)] * 1e6
+        }
+
+    def on_slow_disk(handler):
+        if disk_latency:
+            flush = handler.flush
+
+            def slow_flush():
+                flush()
+                time.sleep(disk_latency)
+            handler.flush = slow_flush
+        return handler
+
+    bench = logging.getLogger('request_log.benchmark')
+    bench.propagate = False
+    bench.setLevel(logging.INFO)
+    directory = tempfile.mkdtemp()
+    try:
+        # Before: headers, body and chat input written synchronously per request
+        sync = on_slow_disk(logging.FileHandler(os.path.join(directory, 'sync.log')))
+        sync.setFormatter(logging.Formatter(TEXT_FORMAT))
+        bench.addHandler(sync)
+
+        def old(n):
+            bench.info('Headers: %s', headers)
+            bench.info('Body: %s', body)
+            bench.info(f"Processing chat request - User ID: u1, Input: how do i list my 2bhk apartment {n}")
+
+        before = measure(old)
+        bench.removeHandler(sync)
+        sync.close()
+
+        # After: one sampled JSON record, written by the listener thread
+        global _sample_rate
+        previous_rate, _sample_rate = _sample_rate, sample_rate
+        log_file = on_slow_disk(SizedTimedRotatingFileHandler(os.path.join(directory, 'async.log'),
+                                                              10 * 2 ** 20, 86400, 2))
+        log_file.setFormatter(JsonFormatter())
+        handler = AsyncQueueHandler([log_file])
+        access_propagate, access_level = access_logger.propagate, access_logger.level
+        access_logger.propagate = False
+        access_logger.setLevel(logging.INFO)
+        access_logger.addHandler(handler)
+
+        def new(n):
+            if sampled(200):
+                log_request('POST', '/chat', 200, 0.004, remote='127.0.0.1',
+                            user_agent='Mozilla/5.0 (X11; Linux x86_64)', body=body)
+
+        try:
+            after = measure(new)
+            drain_started = time.perf_counter()
+            handler.stop()
+            after['drain_s'] = time.perf_counter() - drain_started
+            after['dropped'] = handler.dropped
+        finally:
+            access_logger.removeHandler(handler)
+            access_logger.propagate = access_propagate
+            access_logger.setLevel(access_level)
+            _sample_rate = previous_rate
+        return before, after
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Queued, sampled JSON request logging')
+    parser.add_argument('--benchmark', action='store_true', help='Compare with synchronous file logging')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--pause-ms', type=float, default=0.2, help='Time between requests')
+    parser.add_argument('--disk-latency-ms', type=float, default=0.0, help='Simulated delay per flush')
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    before, after = benchmark(args.requests, args.sample_rate, args.pause_ms / 1000, args.disk_latency_ms / 1000)
+    print(f"  synchronous: {before['mean_us']:.1f} us/request mean, {before['p99_us']:.1f} us p99")
+    print(f"queued (x{args.sample_rate:g}): {after['mean_us']:.1f} us/request mean, {after['p99_us']:.1f} us p99 "
+          f"({after['drain_s']:.2f} s to drain, {after['dropped']} dropped)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import pickle
+import logging
+import importlib
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+
+class ServingModel:
+    """A fitted pipeline and its version, swapped as one object.
+
+    Requests read bot.model once and use that object throughout, so a
+    retrain finishing mid-request never mixes two models.
+    """
+
+    __slots__ = ('pipeline', 'version')
+
+    def __init__(self, pipeline, version):
+        self.pipeline = pipeline
+        self.version = version
+
+
+def fit_tfidf_nb(pairs):
+    """TF-IDF + MultinomialNB over (question, answer) pairs.
+
+    Top-level so a retrain subprocess can import it.
+    """
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.pipeline import make_pipeline
+
+    pipeline = make_pipeline(TfidfVectorizer(), MultinomialNB())
+    pipeline.fit([question for question, _ in pairs], [answer for _, answer in pairs])
+    return pipeline
+
+
+def fit_in_subprocess(fit, data):
+    """Run fit(data) in a fresh interpreter and return the unpickled result.
+
+    A fresh `python retrain_scheduler.py` rather than multiprocessing: fork
+    is unsafe in a threaded server, and spawn would re-run the server's
+    main module in the child.
+    """
+    env = dict(os.environ)
+    here = os.path.dirname(os.path.abspath(__file__))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [here, env.get('PYTHONPATH')]))
+    proc = subprocess.run(
+        [sys.executable, os.path.join(here, 'retrain_scheduler.py'), f"{fit.__module__}:{fit.__qualname__}"],
+        input=pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL),
+        capture_output=True, env=env, check=False
+    )
+    if proc.returncode != 0:
+        # The last stderr line is the exception a failed fit raised
+        lines = proc.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"Retrain subprocess exited with status {proc.returncode}")
+    return pickle.loads(proc.stdout)
+
+
+class RetrainScheduler:
+    """Debounced, coalescing background retrains.
+
+    request() marks the model stale. A retrain starts once no request has
+    arrived for `debounce` seconds, or `max_delay` seconds after the first
+    request of a burst, whichever comes first. Requests arriving while a
+    retrain runs are coalesced into one follow-up retrain.
+
+    A run calls snapshot() for the training data, fit(data) (in a separate
+    process when use_process is set, so fitting does not hold the serving
+    process's GIL), validate(model, data) and finally install(model).
+    """
+
+    def __init__(self, snapshot, fit, install, validate=None, debounce=2.0, max_delay=30.0,
+                 use_process=True):
+        self.snapshot = snapshot
+        self.fit = fit
+        self.install = install
+        self.validate = validate
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.use_process = use_process
+        self._cond = threading.Condition()
+        self._first_request = None
+        self._last_request = None
+        self._running = False
+        self._thread = None
+        self.requests = 0
+        self.runs = 0
+        self.failures = 0
+        self.rejected = 0
+        self.last_duration = None
+        self.last_error = None
+
+    def request(self):
+        """Note that the training data changed"""
+        now = time.monotonic()
+        with self._cond:
+            self.requests += 1
+            if self._first_request is None:
+                self._first_request = now
+            self._last_request = now
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='retrain-scheduler', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _due_in(self, now):
+        """Seconds until the pending retrain should start (caller holds the condition)"""
+        return min(self._last_request + self.debounce, self._first_request + self.max_delay) - now
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._first_request is None:
+                        if not self._cond.wait(timeout=60):
+                            # Idle: let the thread exit, request() starts a new one
+                            if self._first_request is None:
+                                self._thread = None
+                                return
+                        continue
+                    wait = self._due_in(time.monotonic())
+                    if wait <= 0:
+                        break
+                    self._cond.wait(timeout=wait)
+                self._first_request = self._last_request = None
+                self._running = True
+            try:
+                self.run_now()
+            finally:
+                with self._cond:
+                    self._running = False
+
+    def _fit(self, data):
+        if not self.use_process:
+            return self.fit(data)
+        try:
+            return fit_in_subprocess(self.fit, data)
+        except Exception as e:
+            logger.error(f"Retrain subprocess failed ({str(e)}); fitting in-process")
+            self.use_process = False
+            return self.fit(data)
+
+    def run_now(self):
+        """Retrain, validate and install synchronously; return whether a model was installed"""
+        started = time.perf_counter()
+        try:
+            data = self.snapshot()
+            model = self._fit(data)
+            if self.validate is not None and not self.validate(model, data):
+                self.rejected += 1
+                logger.warning("Retrained model failed validation; keeping the current model")
+                return False
+            self.install(model)
+            self.runs += 1
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Retrain failed: {str(e)}")
+            return False
+        finally:
+            self.last_duration = time.perf_counter() - started
+
+    def stats(self):
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'runs': self.runs,
+                'rejected': self.rejected,
+                'failures': self.failures,
+                'pending': self._first_request is not None,
+                'running': self._running,
+                'last_duration': self.last_duration,
+                'last_error': self.last_error
+            }
+
+
+if __name__ == '__main__':
+    # Retrain subprocess: pickled training data on stdin, pickled model on stdout
+    module_name, _, function_name = sys.argv[1].partition(':')
+    fit = getattr(importlib.import_module(module_name), function_name)
+    model = fit(pickle.loads(sys.stdin.buffer.read()))
+    sys.stdout.buffer.write(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
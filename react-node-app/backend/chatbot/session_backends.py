@@ -0,0 +1,519 @@
+"""Session store backends shared between gunicorn workers.
+
+Every backend has the SessionStore interface: append, history, summary,
+get, pop, clear, reap, stats, stop, len() and `in`. Pick one with
+NEXTOPSON_SESSION_STORE:
+
+    memory                      per-process SessionStore (default); journaled to
+                                NEXTOPSON_SESSION_JOURNAL if that is set
+    sqlite:///path/sessions.db  SQLite in WAL mode, writes batched by a background thread
+    unix:///path/sessions.sock  session_server.py listening on a local socket
+
+Measure the per-request cost (one history read plus one append) with:
+
+    python session_backends.py --benchmark
+"""
+import os
+import sys
+import json
+import time
+import heapq
+import socket
+import logging
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+from session_store import SessionStore, HistoryFilter, count_keys
+from session_journal import DEFAULT_JOURNAL_DIR, SessionJournal, JournaledSessionStore, item_payload, from_payload
+from interaction_record import InteractionRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_STORE = os.environ.get('NEXTOPSON_SESSION_STORE', 'memory')
+
+
+def encode_item(item):
+    """Serialize a history item; InteractionRecords are stored as plain rows"""
+    return json.dumps(item_payload(item), separators=(',', ':'))
+
+
+def decode_item(data):
+    return from_payload(json.loads(data))
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite database in WAL mode, shared by every worker on the host.
+
+    append() only queues the item; a writer thread commits queued items in
+    one transaction every flush_interval seconds (or as soon as batch_size
+    are waiting). Reads merge this process's unflushed items, so a worker
+    always sees its own writes. Uses wall-clock time, which unlike
+    time.monotonic is comparable across processes.
+    """
+
+    def __init__(self, path, max_history=5, max_sessions=100000, idle_ttl=1800,
+                 flush_interval=0.02, batch_size=256, reap_interval=60):
+        self.path = path
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.reap_interval = reap_interval
+        self.evictions = 0
+        self.expirations = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._inflight = []
+        self._sequence = 0
+        self._writer_pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        with self._connect() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS interactions (
+                    key TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    item TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS interactions_user ON interactions (user_id, ts);
+                CREATE TABLE IF NOT EXISTS sessions (
+                    user_id TEXT PRIMARY KEY,
+                    last_seen REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen);
+            ''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _conn(self):
+        """Connection for the calling thread (connections are never shared across a fork)"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self._connect()
+            local.pid = os.getpid()
+        return local.conn
+
+    def _ensure_writer(self):
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._pending = []
+            self._inflight = []
+            threading.Thread(target=self._write_loop, name='session-writer', daemon=True).start()
+            self._writer_pid = os.getpid()
+
+    def __len__(self):
+        cutoff = self._cutoff()
+        return self._conn().execute('SELECT COUNT(*) FROM sessions WHERE last_seen >= ?', (cutoff,)).fetchone()[0]
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def _cutoff(self):
+        return time.time() - self.idle_ttl if self.idle_ttl is not None else float('-inf')
+
+    def append(self, user_id, item):
+        self._ensure_writer()
+        with self._lock:
+            self._sequence += 1
+            self._pending.append((f"{os.getpid()}:{time.time_ns()}:{self._sequence}", user_id, time.time(), encode_item(item)))
+            wake = len(self._pending) >= self.batch_size
+        if wake:
+            self._wake.set()
+
+    def _local_items(self, user_id):
+        with self._lock:
+            return [entry for entry in self._inflight + self._pending if entry[1] == user_id]
+
+    def history(self, user_id):
+        local = self._local_items(user_id)
+        rows = self._conn().execute('''
+            SELECT i.key, i.ts, i.item FROM interactions i JOIN sessions s ON s.user_id = i.user_id
+            WHERE i.user_id = ? AND s.last_seen >= ?
+            ORDER BY i.ts DESC LIMIT ?
+        ''', (user_id, self._cutoff(), self.max_history)).fetchall()
+        seen = {key for key, _, _ in rows}
+        entries = [(ts, item) for _, ts, item in rows]
+        entries.extend((ts, item) for key, _, ts, item in local if key not in seen)
+        entries.sort(key=lambda entry: entry[0])
+        return [decode_item(item) for _, item in entries[-self.max_history:]]
+
+    def summary(self, user_id):
+        history = self.history(user_id)
+        return history, count_keys(history)
+
+    def page(self, user_id, cursor=None, limit=50, match=None):
+        """(items, next cursor) of a user's history after cursor, oldest first (see SessionStore.page).
+
+        The time range of a HistoryFilter is applied in SQL on the append
+        time; any other condition is checked on decoded rows. This
+        worker's unflushed appends are merged in, as in history(), so
+        paging never waits for the writer.
+        """
+        limit = max(1, limit)
+        ts, key = float('-inf'), ''
+        if cursor is not None:
+            ts, _, key = cursor.partition('|')
+            ts = float(ts)
+        since, until = getattr(match, 'since', None), getattr(match, 'until', None)
+        topic_only = HistoryFilter(topic=match.topic) if isinstance(match, HistoryFilter) else match
+
+        local = sorted(
+            (entry_ts, entry_key, data) for entry_key, _, entry_ts, data in self._local_items(user_id)
+            if (entry_ts, entry_key) > (ts, key)
+            and (since is None or entry_ts >= since) and (until is None or entry_ts <= until)
+        )
+        local_keys = {entry_key for _, entry_key, _ in local}
+        committed = (row for row in self._page_rows(user_id, ts, key, since, until, limit)
+                     if row[1] not in local_keys)
+        items = []
+        for entry_ts, entry_key, data in heapq.merge(committed, local):
+            item = decode_item(data)
+            if not topic_only or topic_only(item):
+                items.append(item)
+                if len(items) >= limit:
+                    return items, f"{entry_ts!r}|{entry_key}"
+        return items, None
+
+    def _page_rows(self, user_id, ts, key, since, until, batch):
+        """Committed (ts, key, item) rows of a live session after (ts, key), in order"""
+        conditions, params = '', [user_id, self._cutoff(), ts, ts, key]
+        if since is not None:
+            conditions += ' AND i.ts >= ?'
+            params.append(since)
+        if until is not None:
+            conditions += ' AND i.ts <= ?'
+            params.append(until)
+        conn = self._conn()
+        while True:
+            rows = conn.execute(f'''
+                SELECT i.ts, i.key, i.item FROM interactions i JOIN sessions s ON s.user_id = i.user_id
+                WHERE i.user_id = ? AND s.last_seen >= ? AND (i.ts > ? OR (i.ts = ? AND i.key > ?)){conditions}
+                ORDER BY i.ts, i.key LIMIT ?
+            ''', params + [batch]).fetchall()
+            yield from rows
+            if len(rows) < batch:
+                return
+            params[2:5] = [rows[-1][0], rows[-1][0], rows[-1][1]]
+
+    def get(self, user_id):
+        history = self.history(user_id)
+        return history or None
+
+    def pop(self, user_id, default=None):
+        history = self.history(user_id)
+        with self._lock:
+            self._pending = [entry for entry in self._pending if entry[1] != user_id]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM interactions WHERE user_id = ?', (user_id,))
+        conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+        conn.execute('COMMIT')
+        return history or default
+
+    def clear(self):
+        with self._lock:
+            self._pending = []
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM interactions')
+        conn.execute('DELETE FROM sessions')
+        conn.execute('COMMIT')
+
+    def flush(self):
+        """Commit every queued item in one transaction"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch = self._pending
+            self._pending = []
+            self._inflight = batch
+        if not batch:
+            return 0
+        users = {}
+        for _, user_id, ts, _ in batch:
+            users[user_id] = max(ts, users.get(user_id, ts))
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT OR IGNORE INTO interactions (key, user_id, ts, item) VALUES (?, ?, ?, ?)', batch)
+            conn.executemany('''
+                INSERT INTO sessions (user_id, last_seen) VALUES (?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)
+            ''', users.items())
+            # Keep only the newest max_history items of every session touched
+            conn.executemany('''
+                DELETE FROM interactions WHERE user_id = ? AND key NOT IN (
+                    SELECT key FROM interactions WHERE user_id = ? ORDER BY ts DESC LIMIT ?
+                )
+            ''', [(user_id, user_id, self.max_history) for user_id in users])
+            conn.execute('COMMIT')
+        except Exception:
+            # Requeue first: BEGIN itself may have failed (database is locked), leaving nothing to roll back
+            with self._lock:
+                self._pending = batch + self._pending
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            with self._lock:
+                self._inflight = []
+        return len(batch)
+
+    def _write_loop(self):
+        stop = self._stop
+        last_reap = time.monotonic()
+        while not stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self.reap_interval is not None and time.monotonic() - last_reap >= self.reap_interval:
+                    self.reap()
+                    last_reap = time.monotonic()
+            except Exception as e:
+                logger.error(f"Session writer error: {str(e)}")
+                stop.wait(1)
+
+    def reap(self):
+        """Delete expired sessions and the least recently used ones past max_sessions"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        expired = conn.execute('DELETE FROM sessions WHERE last_seen < ?', (self._cutoff(),)).rowcount
+        overflow = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0] - self.max_sessions
+        evicted = 0
+        if overflow > 0:
+            evicted = conn.execute('''
+                DELETE FROM sessions WHERE user_id IN (
+                    SELECT user_id FROM sessions ORDER BY last_seen LIMIT ?
+                )
+            ''', (overflow,)).rowcount
+        if expired or evicted:
+            conn.execute('DELETE FROM interactions WHERE user_id NOT IN (SELECT user_id FROM sessions)')
+        conn.execute('COMMIT')
+        self.expirations += expired
+        self.evictions += evicted
+        return expired + evicted
+
+    def stop(self):
+        """Flush queued items and stop the writer thread"""
+        self._stop.set()
+        self._wake.set()
+        self._writer_pid = None
+        self.flush()
+
+    def stats(self):
+        conn = self._conn()
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'backend': 'sqlite',
+            'sessions': len(self),
+            'max_sessions': self.max_sessions,
+            'interactions': conn.execute('SELECT COUNT(*) FROM interactions').fetchone()[0],
+            'pending_writes': pending,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'bytes_in_use': page_count * page_size
+        }
+
+
+class SocketSessionStore:
+    """Client for session_server.py over a Unix domain socket.
+
+    Requests are newline-delimited JSON. Appends get no reply, so they are
+    pipelined behind the next read on the same connection and a request
+    costs a single round trip. Each thread keeps its own connection.
+
+    Appends are best-effort: conversation memory is context for later
+    answers, not a record, so a turn that cannot be sent (server down or
+    restarting) is logged and counted in stats() rather than failing a
+    chat response that has already been computed. The connection is
+    re-established on the next call. An append written into a connection
+    the server has just closed can also be lost without an error.
+    """
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self.dropped_appends = 0
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid() or local.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            local.sock = sock
+            local.reader = sock.makefile('rb')
+            local.pid = os.getpid()
+        return local
+
+    def _reset(self):
+        local = self._local
+        if getattr(local, 'sock', None) is not None:
+            try:
+                local.sock.close()
+            except OSError:
+                pass
+        local.sock = None
+
+    def _send(self, request, reply=True):
+        data = json.dumps(request, separators=(',', ':')).encode('utf-8') + b'\n'
+        for attempt in (0, 1):
+            try:
+                conn = self._connection()
+                conn.sock.sendall(data)
+                if not reply:
+                    return None
+                line = conn.reader.readline()
+                if not line:
+                    raise ConnectionError('session server closed the connection')
+                return json.loads(line)
+            except (OSError, ConnectionError):
+                self._reset()
+                if attempt or not reply:
+                    raise
+
+    def __len__(self):
+        return self._send({'op': 'len'})
+
+    def __contains__(self, user_id):
+        return bool(self.history(user_id))
+
+    def append(self, user_id, item):
+        try:
+            self._send({'op': 'append', 'user_id': user_id, 'item': encode_item(item)}, reply=False)
+        except (OSError, ConnectionError) as e:
+            self.dropped_appends += 1
+            logger.warning(f"Dropped session append for {user_id}: {str(e)}")
+
+    def history(self, user_id):
+        return [decode_item(item) for item in self._send({'op': 'history', 'user_id': user_id})]
+
+    def summary(self, user_id):
+        history = self.history(user_id)
+        return history, count_keys(history)
+
+    def page(self, user_id, cursor=None, limit=50, match=None):
+        """(items, next cursor) of a user's history; filtering happens on the server"""
+        if match is not None and not isinstance(match, HistoryFilter):
+            raise ValueError("The session server only evaluates HistoryFilter conditions")
+        reply = self._send({
+            'op': 'page', 'user_id': user_id, 'cursor': cursor, 'limit': limit,
+            'filter': match.to_dict() if match else None
+        })
+        if reply is None:
+            raise ValueError(f"Invalid page request (cursor {cursor!r})")
+        items, cursor = reply
+        return [decode_item(item) for item in items], cursor
+
+    def get(self, user_id):
+        return self.history(user_id) or None
+
+    def pop(self, user_id, default=None):
+        items = self._send({'op': 'pop', 'user_id': user_id})
+        return [decode_item(item) for item in items] if items is not None else default
+
+    def clear(self):
+        self._send({'op': 'clear'})
+
+    def reap(self):
+        return self._send({'op': 'reap'})
+
+    def stop(self):
+        self._reset()
+
+    def stats(self):
+        stats = self._send({'op': 'stats'})
+        stats['backend'] = 'socket'
+        stats['dropped_appends'] = self.dropped_appends
+        return stats
+
+
+def open_session_store(url=None, max_history=5, **kwargs):
+    """Build the session store named by url (see the module docstring)"""
+    url = url or DEFAULT_SESSION_STORE
+    if url == 'memory':
+        store = SessionStore(max_history=max_history, **kwargs)
+        if DEFAULT_JOURNAL_DIR:
+            store = JournaledSessionStore(store, SessionJournal(DEFAULT_JOURNAL_DIR))
+        return store
+    if url.startswith('sqlite://'):
+        return SQLiteSessionStore(url[len('sqlite://'):], max_history=max_history, **kwargs)
+    if url.startswith('unix://'):
+        # History length and limits are configured on the server
+        return SocketSessionStore(url[len('unix://'):])
+    raise ValueError(f"Unknown session store: {url}")
+
+
+def _percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def benchmark(store, users=1000, requests=5000):
+    """Latency of one request's session work (history read + append), in ms"""
+    record = InteractionRecord('what are the fees', 'Nextopson is completely free!', 'neutral', 'general', 0.9)
+    for user in range(users):
+        store.append(f"user-{user}", record)
+    if hasattr(store, 'flush'):
+        store.flush()
+    samples = []
+    for n in range(requests):
+        user_id = f"user-{n % users}"
+        start = time.perf_counter()
+        store.history(user_id)
+        store.append(user_id, record)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'p50': _percentile(samples, 0.5), 'p99': _percentile(samples, 0.99), 'max': max(samples)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Session store backends')
+    parser.add_argument('--benchmark', action='store_true', help='Measure per-request latency of each backend')
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    from session_server import serve_in_thread
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = serve_in_thread(os.path.join(tmp, 'sessions.sock'))
+        stores = {
+            'memory': SessionStore(),
+            'sqlite': SQLiteSessionStore(os.path.join(tmp, 'sessions.db')),
+            'socket': SocketSessionStore(server.server_address)
+        }
+        for name, store in stores.items():
+            result = benchmark(store, requests=args.requests)
+            print(f"{name:8s} p50 {result['p50']:.3f} ms  p99 {result['p99']:.3f} ms  max {result['max']:.3f} ms")
+            store.stop()
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,474 @@
+"""Crash-safe journal for the in-process session store.
+
+Every append/pop/clear is written to an append-only JSONL log; a writer
+thread flushes and fsyncs the log every fsync_interval seconds (group
+commit), and after snapshot_every entries writes a compacted snapshot of
+the whole store and starts a new log generation. On restart the newest
+snapshot plus the logs written after it are replayed to rebuild the store.
+
+Appends carry their wall-clock time and the snapshot keeps each session's
+last activity, so replay drops sessions that have expired since and
+restores the rest with their real age, in LRU order. An append that
+starts a new session (the old one expired or was evicted) is logged as
+such, and replay discards the history that came before it.
+
+Enable it with NEXTOPSON_SESSION_JOURNAL=<directory>. A journal belongs to
+one store in one process. A process forked from that one (gunicorn
+workers after preload) keeps its sessions in memory but does not journal
+them, so workers never write the same files. With several workers, run
+session_server.py --journal and point the workers at it.
+
+Measure recovery time with:
+
+    python session_journal.py --benchmark [--interactions N]
+"""
+import gc
+import os
+import sys
+import json
+import time
+import glob
+import marshal
+import logging
+import argparse
+import tempfile
+import threading
+
+from interaction_record import InteractionRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = os.environ.get('NEXTOPSON_SESSION_JOURNAL')
+
+SNAPSHOT_NAME = 'snapshot.bin'
+# Version 2 adds each session's last activity time
+SNAPSHOT_VERSION = 2
+
+
+def item_payload(item):
+    """JSON-ready form of a history item; InteractionRecords become plain rows"""
+    if isinstance(item, InteractionRecord):
+        return ['r', item.to_row()]
+    return ['d', item]
+
+
+def from_payload(payload):
+    kind, value = payload
+    return InteractionRecord.from_row(value) if kind == 'r' else value
+
+
+def pack(items):
+    """Serialize a session history for the snapshot"""
+    return marshal.dumps([item_payload(item) for item in items])
+
+
+def _payloads(packed):
+    """Payloads of a packed history: a snapshot blob, or (blob or None, log tail payloads)"""
+    if isinstance(packed, bytes):
+        return marshal.loads(packed)
+    blob, tail = packed
+    return (marshal.loads(blob) if blob is not None else []) + tail
+
+
+def unpack(packed):
+    """Items of a packed history; the session store calls this on first access"""
+    return [from_payload(payload) for payload in _payloads(packed)]
+
+
+def _read_log(path):
+    """Entries of one log file; a torn final line from a crash is skipped"""
+    with open(path, 'rb') as f:
+        data = f.read().rstrip(b'\n')
+    if not data:
+        return []
+    try:
+        # JSON strings never hold a raw newline, so the log parses as one array
+        return json.loads(b'[' + data.replace(b'\n', b',') + b']')
+    except ValueError:
+        entries = []
+        for line in data.split(b'\n'):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping corrupt journal entry in {path}")
+        return entries
+
+
+def _journal_path(directory, generation):
+    return os.path.join(directory, f"journal-{generation:08d}.log")
+
+
+def _fsync_directory(directory):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class SessionJournal:
+    """Append-only log of session updates with periodic compacted snapshots"""
+
+    def __init__(self, directory, fsync_interval=0.05, snapshot_every=100000, clock=time.time):
+        self.directory = directory
+        self.clock = clock
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._since_snapshot = 0
+        self._generation = None
+        self._file = None
+        self._writer_pid = None
+        self._owner_pid = os.getpid()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._snapshot_source = None
+        self._max_history = None
+        self.entries = 0
+        self.syncs = 0
+        self.snapshots = 0
+
+    # Recovery
+
+    def _read_snapshot(self):
+        """(generation, {user_id: packed history}, {user_id: last activity}) of the newest snapshot"""
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        if not os.path.exists(path):
+            return 0, {}, {}
+        with open(path, 'rb') as f:
+            snapshot = marshal.loads(f.read())
+        version = snapshot[0]
+        if version == 1:
+            # No activity times; count them from when the snapshot was written
+            written = os.path.getmtime(path)
+            return snapshot[1], snapshot[2], dict.fromkeys(snapshot[2], written)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported session snapshot version {version}")
+        return snapshot[1], snapshot[2], snapshot[3]
+
+    def replay(self, max_history):
+        """(packed sessions, {user_id: seconds idle}) rebuilt from the snapshot and log tail.
+
+        Sessions come least recently active first. Nothing is decoded
+        here: snapshot sessions stay packed, and sessions touched by the
+        log tail carry their tail payloads next to the blob.
+        """
+        self._max_history = max_history
+        generation, snapshot, seen = self._read_snapshot()
+        sessions = dict(snapshot)
+        seen = dict(seen)
+        generations = []
+        for path in glob.glob(os.path.join(self.directory, 'journal-*.log')):
+            g = int(os.path.basename(path)[len('journal-'):-len('.log')])
+            if g >= generation:
+                generations.append(g)
+        # Sessions touched by the log: user_id -> [snapshot blob or None, tail payloads]
+        touched = {}
+        position = 0
+        now = self.clock()
+        for g in sorted(generations):
+            for entry in _read_log(_journal_path(self.directory, g)):
+                op, user_id = entry[0], entry[1]
+                position += 1
+                if op == 'n':
+                    # First item of a new session: whatever the user had before is gone
+                    sessions.pop(user_id, None)
+                    touched[user_id] = [None, [entry[2]]]
+                    seen[user_id] = entry[3]
+                elif op == 'a':
+                    touched_entry = touched.get(user_id)
+                    if touched_entry is None:
+                        touched_entry = touched[user_id] = [sessions.pop(user_id, None), []]
+                    touched_entry[1].append(entry[2])
+                    seen[user_id] = entry[3] if len(entry) > 3 else now
+                elif op == 'p':
+                    sessions.pop(user_id, None)
+                    touched.pop(user_id, None)
+                elif op == 'c':
+                    sessions.clear()
+                    touched.clear()
+        self._generation = max(generations + [generation])
+        logger.info(f"Replayed {position} journal entries on a snapshot of {len(snapshot)} sessions")
+
+        for user_id, (blob, tail) in touched.items():
+            sessions[user_id] = (blob, tail[-max_history:])
+        order = sorted(sessions, key=lambda user_id: seen.get(user_id, now))
+        return {user_id: sessions[user_id] for user_id in order}, \
+            {user_id: max(0.0, now - seen.get(user_id, now)) for user_id in order}
+
+    # Logging
+
+    def _open(self):
+        if self._generation is None:
+            self._generation = 0
+        self._file = open(_journal_path(self.directory, self._generation), 'ab')
+
+    @property
+    def owned(self):
+        """Whether this is the process that opened the journal (forks must not write to it)"""
+        return os.getpid() == self._owner_pid
+
+    def _ensure_writer(self):
+        if self._writer_pid == os.getpid() or not self.owned:
+            return
+        self._stop = threading.Event()
+        threading.Thread(target=self._write_loop, name='session-journal', daemon=True).start()
+        self._writer_pid = os.getpid()
+
+    def record(self, op, user_id=None, item=None):
+        """Queue one update ('a' append, 'n' append starting a new session, 'p' pop, 'c' clear).
+
+        The caller holds the store's order.
+        """
+        if op in ('a', 'n'):
+            entry = [op, user_id, item_payload(item), round(self.clock(), 3)]
+        else:
+            entry = [op, user_id, None]
+        line = json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._buffer.append(line)
+        self.entries += 1
+        self._since_snapshot += 1
+
+    def sync(self):
+        """Write and fsync everything queued so far (one group commit)"""
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        buffer, self._buffer = self._buffer, []
+        if not buffer:
+            return
+        if self._file is None:
+            self._open()
+        self._file.write(b''.join(buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.syncs += 1
+
+    def rotate(self, export):
+        """Start a new log generation and capture the store for the next snapshot.
+
+        export() returns (sessions, {user_id: last activity time}). It is
+        called under the journal lock, so the captured state holds exactly
+        the updates logged in earlier generations.
+        """
+        with self._lock:
+            self._sync()
+            sessions, seen = export()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._generation = (self._generation or 0) + 1
+            self._open()
+            self._since_snapshot = 0
+            return self._generation, sessions, seen
+
+    def write_snapshot(self, generation, sessions, seen):
+        """Write the compacted snapshot, then drop the logs it covers"""
+        payloads = {
+            user_id: items if isinstance(items, bytes)
+            else marshal.dumps(_payloads(items)[-self._max_history:]) if isinstance(items, tuple)
+            else pack(items)
+            for user_id, items in sessions.items()
+        }
+        path = os.path.join(self.directory, SNAPSHOT_NAME)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            marshal.dump((SNAPSHOT_VERSION, generation, payloads, seen), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(self.directory)
+        for old in glob.glob(os.path.join(self.directory, 'journal-*.log')):
+            if int(os.path.basename(old)[len('journal-'):-len('.log')]) < generation:
+                os.unlink(old)
+        self.snapshots += 1
+        logger.info(f"Wrote session snapshot of {len(payloads)} sessions (generation {generation})")
+
+    def snapshot(self, export):
+        self.write_snapshot(*self.rotate(export))
+
+    def _write_loop(self):
+        stop = self._stop
+        while not stop.is_set():
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            try:
+                self.sync()
+                if self._snapshot_source is not None and self._since_snapshot >= self.snapshot_every:
+                    self.snapshot(self._snapshot_source)
+            except Exception as e:
+                logger.error(f"Session journal error: {str(e)}")
+                stop.wait(1)
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._writer_pid = None
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        return {
+            'generation': self._generation,
+            'entries': self.entries,
+            'syncs': self.syncs,
+            'snapshots': self.snapshots,
+            'pending': len(self._buffer)
+        }
+
+
+class JournaledSessionStore:
+    """SessionStore whose updates are journaled; rebuilt from the journal on construction"""
+
+    def __init__(self, store, journal):
+        self.store = store
+        self.journal = journal
+        started = time.perf_counter()
+        # Recovery allocates millions of objects that all survive; collecting during it is wasted work
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            sessions, idle = journal.replay(store.max_history)
+            store.restore(sessions, decode=unpack, idle=idle)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        logger.info(f"Recovered {len(sessions)} sessions in {time.perf_counter() - started:.3f}s")
+        journal._snapshot_source = self._export
+        self._unjournaled_pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, user_id):
+        return user_id in self.store
+
+    def _journaling(self):
+        """False in a forked process: only the journal's owner may write its files"""
+        if self.journal.owned:
+            return True
+        if self._unjournaled_pid != os.getpid():
+            self._unjournaled_pid = os.getpid()
+            logger.error(f"Session journal {self.journal.directory} belongs to process "
+                         f"{self.journal._owner_pid}; sessions in {os.getpid()} are not journaled")
+        return False
+
+    def append(self, user_id, item):
+        if not self._journaling():
+            return self.store.append(user_id, item)
+        self.journal._ensure_writer()
+        # The journal lock keeps log order identical to the order applied to the store
+        with self.journal._lock:
+            started = self.store.append(user_id, item)
+            self.journal.record('n' if started else 'a', user_id, item)
+            return started
+
+    def pop(self, user_id, default=None):
+        if not self._journaling():
+            return self.store.pop(user_id, default)
+        with self.journal._lock:
+            self.journal.record('p', user_id)
+            return self.store.pop(user_id, default)
+
+    def clear(self):
+        if not self._journaling():
+            return self.store.clear()
+        with self.journal._lock:
+            self.journal.record('c')
+            self.store.clear()
+
+    def _export(self):
+        sessions, idle = self.store.export(packed=True, idle=True)
+        now = self.journal.clock()
+        return sessions, {user_id: now - seconds for user_id, seconds in idle.items()}
+
+    def snapshot(self):
+        if self._journaling():
+            self.journal.snapshot(self._export)
+
+    def stop(self):
+        if self.journal.owned:
+            self.journal.close()
+        self.store.stop()
+
+    def stats(self):
+        stats = self.store.stats()
+        stats['journal'] = self.journal.stats()
+        return stats
+
+
+def benchmark(interactions=1000000, max_history=5, tail_fraction=0.1):
+    """Recovery time from a snapshot plus a log tail holding tail_fraction of the updates"""
+    from session_store import SessionStore
+
+    users = max(1, interactions // max_history)
+    snapshot_count = int(interactions * (1 - tail_fraction))
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = SessionJournal(tmp, snapshot_every=float('inf'))
+        store = JournaledSessionStore(SessionStore(max_history, max_sessions=users, reap_interval=None), journal)
+        for n in range(interactions):
+            store.append(f"user-{n % users}", InteractionRecord(
+                f"question {n} about listing fees", 'Nextopson is completely free!',
+                'neutral', 'general', 0.8, now, ('residential',) if n % 3 == 0 else ()
+            ))
+            if n + 1 == snapshot_count:
+                store.snapshot()
+        store.stop()
+        # Recover into a heap that does not also hold the original store
+        del store, journal
+        gc.collect()
+        sizes = {os.path.basename(p): os.path.getsize(p) for p in glob.glob(os.path.join(tmp, '*'))}
+
+        started = time.perf_counter()
+        recovered = JournaledSessionStore(
+            SessionStore(max_history, max_sessions=users, reap_interval=None), SessionJournal(tmp)
+        )
+        elapsed = time.perf_counter() - started
+
+        # Sessions are decoded on first access; measure that cost separately
+        sample = [f"user-{n}" for n in range(0, users, max(1, users // 1000))]
+        started = time.perf_counter()
+        count = sum(len(recovered.history(user_id)) for user_id in sample)
+        first_access = (time.perf_counter() - started) / len(sample)
+        recovered.journal.close()
+        return {
+            'seconds': elapsed,
+            'sessions': len(recovered),
+            'interactions': interactions,
+            'first_access_us': first_access * 1e6,
+            'sampled_interactions': count,
+            'files': sizes
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Session journal')
+    parser.add_argument('--benchmark', action='store_true', help='Measure recovery time')
+    parser.add_argument('--interactions', type=int, default=1000000)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        print(__doc__)
+        return 0
+
+    result = benchmark(args.interactions)
+    print(f"Recovered {result['sessions']} sessions / {result['interactions']} interactions "
+          f"in {result['seconds'] * 1000:.0f} ms")
+    print(f"First access to a restored session: {result['first_access_us']:.0f} us")
+    for name, size in sorted(result['files'].items()):
+        print(f"  {name}: {size / 2**20:.1f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Local session server shared by all gunicorn workers on a host.
+
+    python session_server.py --socket /run/nextopson/sessions.sock
+
+then start the API with NEXTOPSON_SESSION_STORE=unix:///run/nextopson/sessions.sock.
+Sessions live in one SessionStore in this process; items are kept in the
+encoded form the workers send, so the server never decodes them.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import threading
+import socketserver
+
+from session_store import SessionStore, HistoryFilter
+from session_journal import SessionJournal, JournaledSessionStore, from_payload
+
+logger = logging.getLogger(__name__)
+
+
+def _decoded_filter(conditions):
+    """HistoryFilter applied to the encoded items the server stores"""
+    match = HistoryFilter(**conditions) if conditions else None
+    if not match:
+        return None
+    return lambda data: match(from_payload(json.loads(data)))
+
+
+class SessionRequestHandler(socketserver.StreamRequestHandler):
+    """Serves newline-delimited JSON requests on one client connection"""
+
+    def handle(self):
+        store = self.server.store
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request['op']
+                if op == 'append':
+                    # Appends are pipelined by the client and get no reply
+                    store.append(request['user_id'], request['item'])
+                    continue
+                if op == 'history':
+                    reply = store.history(request['user_id'])
+                elif op == 'page':
+                    reply = store.page(request['user_id'], request.get('cursor'), request.get('limit', 50),
+                                       _decoded_filter(request.get('filter')))
+                elif op == 'pop':
+                    reply = store.pop(request['user_id'])
+                elif op == 'len':
+                    reply = len(store)
+                elif op == 'clear':
+                    store.clear()
+                    reply = True
+                elif op == 'reap':
+                    reply = store.reap()
+                elif op == 'stats':
+                    reply = store.stats()
+                else:
+                    raise ValueError(f"Unknown op: {op}")
+            except Exception as e:
+                logger.error(f"Session request error: {str(e)}")
+                reply = None
+            self.wfile.write(json.dumps(reply, separators=(',', ':')).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class SessionServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, store=None):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.store = store if store is not None else SessionStore()
+        super().__init__(path, SessionRequestHandler)
+
+
+def serve_in_thread(path, store=None):
+    """Start a server on a background thread (tests and benchmarks)"""
+    server = SessionServer(path, store)
+    threading.Thread(target=server.serve_forever, name='session-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Nextopson session server')
+    parser.add_argument('--socket', required=True, help='Unix socket path')
+    parser.add_argument('--max-history', type=int, default=5)
+    parser.add_argument('--max-sessions', type=int, default=100000)
+    parser.add_argument('--idle-ttl', type=float, default=1800)
+    parser.add_argument('--journal', help='Directory for a crash-safe session journal')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    store = SessionStore(args.max_history, args.max_sessions, args.idle_ttl)
+    if args.journal:
+        store = JournaledSessionStore(store, SessionJournal(args.journal))
+    server = SessionServer(args.socket, store)
+    logger.info(f"Serving sessions on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.stop()
+        os.unlink(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
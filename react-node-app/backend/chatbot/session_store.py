@@ -0,0 +1,444 @@
+import os
+import sys
+import time
+import logging
+import threading
+from datetime import datetime
+from itertools import islice
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+def _deep_sizeof(obj, seen=None):
+    """Approximate bytes held by obj and the containers/strings it references"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(_deep_sizeof(getattr(obj, name), seen)
+                    for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+def _item_sizeof(item):
+    """Cheap estimate of the bytes one history item holds, for the running totals.
+
+    For slotted records only strings and tuples are added to the object
+    itself; numbers are small and often shared.
+    """
+    slots = getattr(type(item), '__slots__', None)
+    if slots is None:
+        return _deep_sizeof(item)
+    size = sys.getsizeof(item)
+    for name in slots:
+        value = getattr(item, name, None)
+        if isinstance(value, (str, bytes, tuple)):
+            size += sys.getsizeof(value)
+    return size
+
+
+def count_keys(items):
+    """Occurrences of each item's counter_keys() (items without them are skipped)"""
+    counts = {}
+    for item in items:
+        keys = getattr(item, 'counter_keys', None)
+        if keys is not None:
+            for key in keys():
+                counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def _epoch(value):
+    """Seconds since the epoch for a float or ISO-8601 timestamp, else None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class HistoryFilter:
+    """Time-range and topic predicate over history items, evaluated inside the store.
+
+    since/until are epoch seconds or ISO-8601 strings (local time when no
+    offset is given, like datetime.now().isoformat()). An item matches the
+    topic if it is its 'topic' or one of its 'topics'.
+    """
+
+    __slots__ = ('since', 'until', 'topic')
+
+    def __init__(self, since=None, until=None, topic=None):
+        self.since = _epoch(since) if since is not None else None
+        self.until = _epoch(until) if until is not None else None
+        if (since is not None and self.since is None) or (until is not None and self.until is None):
+            raise ValueError(f"Invalid time range: {since!r} to {until!r}")
+        self.topic = topic
+
+    def __bool__(self):
+        return self.since is not None or self.until is not None or self.topic is not None
+
+    def __call__(self, item):
+        if self.since is not None or self.until is not None:
+            ts = _epoch(item.get('timestamp'))
+            if ts is None or (self.since is not None and ts < self.since) \
+                    or (self.until is not None and ts > self.until):
+                return False
+        if self.topic is not None:
+            return item.get('topic') == self.topic or self.topic in (item.get('topics') or ())
+        return True
+
+    def to_dict(self):
+        return {'since': self.since, 'until': self.until, 'topic': self.topic}
+
+
+class Session:
+    """History of one user's most recent interactions, with running counters over it"""
+
+    __slots__ = ('history', 'last_seen', 'counters', 'packed', 'appended', 'size')
+
+    def __init__(self, max_history, now, packed=None):
+        # A restored session keeps its serialized history in packed until first access
+        self.history = deque(maxlen=max_history) if packed is None else None
+        self.last_seen = now
+        self.counters = {} if packed is None else None
+        self.packed = packed
+        # Items ever appended: the sequence number that page() cursors refer to
+        self.appended = 0
+        # Estimated bytes held, kept up to date by append() so stats never walk the store
+        self.size = self._base_size()
+
+    def _base_size(self):
+        if self.packed is not None:
+            return sys.getsizeof(self) + sys.getsizeof(self.packed)
+        return sys.getsizeof(self) + sys.getsizeof(self.history) + sys.getsizeof(self.counters)
+
+    def unpack(self, max_history, decode):
+        items = decode(self.packed)
+        self.history = deque(maxlen=max_history)
+        self.counters = {}
+        self.packed = None
+        self.appended = 0
+        self.size = self._base_size()
+        for item in items:
+            self.append(item)
+
+    def _count(self, item, delta):
+        keys = getattr(item, 'counter_keys', None)
+        if keys is None:
+            return
+        counters = self.counters
+        for key in keys():
+            count = counters.get(key, 0) + delta
+            if count:
+                counters[key] = count
+            else:
+                del counters[key]
+
+    def append(self, item):
+        """Add item, uncounting the oldest one when the deque is about to drop it"""
+        history = self.history
+        if len(history) == history.maxlen:
+            self._count(history[0], -1)
+            self.size -= _item_sizeof(history[0])
+        history.append(item)
+        self._count(item, 1)
+        self.size += _item_sizeof(item)
+        self.appended += 1
+
+
+class SessionStore:
+    """Bounded per-user conversation histories.
+
+    Each history is a deque(maxlen=max_history), sessions idle for longer
+    than idle_ttl seconds expire, and once max_sessions users are live the
+    least recently used session is evicted. A daemon thread reaps expired
+    sessions every reap_interval seconds; it is (re)started lazily in each
+    process, so it survives gunicorn's fork after preload.
+
+    restore() can load sessions in a packed form that is decoded on first
+    access, so a restart does not have to rebuild every history up front.
+    """
+
+    def __init__(self, max_history=5, max_sessions=100000, idle_ttl=1800,
+                 reap_interval=60, clock=time.monotonic):
+        self.max_history = max_history
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.reap_interval = reap_interval
+        self._clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._reaper_pid = None
+        self._stop = threading.Event()
+        self._decode = None
+        self.evictions = 0
+        self.expirations = 0
+        # Running totals over self._sessions, maintained by _account()
+        self._bytes = 0
+        self._interactions = 0
+        self._packed = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def _account(self, user_id, session, sign):
+        """Add (sign=1) or remove (sign=-1) a session from the running totals (caller holds the lock).
+
+        Call with -1 before changing a stored session and with 1 after.
+        """
+        self._bytes += sign * (session.size + sys.getsizeof(user_id))
+        if session.packed is not None:
+            self._packed += sign
+        else:
+            self._interactions += sign * len(session.history)
+
+    def _unpack(self, user_id, session):
+        self._account(user_id, session, -1)
+        session.unpack(self.max_history, self._decode)
+        self._account(user_id, session, 1)
+
+    def _expired(self, session, now):
+        return self.idle_ttl is not None and now - session.last_seen > self.idle_ttl
+
+    def _live(self, user_id, now):
+        """Session for user_id if it has not expired (caller holds the lock)"""
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        if self._expired(session, now):
+            del self._sessions[user_id]
+            self._account(user_id, session, -1)
+            self.expirations += 1
+            return None
+        if session.packed is not None:
+            self._unpack(user_id, session)
+        return session
+
+    def get(self, user_id):
+        """History deque of a live session, or None. Does not count as activity."""
+        with self._lock:
+            session = self._live(user_id, self._clock())
+            return session.history if session is not None else None
+
+    def history(self, user_id):
+        """Copy of a user's history, oldest first"""
+        with self._lock:
+            session = self._live(user_id, self._clock())
+            return list(session.history) if session is not None else []
+
+    def summary(self, user_id):
+        """History copy and its counters (counter_keys of every item), read together"""
+        with self._lock:
+            session = self._live(user_id, self._clock())
+            if session is None:
+                return [], {}
+            return list(session.history), dict(session.counters)
+
+    def page(self, user_id, cursor=None, limit=50, match=None):
+        """(items, next cursor) of a user's history, oldest first.
+
+        Items are those after cursor (a value returned by an earlier call)
+        for which match(item) is true; next cursor is None once the
+        history is exhausted. Cursors stay valid as new items arrive,
+        items dropped from the head in the meantime are simply skipped.
+        """
+        with self._lock:
+            session = self._live(user_id, self._clock())
+            if session is None:
+                return [], None
+            history = session.history
+            first = session.appended - len(history)
+            position = max(int(cursor), first) if cursor is not None else first
+            items = []
+            for item in islice(history, position - first, None):
+                position += 1
+                if match is None or match(item):
+                    items.append(item)
+                    if len(items) >= limit:
+                        break
+            return items, str(position) if position < session.appended else None
+
+    def append(self, user_id, item):
+        """Record an interaction, creating the session and evicting LRU sessions as needed.
+
+        Returns True when the item started a new session (the user had none,
+        or it had expired or been evicted).
+        """
+        self._ensure_reaper()
+        now = self._clock()
+        with self._lock:
+            session = self._live(user_id, now)
+            started = session is None
+            if started:
+                session = self._sessions[user_id] = Session(self.max_history, now)
+                self._account(user_id, session, 1)
+                self._evict()
+            else:
+                session.last_seen = now
+                self._sessions.move_to_end(user_id)
+            self._account(user_id, session, -1)
+            session.append(item)
+            self._account(user_id, session, 1)
+            return started
+
+    def _evict(self):
+        """Drop least recently used sessions past max_sessions (caller holds the lock)"""
+        while len(self._sessions) > self.max_sessions:
+            self._account(*self._sessions.popitem(last=False), -1)
+            self.evictions += 1
+
+    def pop(self, user_id, default=None):
+        """Drop a session and return its history"""
+        with self._lock:
+            session = self._sessions.pop(user_id, None)
+            if session is None:
+                return default
+            self._account(user_id, session, -1)
+            if session.packed is not None:
+                session.unpack(self.max_history, self._decode)
+            return list(session.history)
+
+    def clear(self):
+        with self._lock:
+            self._sessions = OrderedDict()
+            self._bytes = self._interactions = self._packed = 0
+
+    def export(self, packed=False, idle=False):
+        """Every session's history, least recently used first.
+
+        With packed=True, sessions that have not been accessed since
+        restore() are returned in their packed form instead. With
+        idle=True, returns (sessions, {user_id: seconds since last activity}).
+        """
+        sessions = {}
+        idle_seconds = {}
+        with self._lock:
+            now = self._clock()
+            for user_id, session in self._sessions.items():
+                idle_seconds[user_id] = now - session.last_seen
+                if session.packed is not None:
+                    if packed:
+                        sessions[user_id] = session.packed
+                        continue
+                    self._unpack(user_id, session)
+                sessions[user_id] = list(session.history)
+        return (sessions, idle_seconds) if idle else sessions
+
+    def restore(self, sessions, decode=None, idle=None):
+        """Load sessions in bulk, e.g. after a restart.
+
+        Values are item lists (as returned by export), or packed objects
+        that decode(packed) turns into item lists on first access. idle
+        maps user ids to seconds since their last activity; sessions idle
+        for longer than idle_ttl are dropped, and the rest keep their age.
+        Sessions are restored in the given order, so pass them least
+        recently used first for LRU eviction to apply.
+        """
+        now = self._clock()
+        idle = idle or {}
+        with self._lock:
+            if decode is not None:
+                self._decode = decode
+            entries = self._sessions
+            for user_id, items in sessions.items():
+                if isinstance(items, list):
+                    session = Session(self.max_history, now)
+                    for item in items:
+                        session.append(item)
+                else:
+                    session = Session(self.max_history, now, packed=items)
+                session.last_seen = now - idle.get(user_id, 0)
+                if user_id in entries:
+                    self._account(user_id, entries.pop(user_id), -1)
+                if self._expired(session, now):
+                    self.expirations += 1
+                    continue
+                entries[user_id] = session
+                self._account(user_id, session, 1)
+            self._evict()
+
+    def reap(self):
+        """Remove expired sessions; return how many were removed"""
+        if self.idle_ttl is None:
+            return 0
+        now = self._clock()
+        removed = 0
+        with self._lock:
+            # Sessions are ordered by last activity, so stop at the first live one
+            while self._sessions:
+                user_id, session = next(iter(self._sessions.items()))
+                if not self._expired(session, now):
+                    break
+                del self._sessions[user_id]
+                self._account(user_id, session, -1)
+                removed += 1
+            self.expirations += removed
+        if removed:
+            logger.debug(f"Reaped {removed} idle sessions")
+        return removed
+
+    def _ensure_reaper(self):
+        if self.reap_interval is None or self._reaper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._reaper_pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._reaper = threading.Thread(target=self._reap_loop, name='session-reaper', daemon=True)
+            self._reaper_pid = os.getpid()
+            self._reaper.start()
+
+    def _reap_loop(self):
+        stop = self._stop
+        while not stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"Session reaper error: {str(e)}")
+
+    def stop(self):
+        """Stop the background reaper"""
+        self._stop.set()
+        self._reaper_pid = None
+
+    def bytes_in_use(self):
+        """Estimated memory held by all sessions, from running totals (no walk of the store).
+
+        Each item is sized on its own when appended, so objects shared
+        between items (interned strings, small ints) are counted per item.
+        """
+        with self._lock:
+            return sys.getsizeof(self._sessions) + self._bytes
+
+    def stats(self):
+        """Counters kept up to date on every change; O(1), so cheap enough for /health"""
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'interactions': self._interactions,
+                'packed_sessions': self._packed,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'bytes_in_use': sys.getsizeof(self._sessions) + self._bytes
+            }
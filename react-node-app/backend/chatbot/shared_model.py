@@ -0,0 +1,200 @@
+"""A fitted TF-IDF + RandomForest pipeline laid out in shared memory.
+
+SharedForest.export() copies the vectorizer's vocabulary and idf weights
+and every tree's node arrays into one multiprocessing.shared_memory block.
+Other processes attach to it by name with ForestView and predict from
+NumPy views of that block, so the model's memory is paid once per host
+however many inference processes use it.
+
+ForestView.predict_proba matches the pipeline's own predict_proba; check
+it on a trained model with:
+
+    python shared_model.py --check-parity
+"""
+import os
+import sys
+import pickle
+import logging
+import argparse
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_ALIGN = 64
+
+
+def _detach_from_resource_tracker(shm):
+    """Stop Python < 3.13 from unlinking a segment this process only attached to"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+def _forest_arrays(pipeline):
+    """Flat node arrays of all trees; child indices are global, leaves keep -1"""
+    vectorizer, forest = pipeline.steps[0][1], pipeline.steps[-1][1]
+    if (getattr(vectorizer, 'norm', None) != 'l2' or not getattr(vectorizer, 'use_idf', False)
+            or vectorizer.sublinear_tf or vectorizer.binary or not hasattr(forest, 'estimators_')):
+        raise ValueError("Only TF-IDF (l2, idf) + tree ensemble pipelines can be shared")
+
+    vocabulary = [None] * len(vectorizer.vocabulary_)
+    for term, index in vectorizer.vocabulary_.items():
+        vocabulary[index] = term
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        roots.append(offset)
+        left.append(np.where(tree.children_left >= 0, tree.children_left + offset, -1))
+        right.append(np.where(tree.children_right >= 0, tree.children_right + offset, -1))
+        feature.append(np.maximum(tree.feature, 0))
+        threshold.append(tree.threshold)
+        counts = tree.value[:, 0, :]
+        value.append(counts / counts.sum(axis=1, keepdims=True))
+        offset += tree.node_count
+    arrays = {
+        'vocabulary': np.frombuffer('\n'.join(vocabulary).encode('utf-8'), dtype=np.uint8),
+        'idf': np.asarray(vectorizer.idf_, dtype=np.float64),
+        'roots': np.asarray(roots, dtype=np.int64),
+        'children_left': np.concatenate(left).astype(np.int64),
+        'children_right': np.concatenate(right).astype(np.int64),
+        'feature': np.concatenate(feature).astype(np.int64),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'value': np.concatenate(value).astype(np.float64)
+    }
+    meta = {
+        'classes': list(forest.classes_),
+        'vectorizer_params': vectorizer.get_params(),
+        'max_depth': max(estimator.tree_.max_depth for estimator in forest.estimators_)
+    }
+    return arrays, meta
+
+
+class SharedForest:
+    """Owner of the shared block; only the exporting process unlinks it"""
+
+    def __init__(self, shm, manifest):
+        self._shm = shm
+        self.manifest = manifest
+        self._owner = os.getpid()
+
+    @classmethod
+    def export(cls, pipeline):
+        arrays, meta = _forest_arrays(pipeline)
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // _ALIGN) * _ALIGN
+            layout[name] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, array in arrays.items():
+            offset, dtype, shape = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = array
+        manifest = dict(meta, name=shm.name, arrays=layout, nbytes=size, owner=os.getpid())
+        logger.info(f"Exported model to shared memory {shm.name} ({size / 2 ** 20:.1f} MB)")
+        return cls(shm, manifest)
+
+    def close(self):
+        """Release the block; it is unlinked when the exporting process closes it"""
+        if self._shm is None:
+            return
+        self._shm.close()
+        if os.getpid() == self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+
+class ForestView:
+    """Zero-copy predictor over a SharedForest attached by manifest"""
+
+    def __init__(self, manifest):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self._shm = shared_memory.SharedMemory(name=manifest['name'])
+        if manifest['owner'] != os.getpid():
+            _detach_from_resource_tracker(self._shm)
+        for name, (offset, dtype, shape) in manifest['arrays'].items():
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset))
+        # The term -> column dict is rebuilt per process; it is small next to the trees
+        self._columns = {term: i for i, term in enumerate(bytes(self.vocabulary).decode('utf-8').split('\n'))}
+        self.analyzer = TfidfVectorizer(**manifest['vectorizer_params']).build_analyzer()
+        self.classes_ = np.array(manifest['classes'], dtype=object)
+        self.max_depth = manifest['max_depth']
+
+    def transform(self, texts):
+        """Dense float32 TF-IDF rows, as the forest sees them"""
+        X = np.zeros((len(texts), len(self.idf)), dtype=np.float64)
+        columns = self._columns
+        for row, text in enumerate(texts):
+            for term in self.analyzer(text):
+                column = columns.get(term)
+                if column is not None:
+                    X[row, column] += 1
+        X *= self.idf
+        norms = np.sqrt((X * X).sum(axis=1, keepdims=True))
+        np.divide(X, norms, out=X, where=norms > 0)
+        return X.astype(np.float32)
+
+    def predict_proba(self, texts):
+        """Mean leaf class distribution over all trees, walking every tree at once"""
+        X = self.transform(texts)
+        rows = np.arange(len(texts))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(texts), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self.children_left[nodes]
+            inner = left >= 0
+            if not inner.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(inner, np.where(go_left, left, self.children_right[nodes]), nodes)
+        return self.value[nodes].mean(axis=1)
+
+    def close(self):
+        # Drop the views first; the buffer cannot be released while they exist
+        for name in list(vars(self)):
+            if isinstance(getattr(self, name), np.ndarray) and name != 'classes_':
+                delattr(self, name)
+        self._shm.close()
+
+
+def check_parity(texts=None):
+    """Largest absolute difference between ForestView and the pipeline's predict_proba"""
+    from bot_provider import get_bot
+
+    bot = get_bot()
+    texts = texts or bot.preprocess_many([question for question, _ in bot.train_data]) + [
+        'is there a 3bhk flat near the station', 'hello', '', 'zzz unknown words'
+    ]
+    shared = SharedForest.export(bot.pipeline)
+    view = ForestView(pickle.loads(pickle.dumps(shared.manifest)))
+    try:
+        expected = bot.pipeline.predict_proba(texts)
+        actual = view.predict_proba(texts)
+        same_labels = (expected.argmax(axis=1) == actual.argmax(axis=1)).all()
+        return float(np.abs(expected - actual).max()), bool(same_labels), len(texts)
+    finally:
+        view.close()
+        shared.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Shared-memory forest model')
+    parser.add_argument('--check-parity', action='store_true', help='Compare with the sklearn pipeline')
+    args = parser.parse_args(argv)
+    if not args.check_parity:
+        print(__doc__)
+        return 0
+
+    difference, same_labels, count = check_parity()
+    print(f"{count} inputs: max probability difference {difference:.2e}, "
+          f"{'identical' if same_labels else 'DIFFERENT'} predictions")
+    return 0 if same_labels and difference < 1e-9 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
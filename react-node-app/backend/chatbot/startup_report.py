@@ -0,0 +1,80 @@
+import sys
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_bytes():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS; ru_maxrss is bytes on macOS, KiB elsewhere
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+    except (ImportError, AttributeError):
+        return 0
+
+
+class StartupReport:
+    """Records wall time and RSS for each startup phase"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = []
+        self.started = time.perf_counter()
+        self.base_rss = current_rss_bytes() if enabled else 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of startup work"""
+        if not self.enabled:
+            yield
+            return
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            rss_after = current_rss_bytes()
+            self.phases.append({
+                'phase': name,
+                'seconds': time.perf_counter() - start,
+                'rss_bytes': rss_after,
+                'rss_delta_bytes': rss_after - rss_before
+            })
+
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    def format(self):
+        """Render the report as a text table"""
+        lines = [f"{'phase':<28}{'wall ms':>10}{'rss MB':>10}{'delta MB':>10}"]
+        for entry in self.phases:
+            lines.append(
+                f"{entry['phase']:<28}"
+                f"{entry['seconds'] * 1000:>10.1f}"
+                f"{entry['rss_bytes'] / 2**20:>10.1f}"
+                f"{entry['rss_delta_bytes'] / 2**20:>+10.1f}"
+            )
+        lines.append(
+            f"{'total':<28}{self.total_seconds() * 1000:>10.1f}"
+            f"{current_rss_bytes() / 2**20:>10.1f}"
+            f"{(current_rss_bytes() - self.base_rss) / 2**20:>+10.1f}"
+        )
+        return '\n'.join(lines)
+
+    def print(self, stream=None):
+        print(self.format(), file=stream or sys.stdout)
+
+
+# Shared no-op report for normal startup
+NULL_REPORT = StartupReport(enabled=False)
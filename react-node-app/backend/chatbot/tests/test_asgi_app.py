@@ -0,0 +1,174 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+import threading
+import importlib
+
+import pytest
+
+import bot_provider
+import request_log
+from response_cache import ResponseCache
+from session_store import SessionStore
+
+
+class SlowStats(SessionStore):
+    """Session stats that block, like a SQLite or session server backend"""
+
+    def __init__(self):
+        super().__init__(5, reap_interval=None)
+        self.delay = 0
+        self.thread = None
+
+    def stats(self):
+        self.thread = threading.current_thread().name
+        time.sleep(self.delay)
+        return super().stats()
+
+
+class FakeBot:
+    """Answers instantly, or holds the inference thread while `hold` is set"""
+
+    def __init__(self):
+        self.response_cache = ResponseCache(max_size=10)
+        self.conversation_memory = SlowStats()
+        self.batcher = None
+        self.inference_pool = None
+        self.hold = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def warmup(self):
+        pass
+
+    def get_response(self, user_input, user_id='default'):
+        self.calls += 1
+        if self.hold.is_set():
+            self.release.wait(5)
+        return f"echo: {user_input}"
+
+    def respond_many(self, user_inputs, user_ids='default'):
+        return [self.get_response(text) for text in user_inputs]
+
+
+@pytest.fixture
+def asgi(monkeypatch, tmp_path):
+    bot = FakeBot()
+    monkeypatch.setattr(bot_provider, '_bot', bot)
+    # Importing the app configures logging; keep it out of the working tree
+    monkeypatch.setenv('LOG_FILE', str(tmp_path / 'api.log'))
+    monkeypatch.setattr(request_log, '_handler', None)
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    sys.modules.pop('asgi_app', None)
+    module = importlib.import_module('asgi_app')
+    monkeypatch.setattr(module, 'inference', module.InferenceExecutor(1, 0, 5))
+    yield module, bot
+    module.inference.shutdown()
+    module.health_probes.shutdown()
+    sys.modules.pop('asgi_app', None)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        if isinstance(handler, request_log.AsyncQueueHandler):
+            handler.stop()
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+async def call(app, method, path, messages=None):
+    """Run one request through the ASGI app; (status, headers, body)"""
+    if messages is None:
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    incoming = list(messages)
+    sent = []
+
+    async def receive():
+        if incoming:
+            return incoming.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': [], 'client': ('127.0.0.1', 1)}
+    await app(scope, receive, send)
+    if not sent:
+        return None, {}, None
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+def chat_request(text):
+    body = json.dumps({'user_input': text}).encode('utf-8')
+    return [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+
+def test_chat_round_trip(asgi):
+    module, _ = asgi
+    status, _, body = asyncio.run(call(module.app, 'POST', '/chat', chat_request('hello')))
+    assert status == 200
+    assert json.loads(body)['response'] == 'echo: hello'
+
+
+def test_full_queue_is_rejected_with_503(asgi):
+    module, bot = asgi
+    bot.hold.set()
+
+    async def scenario():
+        first = asyncio.ensure_future(call(module.app, 'POST', '/chat', chat_request('first')))
+        while module.inference.in_flight < 1:
+            await asyncio.sleep(0.01)
+        rejected = await call(module.app, 'POST', '/chat', chat_request('second'))
+        bot.release.set()
+        return rejected, await first
+
+    (status, headers, _), (first_status, _, _) = asyncio.run(scenario())
+    assert status == 503
+    assert headers[b'retry-after'] == b'1'
+    assert first_status == 200
+    assert module.inference.stats()['rejected'] == 1
+    assert bot.calls == 1
+
+
+def test_disconnect_before_body_skips_inference(asgi):
+    module, bot = asgi
+    messages = [{'type': 'http.request', 'body': b'{"user_in', 'more_body': True}, {'type': 'http.disconnect'}]
+    for path in ('/chat', '/chat/batch'):
+        assert asyncio.run(call(module.app, 'POST', path, messages)) == (None, {}, None)
+    assert bot.calls == 0
+    assert module.inference.stats()['completed'] == 0
+
+
+@pytest.mark.parametrize('path', ['/health', '/'])
+def test_head_sends_headers_only(asgi, path):
+    module, _ = asgi
+    get_status, get_headers, get_body = asyncio.run(call(module.app, 'GET', path))
+    status, headers, body = asyncio.run(call(module.app, 'HEAD', path))
+    assert status == get_status == 200
+    assert body == b''
+    assert int(headers[b'content-length']) > 0
+    assert headers[b'content-type'] == get_headers[b'content-type']
+    assert get_body
+
+
+def test_slow_health_stats_do_not_block_the_loop(asgi):
+    module, bot = asgi
+    bot.conversation_memory.delay = 0.5
+
+    async def scenario():
+        health = asyncio.ensure_future(call(module.app, 'GET', '/health'))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        chat = await call(module.app, 'POST', '/chat', chat_request('hello'))
+        chat_seconds = time.perf_counter() - started
+        return await health, chat, chat_seconds
+
+    (status, _, body), (chat_status, _, _), chat_seconds = asyncio.run(scenario())
+    assert status == chat_status == 200
+    assert chat_seconds < 0.3
+    assert bot.conversation_memory.thread.startswith('health')
+    assert 'inference' in json.loads(body)
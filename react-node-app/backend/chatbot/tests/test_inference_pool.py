@@ -0,0 +1,124 @@
+import os
+import time
+import pickle
+
+import pytest
+from sklearn.pipeline import Pipeline
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from inference import top_k_predictions
+from inference_pool import InferencePool, InferenceError
+from lemma_table import LemmaTable
+from shared_model import SharedForest
+from text_normalizer import TextNormalizer
+
+TRAIN = [
+    ('how do i list my properties', 'listing'),
+    ('what are the listing fees', 'fees'),
+    ('are there any hidden charges', 'fees'),
+    ('how can i contact support', 'support'),
+    ('show me flats near the station', 'search'),
+    ('i want apartments in pune', 'search'),
+]
+INPUTS = ['How do I list my Properties?', 'Flats near stations!', 'any charges...', 'contact', 'zzz']
+
+
+class SlowNormalizer(TextNormalizer):
+    """Hangs on 'hang' and fails on 'fail', to exercise the pool's error handling"""
+
+    def normalize_many(self, texts):
+        if 'hang' in texts:
+            time.sleep(60)
+        if 'fail' in texts:
+            raise ValueError('bad input')
+        return super().normalize_many(texts)
+
+
+@pytest.fixture
+def lemma_table(tmp_path):
+    path = tmp_path / 'lemma_table.tsv'
+    path.write_bytes(b'\n'.join(sorted([b'apartments\tapartment', b'charges\tcharge', b'flats\tflat',
+                                        b'properties\tproperty', b'stations\tstation'])))
+    table = LemmaTable(str(path))
+    yield table
+    table.close()
+
+
+@pytest.fixture
+def shared(lemma_table):
+    normalizer = TextNormalizer({'the', 'i', 'my', 'are', 'do'}, lemma_table, {'prop': 'property'})
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer()),
+        ('classifier', RandomForestClassifier(n_estimators=5, random_state=0))
+    ])
+    pipeline.fit(normalizer.normalize_many([q for q, _ in TRAIN]), [a for _, a in TRAIN])
+    forest = SharedForest.export(pipeline)
+    yield normalizer, pipeline, forest
+    forest.close()
+
+
+def test_lemma_table_survives_pickling(lemma_table):
+    copy = pickle.loads(pickle.dumps(lemma_table))
+    assert copy.lemmatize('flats') == 'flat'
+    assert copy.lemmatize('unknown') == 'unknown'
+    copy.close()
+
+
+def test_pool_with_lemma_table_matches_in_process(shared):
+    normalizer, pipeline, forest = shared
+    pool = InferencePool(forest.manifest, normalizer, processes=2)
+    try:
+        results = pool.infer_many(INPUTS, top_k=2)
+        assert pool.stats()['processes'] == 2
+    finally:
+        pool.stop()
+
+    expected_texts = normalizer.normalize_many(INPUTS)
+    expected_top = top_k_predictions(pipeline, expected_texts, 2)
+    assert [text for text, _ in results] == expected_texts
+    for (_, top), expected in zip(results, expected_top):
+        assert [label for label, _ in top] == [label for label, _ in expected]
+        assert [p for _, p in top] == pytest.approx([p for _, p in expected])
+
+
+def test_pool_disables_itself_when_processes_cannot_start(shared):
+    _, _, forest = shared
+    pool = InferencePool(forest.manifest, lambda text: text, processes=1)
+    with pytest.raises(Exception):
+        pool.infer('hello')
+    assert not pool.available
+    started = time.perf_counter()
+    with pytest.raises(RuntimeError, match='disabled'):
+        pool.infer('hello')
+    assert time.perf_counter() - started < 0.5
+    assert pool.stats()['processes'] == 0
+
+
+def test_hung_process_is_replaced(shared, monkeypatch):
+    normalizer, _, forest = shared
+    # The inference process unpickles SlowNormalizer from this module
+    monkeypatch.setenv('PYTHONPATH', os.path.dirname(os.path.abspath(__file__)))
+    slow = SlowNormalizer(normalizer.stop_words, normalizer.lemmatizer, normalizer.property_terms)
+    pool = InferencePool(forest.manifest, slow, processes=1, timeout=1)
+    try:
+        with pytest.raises(TimeoutError):
+            pool.infer('hang')
+        assert pool.stats()['restarts'] == 1
+        assert pool.infer('flats', top_k=1)[0] == 'flat'
+    finally:
+        pool.stop()
+
+
+def test_reported_error_keeps_the_process(shared, monkeypatch):
+    normalizer, _, forest = shared
+    monkeypatch.setenv('PYTHONPATH', os.path.dirname(os.path.abspath(__file__)))
+    slow = SlowNormalizer(normalizer.stop_words, normalizer.lemmatizer, normalizer.property_terms)
+    pool = InferencePool(forest.manifest, slow, processes=1, timeout=5)
+    try:
+        with pytest.raises(InferenceError, match='bad input'):
+            pool.infer('fail')
+        assert pool.infer('flats', top_k=1)[0] == 'flat'
+        assert pool.stats()['restarts'] == 0
+    finally:
+        pool.stop()
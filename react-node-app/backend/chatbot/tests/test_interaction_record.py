@@ -0,0 +1,22 @@
+import interaction_record
+from interaction_record import Codebook, InteractionRecord, MAX_RESPONSE_CODES
+
+
+def test_codebook_stops_interning_at_its_limit():
+    codebook = Codebook(['a', 'b'], limit=3)
+    assert codebook.code('c') == 2
+    assert codebook.code('d') == 'd'
+    assert codebook.value(codebook.code('d')) == 'd'
+    # Interned values keep their codes once the codebook is full
+    assert codebook.code('a') == 0 and codebook.value(2) == 'c'
+    assert len(codebook) == 3
+
+
+def test_records_keep_unique_responses_once_the_codebook_is_full(monkeypatch):
+    assert interaction_record.RESPONSES.limit == MAX_RESPONSE_CODES
+    responses = Codebook(limit=10)
+    monkeypatch.setattr(interaction_record, 'RESPONSES', responses)
+    records = [InteractionRecord('hi', f"You said: message {n}") for n in range(50)]
+    assert len(responses) == 10
+    assert [record.response for record in records] == [f"You said: message {n}" for n in range(50)]
+    assert InteractionRecord.from_row(records[-1].to_row()).response == records[-1].response
@@ -0,0 +1,66 @@
+import threading
+
+from learned_index import LearnedIndex
+
+
+def test_empty_index_has_no_answer():
+    index = LearnedIndex()
+    assert len(index) == 0
+    assert index.lookup('how do i rent a flat') == (None, 0.0)
+
+
+def test_lookup_returns_the_closest_question_above_the_threshold():
+    index = LearnedIndex(threshold=0.6)
+    index.add('how do i rent a flat', 'rent')
+    index.add_many([('how do i buy a house', 'buy'), ('what documents do sellers need', 'documents')])
+    assert len(index) == 3
+
+    answer, score = index.lookup('how do i rent a flat')
+    assert answer == 'rent' and abs(score - 1.0) < 1e-9
+    assert index.lookup('how do i buy a house please')[0] == 'buy'
+
+    answer, score = index.lookup('weather tomorrow')
+    assert answer is None and score < 0.6
+
+
+def test_retaught_question_returns_the_newest_answer():
+    index = LearnedIndex()
+    index.add('how do i rent a flat', 'old answer')
+    index.add('how do i buy a house', 'buy')
+    index.add('how do i rent a flat', 'new answer')
+    assert index.lookup('how do i rent a flat')[0] == 'new answer'
+
+
+def test_blocks_are_merged_without_losing_pairs():
+    index = LearnedIndex(max_blocks=3)
+    for n in range(20):
+        index.add(f"question number {n} about flat {n}", f"answer {n}")
+        # Each lookup stacks the pending rows into a new block
+        assert index.lookup(f"question number {n} about flat {n}")[0] == f"answer {n}"
+        assert len(index._blocks) <= 4
+    assert len(index) == 20
+    assert sum(block.shape[0] for block in index._blocks) == 20
+    for n in range(20):
+        assert index.lookup(f"question number {n} about flat {n}")[0] == f"answer {n}"
+
+
+def test_concurrent_adds_and_lookups():
+    index = LearnedIndex(max_blocks=2)
+    errors = []
+
+    def teach(worker):
+        try:
+            for n in range(50):
+                index.add(f"worker {worker} question {n}", (worker, n))
+                index.lookup(f"worker {worker} question {n}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=teach, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(index) == 200
+    assert index.lookup('worker 2 question 17')[0] == (2, 17)
@@ -0,0 +1,137 @@
+import json
+import threading
+
+import pytest
+
+from learned_store import LearnedPairLog
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'learned.jsonl')
+
+
+def open_log(path, **kwargs):
+    kwargs.setdefault('fsync', False)
+    return LearnedPairLog(path, legacy_path=None, **kwargs)
+
+
+def file_lines(path):
+    with open(path, 'rb') as f:
+        return f.read().splitlines()
+
+
+def test_load_keeps_the_newest_answer_in_teach_order(path):
+    log = open_log(path)
+    log.append('Rent?', 'old')
+    log.append('Buy?', 'buy')
+    log.append(' rent? ', 'new')
+    log.close()
+
+    log = open_log(path)
+    assert log.load() == [['Buy?', 'buy'], [' rent? ', 'new']]
+    assert len(log) == 2 and log.lines == 3
+
+
+def test_torn_tail_is_truncated_before_the_next_append(path):
+    log = open_log(path)
+    log.append('Rent?', 'rent')
+    log.append('Buy?', 'buy')
+    log.close()
+    with open(path, 'ab') as f:
+        f.write(b'["Sell?","se')
+
+    log = open_log(path)
+    assert log.load() == [['Rent?', 'rent'], ['Buy?', 'buy']]
+    assert log.skipped == 0
+    log.append('Sell?', 'sell')
+    log.close()
+
+    assert file_lines(path)[-1] == b'["Sell?","sell"]'
+    assert open_log(path).load()[-1] == ['Sell?', 'sell']
+
+
+def test_torn_only_line_truncates_to_empty(path):
+    with open(path, 'wb') as f:
+        f.write(b'["Rent?","re')
+    log = open_log(path)
+    assert log.load() == []
+    assert file_lines(path) == []
+
+
+@pytest.mark.parametrize('chunk_size', [1, 1 << 22])
+def test_corrupt_and_malformed_lines_are_skipped(path, chunk_size):
+    lines = [b'["Rent?","rent"]', b'{not json', b'["Buy?"]', b'{"q":"a"}', b'[1,"one"]', b'"text"',
+             b'["Sell?","sell","extra"]', b'["Buy?","buy"]']
+    with open(path, 'wb') as f:
+        f.write(b'\n'.join(lines) + b'\n')
+
+    # One line per chunk parses valid JSON lines on the fast path; one chunk falls back to per-line parsing
+    log = open_log(path)
+    with open(path, 'rb') as f:
+        pairs = list(log._iter_lines(f, chunk_size=chunk_size))
+    assert pairs == [['Rent?', 'rent'], ['Buy?', 'buy']]
+    assert log.skipped == 6
+
+
+def test_load_skips_malformed_lines(path):
+    with open(path, 'wb') as f:
+        f.write(b'["Rent?","rent"]\n["Buy?"]\n[null,null]\n')
+    log = open_log(path)
+    assert log.load() == [['Rent?', 'rent']]
+    assert log.stats()['skipped'] == 2
+
+
+def test_compact_rewrites_one_line_per_question(path):
+    log = open_log(path, compact_min_lines=float('inf'))
+    for n in range(5):
+        log.append('Rent?', f"rent {n}")
+        log.append('Buy?', f"buy {n}")
+    assert log.lines == 10
+
+    assert log.compact() == 8
+    assert [json.loads(line) for line in file_lines(path)] == [['Rent?', 'rent 4'], ['Buy?', 'buy 4']]
+    assert log.lines == 2 and log.compactions == 1
+
+    # Appends after the swap go to the new file
+    log.append('Sell?', 'sell')
+    log.close()
+    assert open_log(path).load() == [['Rent?', 'rent 4'], ['Buy?', 'buy 4'], ['Sell?', 'sell']]
+
+
+def test_compact_keeps_lines_appended_during_the_rewrite(path, monkeypatch):
+    log = open_log(path, compact_min_lines=float('inf'))
+    for n in range(4):
+        log.append('Rent?', f"rent {n}")
+
+    # Append while compact() is between reading the log and swapping it in
+    latest = log._latest
+
+    def latest_then_append(f, limit=None):
+        result = latest(f, limit)
+        thread = threading.Thread(target=log.append, args=('Buy?', 'buy'))
+        thread.start()
+        thread.join()
+        return result
+
+    monkeypatch.setattr(log, '_latest', latest_then_append)
+    assert log.compact() == 3
+    assert [json.loads(line) for line in file_lines(path)] == [['Rent?', 'rent 3'], ['Buy?', 'buy']]
+    assert log.lines == 2
+
+
+def test_load_compacts_in_the_background_when_superseded_lines_dominate(path):
+    log = open_log(path, compact_min_lines=10)
+    log._compacting = True
+    for n in range(20):
+        log.append('Rent?', f"rent {n}")
+    log.close()
+
+    log = open_log(path, compact_min_lines=10)
+    done = threading.Event()
+    compact = log.compact
+    log.compact = lambda: (compact(), done.set())[0]
+    assert log.load() == [['Rent?', 'rent 19']]
+    assert done.wait(5)
+    assert file_lines(path) == [b'["Rent?","rent 19"]']
+    assert log.stats()['compactions'] == 1
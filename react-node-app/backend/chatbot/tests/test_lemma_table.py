@@ -0,0 +1,93 @@
+import pickle
+
+import pytest
+
+import lemma_table
+from lemma_table import LemmaTable, load_lemma_table
+
+LEMMAS = {'apartment': '', 'apartments': 'apartment', 'children': 'child', 'flat': '', 'flats': 'flat',
+          'houses': 'house', 'mice': 'mouse', 'zones': 'zone'}
+
+
+class Fallback:
+    def __init__(self):
+        self.words = []
+
+    def lemmatize(self, word):
+        self.words.append(word)
+        return word.upper()
+
+
+def write_table(path, lemmas=LEMMAS):
+    entries = sorted((word.encode('utf-8'), lemma.encode('utf-8')) for word, lemma in lemmas.items())
+    path.write_bytes(b'\n'.join(word + b'\t' + lemma for word, lemma in entries))
+    return str(path)
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    return write_table(tmp_path / 'lemma_table.tsv')
+
+
+def test_lookup_finds_every_entry(table_path):
+    table = LemmaTable(table_path)
+    for word, lemma in LEMMAS.items():
+        assert word in table
+        assert table.lemmatize(word) == (lemma or word)
+    table.close()
+
+
+def test_misses_use_the_fallback_or_return_the_word(table_path):
+    fallback = Fallback()
+    table = LemmaTable(table_path, fallback)
+    # Words before, between and after the entries
+    for word in ['aardvark', 'cat', 'house', 'zzz']:
+        assert word not in table
+        assert table.lemmatize(word) == word.upper()
+    assert fallback.words == ['aardvark', 'cat', 'house', 'zzz']
+    assert table.misses == 4
+
+    # Repeated lookups are served from the cache
+    table.lemmatize('cat')
+    assert table.misses == 4 and table.cache_info().hits == 1
+
+    assert LemmaTable(table_path).lemmatize('cat') == 'cat'
+
+
+def test_empty_and_single_entry_tables(tmp_path):
+    empty = tmp_path / 'empty.tsv'
+    empty.write_bytes(b'')
+    assert LemmaTable(str(empty)).lemmatize('flats') == 'flats'
+
+    single = LemmaTable(write_table(tmp_path / 'single.tsv', {'flats': 'flat'}))
+    assert single.lemmatize('flats') == 'flat'
+    assert single.lemmatize('flat') == 'flat' and single.misses == 1
+
+
+def test_pickled_table_reopens_the_mapping(table_path):
+    table = LemmaTable(table_path, Fallback(), cache_size=10)
+    table.lemmatize('flats')
+    copy = pickle.loads(pickle.dumps(table))
+    assert copy.path == table_path and copy.cache_size == 10
+    assert isinstance(copy.fallback, Fallback)
+    assert copy.misses == 0 and copy.cache_info().currsize == 0
+    assert copy.lemmatize('mice') == 'mouse'
+    assert copy.lemmatize('cat') == 'CAT'
+
+
+def test_digest_follows_the_table_contents(tmp_path, table_path):
+    digest = LemmaTable(table_path).digest()
+    assert LemmaTable(write_table(tmp_path / 'copy.tsv')).digest() == digest
+    rebuilt = LemmaTable(write_table(tmp_path / 'rebuilt.tsv', dict(LEMMAS, geese='goose')))
+    assert rebuilt.digest() != digest
+
+
+def test_load_lemma_table(tmp_path, table_path, monkeypatch):
+    fallback = Fallback()
+    assert load_lemma_table(str(tmp_path / 'missing.tsv'), fallback) is fallback
+
+    table = load_lemma_table(table_path, fallback)
+    assert isinstance(table, LemmaTable) and table.fallback is fallback
+
+    monkeypatch.setattr(lemma_table, 'WORDNET_FALLBACK', False)
+    assert load_lemma_table(table_path, fallback).fallback is None
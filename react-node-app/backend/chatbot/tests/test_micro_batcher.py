@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+from sklearn.pipeline import Pipeline
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from inference import top_k_predictions
+from micro_batcher import MicroBatcher
+
+TRAIN = [
+    ('how do i list my property', 'listing'),
+    ('what are the listing fees', 'fees'),
+    ('are there any hidden charges', 'fees'),
+    ('how can i contact support', 'support'),
+    ('show me flats near the station', 'search'),
+    ('i want apartments in pune', 'search'),
+]
+
+
+@pytest.fixture(scope='module')
+def pipeline():
+    pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer()),
+        ('classifier', RandomForestClassifier(n_estimators=10, random_state=0))
+    ])
+    pipeline.fit([q for q, _ in TRAIN], [a for _, a in TRAIN])
+    return pipeline
+
+
+def test_batched_results_match_unbatched_under_concurrency(pipeline):
+    texts = [f"{question} {n}" for n in range(40) for question, _ in TRAIN]
+    expected = top_k_predictions(pipeline, texts, 3)
+    batcher = MicroBatcher(lambda items: top_k_predictions(pipeline, items, 3), window=0.005, max_batch=16,
+                           timeout=30)
+    results = [None] * len(texts)
+
+    def submitter(offset):
+        for position in range(offset, len(texts), 8):
+            results[position] = batcher.submit(texts[position])
+
+    threads = [threading.Thread(target=submitter, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = batcher.stats()
+    assert stats['items'] == len(texts) and stats['timeouts'] == 0
+    assert stats['mean_batch_size'] > 1
+    for result, reference in zip(results, expected):
+        assert [label for label, _ in result] == [label for label, _ in reference]
+        assert [p for _, p in result] == pytest.approx([p for _, p in reference])
+
+
+def test_stuck_batch_falls_back_to_a_direct_call():
+    release = threading.Event()
+
+    def fn(items):
+        if threading.current_thread().name == 'micro-batcher':
+            release.wait(5)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(fn, window=0.001, timeout=0.1)
+    try:
+        assert batcher.submit(21) == 42
+        assert batcher.stats()['timeouts'] == 1
+        # Requests queued behind the stuck batch also fall back
+        assert batcher.submit(5) == 10
+    finally:
+        release.set()
+    # Once the batch thread recovers, abandoned requests are skipped and batching resumes
+    batcher.timeout = 5
+    assert batcher.submit(1) == 2
+    stats = batcher.stats()
+    assert stats['timeouts'] == 2
+    assert stats['items'] == 2
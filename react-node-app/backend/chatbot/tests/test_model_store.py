@@ -0,0 +1,29 @@
+from model_store import ModelStore, fingerprint, pipeline_spec
+from text_normalizer import NORMALIZER_VERSION
+
+PAIRS = [('what are the fees', 'Listing is free.'), ('how do i contact support', 'Email us.')]
+
+
+def test_fingerprint_tracks_estimators_and_normalizer_version():
+    spec = pipeline_spec(vectorizer=('TfidfVectorizer', {'ngram_range': (1, 2)}), classifier=('MultinomialNB', {}))
+    assert spec == {
+        'vectorizer': {'class': 'TfidfVectorizer', 'params': {'ngram_range': (1, 2)}},
+        'classifier': {'class': 'MultinomialNB', 'params': {}}
+    }
+    settings = {'normalizer': NORMALIZER_VERSION, 'lemmatize': True}
+    key = fingerprint(PAIRS, settings, spec)
+    assert key == fingerprint(PAIRS, dict(settings), dict(spec))
+
+    other_classifier = pipeline_spec(vectorizer=('TfidfVectorizer', {'ngram_range': (1, 2)}),
+                                     classifier=('RandomForestClassifier', {}))
+    assert fingerprint(PAIRS, settings, other_classifier) != key
+    assert fingerprint(PAIRS, dict(settings, normalizer=NORMALIZER_VERSION + 1), spec) != key
+
+
+def test_store_round_trip(tmp_path):
+    store = ModelStore(str(tmp_path))
+    key = fingerprint(PAIRS, {'preprocess': 'raw'}, pipeline_spec(classifier=('MultinomialNB', {})))
+    assert store.load(key) is None
+    store.save(key, {'model': 1})
+    assert store.exists(key)
+    assert store.load(key) == {'model': 1}
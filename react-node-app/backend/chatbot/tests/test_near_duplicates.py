@@ -0,0 +1,34 @@
+from learned_store import LearnedPairLog
+from near_duplicates import dedup_pairs
+
+
+def test_near_duplicate_with_a_different_answer_is_a_conflict():
+    pairs = [
+        ('What are the listing fees?', 'Listing is free.'),
+        ('what are the listing fees', 'Listing is free.'),
+        ('What are your listing fees?', 'Listing costs 500 rupees.'),
+        ('How do I contact support?', 'Email support@nextopson.com.'),
+    ]
+    kept, duplicates, conflicts = dedup_pairs(pairs, threshold=0.5)
+    assert kept == [pairs[1], pairs[2], pairs[3]]
+    assert duplicates == [(pairs[0], pairs[1])]
+    assert conflicts == [(pairs[1], pairs[2])]
+
+    kept, duplicates, conflicts = dedup_pairs(pairs, threshold=0.5, keep='first')
+    assert kept == [pairs[0], pairs[2], pairs[3]]
+    assert duplicates == [(pairs[1], pairs[0])]
+    assert conflicts == [(pairs[2], pairs[0])]
+
+
+def test_keep_last_follows_the_latest_teach_in_the_log(tmp_path):
+    log = LearnedPairLog(str(tmp_path / 'learned.jsonl'), legacy_path=None, fsync=False)
+    log.append('what are the listing fees', 'Listing is free.')
+    log.append('what are your listing fees', 'Listing costs 500 rupees.')
+    # Re-teaching the first question makes its answer the newest
+    log.append('What are the listing fees', 'Listing is free for owners.')
+    log.close()
+
+    pairs = LearnedPairLog(str(tmp_path / 'learned.jsonl'), legacy_path=None).load()
+    assert [answer for _, answer in pairs] == ['Listing costs 500 rupees.', 'Listing is free for owners.']
+    kept, _, conflicts = dedup_pairs(pairs, threshold=0.5)
+    assert conflicts == [(pairs[0], pairs[1])]
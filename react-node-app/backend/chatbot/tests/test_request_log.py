@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import logging
+
+import pytest
+
+import request_log
+
+
+@pytest.fixture
+def restore_logging(monkeypatch):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    monkeypatch.setattr(request_log, '_handler', None)
+    monkeypatch.setattr(request_log, '_sample_rate', 1.0)
+    yield
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_size_rotation_keeps_capped_json_lines_within_limits(tmp_path, restore_logging):
+    path = str(tmp_path / 'api.log')
+    handler = request_log.configure(path, max_field=40, max_bytes=4096, rotate_seconds=3600, backup_count=2)
+    # Enough records to rotate on size several times over
+    for n in range(200):
+        request_log.log_request('POST', '/chat', 200, 0.002, body='y' * 100, n=n)
+    handler.stop()
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ['api.log', 'api.log.1', 'api.log.2']
+    records = []
+    for name in reversed(files):
+        assert os.path.getsize(tmp_path / name) <= 4096
+        records.extend(read_lines(tmp_path / name))
+    # Only the newest backups are kept, so the oldest records are gone
+    assert records[-1]['n'] == 199
+    assert len(records) < 200
+    for record in records:
+        assert {'ts', 'level', 'logger', 'message'} <= set(record)
+        assert len(record['body']) <= 40 + len('... [60 more chars]')
+
+    assert request_log.stats()['dropped'] == 0
+
+
+def test_first_records_survive_a_time_rotation(tmp_path, restore_logging):
+    path = str(tmp_path / 'api.log')
+    handler = request_log.configure(path, max_field=40, max_bytes=0, rotate_seconds=3600, backup_count=3)
+    request_log.log_request('POST', '/chat', 500, 0.5, body='z' * 100)
+    logging.getLogger('chatbot').error('failed', exc_info=ValueError('boom'))
+    time.sleep(0.2)
+    # Past its age limit the file rotates on the next write, however small it is
+    handler.targets[-1].rollover_at = time.time() - 1
+    request_log.log_request('GET', '/health', 200, 0.001)
+    handler.stop()
+
+    first, second = read_lines(path + '.1'), read_lines(path)
+    assert [record['message'] for record in first] == ['POST /chat 500', 'failed']
+    assert first[0]['status'] == 500 and first[0]['body'].startswith('z' * 40 + '...')
+    assert 'ValueError: boom' in first[1]['exc']
+    assert [record['path'] for record in second] == ['/health']
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+@pytest.mark.parametrize('tag', ['w0', None])
+def test_forked_process_writes_its_own_file(tmp_path, restore_logging, monkeypatch, tag):
+    monkeypatch.setattr(request_log, '_process_tag', None)
+    path = str(tmp_path / 'api.log')
+    handler = request_log.configure(path, max_bytes=0, rotate_seconds=3600)
+    request_log.log_request('GET', '/before-fork', 200, 0.001)
+    time.sleep(0.2)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            if tag:
+                request_log.set_process_tag(tag)
+            request_log.log_request('GET', '/child', 200, 0.001)
+            handler.stop()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    request_log.log_request('GET', '/parent', 200, 0.001)
+    handler.stop()
+
+    child_path = tmp_path / f"api.{tag or f'pid{pid}'}.log"
+    assert sorted(os.listdir(tmp_path)) == sorted(['api.log', child_path.name])
+    assert [record['path'] for record in read_lines(path)] == ['/before-fork', '/parent']
+    assert [record['path'] for record in read_lines(child_path)] == ['/child']
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+
+import pytest
+
+from retrain_scheduler import RetrainScheduler, ServingModel, fit_in_subprocess, fit_tfidf_nb
+
+PAIRS = [('how do i rent a flat', 'rent'), ('where can i rent an apartment', 'rent'),
+         ('how do i buy a house', 'buy'), ('i want to buy property', 'buy')]
+
+
+def fit_labels(data):
+    return sorted(set(answer for _, answer in data))
+
+
+def fit_fails(data):
+    raise ValueError(f"cannot fit {len(data)} pairs")
+
+
+class Server:
+    """Serves a ServingModel the way the bot does, bumping the version per install"""
+
+    def __init__(self):
+        self.model = ServingModel(None, 0)
+        self.data = list(PAIRS)
+        self.installed = threading.Event()
+        self.snapshots = 0
+
+    def snapshot(self):
+        self.snapshots += 1
+        return list(self.data)
+
+    def install(self, pipeline):
+        self.model = ServingModel(pipeline, self.model.version + 1)
+        self.installed.set()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_burst_of_requests_is_coalesced_into_one_run():
+    server = Server()
+    scheduler = RetrainScheduler(server.snapshot, fit_labels, server.install, debounce=0.2, max_delay=5,
+                                 use_process=False)
+    for _ in range(5):
+        scheduler.request()
+        time.sleep(0.02)
+    assert scheduler.stats()['pending']
+    assert server.installed.wait(5)
+    time.sleep(0.3)
+
+    stats = scheduler.stats()
+    assert stats['requests'] == 5 and stats['runs'] == 1
+    assert not stats['pending'] and not stats['running']
+    assert server.snapshots == 1 and server.model.version == 1
+
+
+def test_max_delay_bounds_a_steady_stream_of_requests():
+    server = Server()
+    scheduler = RetrainScheduler(server.snapshot, fit_labels, server.install, debounce=0.2, max_delay=0.15,
+                                 use_process=False)
+    started = time.monotonic()
+    while not server.installed.is_set():
+        assert time.monotonic() - started < 5
+        scheduler.request()
+        time.sleep(0.02)
+    # Requests never paused for the debounce, so only max_delay started the run
+    assert time.monotonic() - started < 1
+
+
+def test_requests_during_a_run_coalesce_into_one_follow_up():
+    server = Server()
+    fitting, release = threading.Event(), threading.Event()
+
+    def slow_fit(data):
+        fitting.set()
+        release.wait(5)
+        return fit_labels(data)
+
+    scheduler = RetrainScheduler(server.snapshot, slow_fit, server.install, debounce=0.05, max_delay=5,
+                                 use_process=False)
+    scheduler.request()
+    assert fitting.wait(5)
+    assert scheduler.stats()['running']
+    for _ in range(3):
+        scheduler.request()
+    server.data.append(('can i sell my flat', 'sell'))
+    release.set()
+
+    wait_for(lambda: scheduler.stats()['runs'] == 2 and not scheduler.stats()['running'])
+    time.sleep(0.2)
+    assert scheduler.stats()['runs'] == 2
+    assert server.model.version == 2
+    assert server.model.pipeline == ['buy', 'rent', 'sell']
+
+
+def test_install_swaps_model_and_version_together():
+    server = Server()
+    scheduler = RetrainScheduler(server.snapshot, fit_tfidf_nb, server.install, use_process=False)
+    assert scheduler.run_now()
+    serving = server.model
+    assert serving.version == 1
+    assert serving.pipeline.predict(['rent a flat'])[0] == 'rent'
+
+    # A request holding the old model keeps a consistent pipeline and version across a swap
+    server.data.append(('can i sell my flat', 'sell'))
+    assert scheduler.run_now()
+    assert server.model.version == 2 and server.model.pipeline is not serving.pipeline
+    assert serving.version == 1 and 'sell' not in serving.pipeline.classes_
+    assert 'sell' in server.model.pipeline.classes_
+
+
+def test_failed_validation_keeps_the_current_model():
+    server = Server()
+    scheduler = RetrainScheduler(server.snapshot, fit_labels, server.install,
+                                 validate=lambda model, data: len(model) > 2, use_process=False)
+    assert not scheduler.run_now()
+    assert server.model.version == 0
+    assert scheduler.stats()['rejected'] == 1 and scheduler.stats()['runs'] == 0
+
+
+def test_fit_failure_is_recorded():
+    server = Server()
+    scheduler = RetrainScheduler(server.snapshot, fit_fails, server.install, use_process=False)
+    assert not scheduler.run_now()
+    assert scheduler.stats()['failures'] == 1
+    assert scheduler.stats()['last_error'] == 'cannot fit 4 pairs'
+    assert server.model.version == 0
+
+
+@pytest.fixture
+def subprocess_path(monkeypatch):
+    # The retrain subprocess imports fit functions from this module
+    here = os.path.dirname(os.path.abspath(__file__))
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+
+
+def test_fit_in_subprocess(subprocess_path):
+    assert fit_in_subprocess(fit_labels, PAIRS) == ['buy', 'rent']
+
+
+def test_fit_in_subprocess_reports_the_child_error(subprocess_path):
+    with pytest.raises(RuntimeError) as excinfo:
+        fit_in_subprocess(fit_fails, PAIRS)
+    assert str(excinfo.value) == 'ValueError: cannot fit 4 pairs'
+
+
+def test_subprocess_failure_falls_back_to_fitting_in_process(subprocess_path):
+    server = Server()
+    calls = []
+
+    def fit_local(data):
+        calls.append(len(data))
+        return fit_labels(data)
+
+    # A nested function cannot be imported by the child
+    scheduler = RetrainScheduler(server.snapshot, fit_local, server.install)
+    assert scheduler.run_now()
+    assert not scheduler.use_process
+    assert calls == [4] and server.model.pipeline == ['buy', 'rent']
@@ -0,0 +1,166 @@
+import sqlite3
+
+import pytest
+
+import session_server
+from interaction_record import InteractionRecord
+from session_backends import SQLiteSessionStore, SocketSessionStore
+from session_store import SessionStore, HistoryFilter
+
+
+def record(n, topics=()):
+    return InteractionRecord(f"question {n}", f"answer {n}", 'neutral', 'flat' if topics else 'general',
+                             0.5, 1700000000.0 + n, topics)
+
+
+def rows(items):
+    return [item.to_row() for item in items]
+
+
+@pytest.fixture(params=['sqlite', 'socket'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        # A long flush interval leaves appends queued until flush() is called
+        store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_history=10, flush_interval=60,
+                                   reap_interval=None)
+        yield store
+        store.stop()
+    else:
+        path = str(tmp_path / 'sessions.sock')
+        server = session_server.serve_in_thread(path, SessionStore(10, reap_interval=None))
+        store = SocketSessionStore(path)
+        yield store
+        store.stop()
+        server.shutdown()
+        server.server_close()
+
+
+def flush(store):
+    if isinstance(store, SQLiteSessionStore):
+        store.flush()
+
+
+def read_pages(store, user_id, limit, match=None):
+    items, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.page(user_id, cursor, limit, match)
+        items.extend(page)
+        pages += 1
+        if cursor is None:
+            return items, pages
+
+
+def test_append_history_pop_round_trip(store):
+    expected = [record(n, ['flat'] if n % 2 else ()) for n in range(8)]
+    for item in expected:
+        store.append('alice', item)
+    store.append('bob', record(100))
+
+    assert rows(store.history('alice')) == rows(expected)
+    flush(store)
+    assert rows(store.history('alice')) == rows(expected)
+    history, counts = store.summary('alice')
+    assert rows(history) == rows(expected)
+    assert 'alice' in store and 'nobody' not in store
+
+    assert rows(store.pop('alice')) == rows(expected)
+    assert store.pop('alice') is None
+    assert 'alice' not in store
+    assert rows(store.history('bob')) == rows([record(100)])
+
+    store.clear()
+    assert store.history('bob') == []
+
+
+@pytest.mark.parametrize('flushed', [False, True])
+def test_page_walks_history_with_filter(store, flushed):
+    expected = [record(n, ['flat'] if n % 3 == 0 else ()) for n in range(8)]
+    for item in expected:
+        store.append('alice', item)
+    if flushed:
+        flush(store)
+
+    items, pages = read_pages(store, 'alice', 3)
+    assert rows(items) == rows(expected)
+    assert pages >= 3
+
+    flats = HistoryFilter(topic='flat')
+    items, _ = read_pages(store, 'alice', 2, flats)
+    assert rows(items) == rows(item for item in expected if 'flat' in item.topics)
+
+    # A cursor stays valid across later appends
+    page, cursor = store.page('alice', None, 4)
+    store.append('alice', record(8))
+    rest, cursor = store.page('alice', cursor, 100)
+    assert rows(page + rest) == rows(expected + [record(8)])
+    assert cursor is None
+
+
+def test_sqlite_page_merges_unflushed_appends(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_history=10, flush_interval=60,
+                               reap_interval=None)
+    try:
+        for n in range(3):
+            store.append('alice', record(n))
+        store.flush()
+        for n in range(3, 6):
+            store.append('alice', record(n))
+        assert store.stats()['pending_writes'] == 3
+        items, _ = read_pages(store, 'alice', 2)
+        assert [item.input for item in items] == [f"question {n}" for n in range(6)]
+        # Paging did not flush on the caller's thread
+        assert store.stats()['pending_writes'] == 3
+    finally:
+        store.stop()
+
+
+def test_socket_page_rejects_arbitrary_predicates(store):
+    if not isinstance(store, SocketSessionStore):
+        pytest.skip('SQLite evaluates any predicate')
+    store.append('alice', record(1))
+    with pytest.raises(ValueError, match='HistoryFilter'):
+        store.page('alice', match=lambda item: True)
+    # HistoryFilter and no filter at all are fine
+    assert len(store.page('alice', match=HistoryFilter(topic='flat'))[0]) == 0
+    assert len(store.page('alice')[0]) == 1
+
+
+def test_socket_append_is_best_effort(tmp_path):
+    path = str(tmp_path / 'sessions.sock')
+    store = SocketSessionStore(path, timeout=1)
+    # No server listening: the turn is dropped, not raised to the request
+    store.append('alice', record(1))
+    assert store.dropped_appends == 1
+
+    server = session_server.serve_in_thread(path, SessionStore(10, reap_interval=None))
+    try:
+        store.append('alice', record(2))
+        assert [item.input for item in store.history('alice')] == ['question 2']
+        assert store.stats()['dropped_appends'] == 1
+    finally:
+        store.stop()
+        server.shutdown()
+        server.server_close()
+
+
+def test_sqlite_flush_keeps_the_batch_when_the_database_is_locked(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SQLiteSessionStore(path, max_history=10, flush_interval=60, reap_interval=None)
+    other = sqlite3.connect(path, isolation_level=None)
+    try:
+        store.append('alice', record(1))
+        store.append('alice', record(2))
+        store._conn().execute('PRAGMA busy_timeout = 50')
+        other.execute('BEGIN IMMEDIATE')
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            store.flush()
+        assert store.stats()['pending_writes'] == 2
+        assert [item.input for item in store.history('alice')] == ['question 1', 'question 2']
+
+        other.execute('ROLLBACK')
+        assert store.flush() == 2
+        assert store.stats()['pending_writes'] == 0
+        assert [item.input for item in store.history('alice')] == ['question 1', 'question 2']
+    finally:
+        other.close()
+        store.stop()
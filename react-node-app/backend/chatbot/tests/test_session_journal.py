@@ -0,0 +1,147 @@
+import os
+import glob
+
+from interaction_record import InteractionRecord
+from session_journal import SessionJournal, JournaledSessionStore, SNAPSHOT_NAME
+from session_store import SessionStore
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def record(n):
+    return InteractionRecord(f"question {n}", f"answer {n}", 'neutral', 'general', 0.5, 1700000000.0 + n, ())
+
+
+def open_store(directory, clock, **kwargs):
+    kwargs.setdefault('max_sessions', 100)
+    kwargs.setdefault('idle_ttl', 1800)
+    store = SessionStore(3, reap_interval=None, clock=clock, **kwargs)
+    return JournaledSessionStore(store, SessionJournal(str(directory), snapshot_every=float('inf'), clock=clock))
+
+
+def histories(store):
+    return {user_id: [item.to_row() for item in items] for user_id, items in store.export().items()}
+
+
+def test_replay_snapshot_rotate_round_trip(tmp_path):
+    clock = Clock()
+    store = open_store(tmp_path, clock)
+    for n in range(10):
+        store.append(f"user-{n % 3}", record(n))
+    store.append('gone', record(99))
+    store.snapshot()
+    generation = store.journal.stats()['generation']
+    for n in range(10, 14):
+        store.append(f"user-{n % 3}", record(n))
+    store.pop('gone')
+    expected = histories(store)
+    store.stop()
+
+    recovered = open_store(tmp_path, clock)
+    assert histories(recovered) == expected
+    assert recovered.history('user-1')[-1].to_row() == record(13).to_row()
+    assert 'gone' not in recovered
+
+    # Snapshotting the recovered store drops every log before the new generation
+    recovered.append('user-0', record(20))
+    recovered.snapshot()
+    expected = histories(recovered)
+    recovered.stop()
+    logs = [int(os.path.basename(path)[8:-4]) for path in glob.glob(str(tmp_path / 'journal-*.log'))]
+    assert os.path.exists(tmp_path / SNAPSHOT_NAME)
+    assert min(logs) > generation
+
+    assert histories(open_store(tmp_path, clock)) == expected
+
+
+def test_expired_sessions_stay_expired_after_replay(tmp_path):
+    clock = Clock()
+    store = open_store(tmp_path, clock, idle_ttl=60)
+    store.append('old', record(1))
+    store.snapshot()
+    store.append('stale', record(2))
+    clock.now += 50
+    store.append('fresh', record(3))
+    store.stop()
+
+    # 'old' and 'stale' are past the TTL; 'fresh' is 20s idle
+    clock.now += 20
+    recovered = open_store(tmp_path, clock, idle_ttl=60)
+    assert set(recovered.export()) == {'fresh'}
+    clock.now += 45
+    assert 'fresh' not in recovered
+
+
+def test_lru_evictions_are_reproduced_on_replay(tmp_path):
+    clock = Clock()
+    store = open_store(tmp_path, clock, max_sessions=2)
+    for n, user_id in enumerate(['a', 'b', 'c', 'a']):
+        clock.now += 1
+        store.append(user_id, record(n))
+    assert set(store.export()) == {'c', 'a'}
+    store.stop()
+
+    recovered = open_store(tmp_path, clock, max_sessions=2)
+    assert list(recovered.export()) == ['c', 'a']
+
+
+def test_forked_process_does_not_journal(tmp_path):
+    clock = Clock()
+    store = open_store(tmp_path, clock)
+    store.append('parent', record(1))
+    store.journal.sync()
+    # As seen from a process forked after the journal was opened
+    store.journal._owner_pid = os.getpid() + 1
+    store.append('child', record(2))
+    store.pop('parent')
+    store.snapshot()
+    assert 'child' in store and 'parent' not in store
+    assert store.journal.stats()['entries'] == 1
+    store.journal._owner_pid = os.getpid()
+    store.stop()
+
+    assert set(open_store(tmp_path, clock).export()) == {'parent'}
+
+
+def test_restarted_session_does_not_revive_old_history(tmp_path):
+    clock = Clock()
+    store = open_store(tmp_path, clock, idle_ttl=100)
+    for n in range(3):
+        store.append('user', record(n))
+    store.snapshot()
+    clock.now += 500
+    store.append('user', record(3))
+    assert [item.input for item in store.history('user')] == ['question 3']
+    # The same within the log tail, without a snapshot in between
+    store.append('tail', record(4))
+    clock.now += 500
+    store.append('tail', record(5))
+    store.append('user', record(6))
+    expected = histories(store)
+    store.stop()
+
+    recovered = open_store(tmp_path, clock, idle_ttl=100)
+    assert histories(recovered) == expected
+    assert [item.input for item in recovered.history('user')] == ['question 6']
+    assert [item.input for item in recovered.history('tail')] == ['question 5']
+
+
+def test_evicted_session_does_not_revive_old_history(tmp_path):
+    clock = Clock()
+    store = open_store(tmp_path, clock, max_sessions=2)
+    store.append('a', record(0))
+    store.snapshot()
+    for n, user_id in enumerate(['b', 'c', 'a'], 1):
+        clock.now += 1
+        store.append(user_id, record(n))
+    expected = histories(store)
+    assert [row[0] for row in expected['a']] == ['question 3']
+    store.stop()
+
+    assert histories(open_store(tmp_path, clock, max_sessions=2)) == expected
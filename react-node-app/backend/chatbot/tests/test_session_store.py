@@ -0,0 +1,84 @@
+import sys
+import random
+
+from interaction_record import InteractionRecord
+from session_store import Session, SessionStore, _item_sizeof
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def record(n):
+    return InteractionRecord(f"question {n}", f"answer {n % 7}", 'neutral', 'general', 0.5, 1700000000.0 + n, ())
+
+
+def walked(store):
+    """The totals stats() keeps, recomputed by walking every session"""
+    size, interactions, packed = 0, 0, 0
+    for user_id, session in store._sessions.items():
+        if session.packed is not None:
+            assert session.size == sys.getsizeof(session) + sys.getsizeof(session.packed)
+            packed += 1
+        else:
+            # Containers are sized as created, so growth of counters is not tracked
+            base = Session(store.max_history, 0).size
+            assert session.size == base + sum(_item_sizeof(item) for item in session.history)
+            interactions += len(session.history)
+        size += session.size + sys.getsizeof(user_id)
+    return sys.getsizeof(store._sessions) + size, interactions, packed
+
+
+def check(store):
+    stats = store.stats()
+    assert (stats['bytes_in_use'], stats['interactions'], stats['packed_sessions']) == walked(store)
+    assert stats['sessions'] == len(store)
+
+
+def test_running_totals_match_a_full_walk():
+    clock = Clock()
+    store = SessionStore(3, max_sessions=20, idle_ttl=100, reap_interval=None, clock=clock)
+    rng = random.Random(0)
+    for n in range(500):
+        clock.now += rng.random() * 5
+        user_id = f"user-{rng.randrange(40)}"
+        operation = rng.random()
+        if operation < 0.8:
+            store.append(user_id, record(n))
+        elif operation < 0.9:
+            store.pop(user_id)
+        elif operation < 0.95:
+            store.history(user_id)
+        else:
+            clock.now += 60
+            store.reap()
+        check(store)
+    assert store.stats()['evictions'] and store.stats()['expirations']
+
+    store.clear()
+    check(store)
+    assert store.stats()['interactions'] == 0
+
+
+def test_packed_sessions_are_counted_until_unpacked():
+    clock = Clock()
+    store = SessionStore(3, reap_interval=None, clock=clock)
+    store.append('live', record(0))
+    rows = {f"user-{n}": (record(n).to_row(), record(n + 1).to_row()) for n in range(5)}
+    store.restore({'live': [record(9)], **rows},
+                  decode=lambda packed: [InteractionRecord.from_row(row) for row in packed])
+    check(store)
+    assert store.stats()['packed_sessions'] == 5
+
+    store.history('user-0')
+    store.pop('user-1')
+    store.append('user-2', record(20))
+    check(store)
+    assert store.stats()['packed_sessions'] == 2
+    store.export()
+    check(store)
+    assert store.stats()['packed_sessions'] == 0
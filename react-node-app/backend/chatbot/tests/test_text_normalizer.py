@@ -0,0 +1,90 @@
+import string
+
+import pytest
+from nltk.tokenize import NLTKWordTokenizer
+
+from nextopson_bot import TRAIN_DATA
+from text_normalizer import clean, tokenize, tokenize_sentence
+
+ADVERSARIAL = [
+    '"Is it free?" she asked.',
+    "I can't find my listing, won't it show?",
+    "Don't you think it's 'verified'?",
+    'cannot gonna gotta lemme gimme wanna see it',
+    'wanna',
+    'Wait... what?!',
+    'so.. many... dots....',
+    'Is https://nextopson.com/listings?id=42&x=1 safe?',
+    'mail me at user@example.com, ok.',
+    'price is 1,50,000.50 or 2,00,000, right,',
+    'ends with a comma,',
+    '3bhk,2bhk,1bhk near st. mary rd.',
+    '?!?!',
+    '...',
+    '.',
+    ',',
+    '',
+    '   spaced   out   ',
+    'tab\tand\nnewline.',
+    'unicode café naïve résumé?',
+    '¿qué? ¡sí!',
+    string.punctuation,
+    'see mr. sharma at 5 p.m. on st. mary rd. near the station.',
+    'flat no. 12 costs rs. 50 lakh. is it available?',
+    'j. k. tower, sector 5. contact dr. rao.',
+]
+
+
+def _inputs():
+    for question, answer in TRAIN_DATA:
+        yield question
+        yield answer
+        yield question.upper()
+        yield question + '!! Thanks, ' + question.lower()
+        yield question + '... ' + string.punctuation
+    yield from ADVERSARIAL
+
+
+@pytest.mark.parametrize('text', list(_inputs()))
+def test_tokenize_sentence_matches_nltk(text):
+    # tokenize_sentence is only used on cleaned text, which is what it must match on
+    cleaned = clean(text)
+    assert tokenize_sentence(cleaned) == NLTKWordTokenizer().tokenize(cleaned)
+
+
+def _bundle_skip_reason():
+    """Why the word_tokenize parity test cannot run, or None"""
+    from nltk_bundle import DEFAULT_BUNDLE_DIR, NLTKBundleError, verify_bundle
+    try:
+        verify_bundle(DEFAULT_BUNDLE_DIR)
+    except NLTKBundleError as e:
+        return f"{e} (set NEXTOPSON_REQUIRE_NLTK_BUNDLE=1 to fail instead)"
+    return None
+
+
+@pytest.fixture(scope='module')
+def bundled_punkt():
+    """nltk.data pointed at the bot's NLTK bundle, as load_bundle does at runtime"""
+    import os
+    import nltk
+    import text_normalizer
+
+    reason = _bundle_skip_reason()
+    if reason:
+        if os.environ.get('NEXTOPSON_REQUIRE_NLTK_BUNDLE') == '1':
+            pytest.fail(reason)
+        pytest.skip(reason)
+    from nltk_bundle import DEFAULT_BUNDLE_DIR
+    saved = list(nltk.data.path)
+    nltk.data.path[:] = [os.path.abspath(DEFAULT_BUNDLE_DIR)]
+    text_normalizer._punkt_missing = False
+    yield
+    nltk.data.path[:] = saved
+
+
+@pytest.mark.parametrize('text', list(_inputs()))
+def test_tokenize_matches_word_tokenize(bundled_punkt, text):
+    from nltk.tokenize import word_tokenize
+
+    cleaned = clean(text)
+    assert tokenize(cleaned) == word_tokenize(cleaned)
@@ -0,0 +1,228 @@
+"""Fast text normalization for the Nextopson bot.
+
+Reproduces NextopsonSupportBot's original preprocess_input (lowercase,
+strip special characters, nltk word_tokenize, stopword removal,
+lemmatization, property term mapping) without the full Treebank regex
+cascade. Punkt is only consulted for a period after a likely abbreviation,
+initial or number, where the break depends on its trained data. Check
+parity against the original implementation with:
+
+    python text_normalizer.py --check-parity
+"""
+import re
+import sys
+import string
+
+# Part of the model fingerprint: bump whenever normalize() output changes, so
+# pipelines trained on the old output are retrained instead of reloaded
+NORMALIZER_VERSION = 2
+
+# Characters kept by the original cleaning regex [^\w\s?.!,]
+_CLEAN_RE = re.compile(r'[^\w\s?.!,]')
+_ASCII_DELETE = str.maketrans('', '', ''.join(
+    c for c in map(chr, range(128)) if _CLEAN_RE.match(c)
+))
+
+# The Treebank rules that can still fire once text only holds \w, whitespace and ?.!,
+# (see nltk.tokenize.destructive.NLTKWordTokenizer), applied in the same order.
+_FINAL_PERIOD_RE = re.compile(r'([^\.])(\.)\s*$')
+_COMMA_RE = re.compile(r'(,)([^\d])')
+_COMMA_END_RE = re.compile(r'(,)$')
+_ELLIPSIS_RE = re.compile(r'\.{2,}')
+_QUESTION_EXCLAIM_RE = re.compile(r'[?!]')
+# MacIntyre contractions without apostrophes: cannot, gimme, gonna, gotta, lemme, wanna
+_CONTRACTIONS_RE = re.compile(
+    r'(?i)\b(?:(can)(not)\b|(gim)(me)\b|(gon)(na)\b|(got)(ta)\b|(lem)(me)\b|(wan)(na)(?=\s))'
+)
+
+# Sentence boundary candidates: a run of .?! followed by whitespace and more text
+_BOUNDARY_RE = re.compile(r'([.?!]+)\s+(?=\S)')
+_NUMBER_RE = re.compile(r'^-?[\.,]?\d[\d,\.-]*$')
+
+# Common entries of Punkt's English abbreviation list
+ABBREVIATIONS = frozenset([
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'inc', 'ltd', 'co',
+    'corp', 'no', 'e.g', 'i.e', 'u.s', 'u.k', 'a.m', 'p.m', 'jan', 'feb', 'mar',
+    'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec', 'mt', 'ft',
+    'sq', 'approx', 'dept', 'est', 'gen', 'gov', 'rd', 'ave', 'blvd'
+])
+
+
+def _contraction_split(m):
+    return ' ' + ' '.join(g for g in m.groups() if g) + ' '
+
+
+def _breaks_after(prefix, punct):
+    """Whether Punkt would end a sentence at punct preceded by prefix, or None if that
+    depends on Punkt's trained abbreviation data"""
+    if '?' in punct or '!' in punct:
+        return True
+    if len(punct) > 1:
+        # Ellipsis followed by lowercase text continues the sentence
+        return False
+    word = prefix.rsplit(None, 1)[-1] if prefix.strip() else ''
+    # Abbreviations, initials and numbers followed by lowercase words are
+    # judged from Punkt's parameters, which this list only approximates
+    if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()) or _NUMBER_RE.match(word):
+        return None
+    return True
+
+
+def split_sentences(text, unsure=False):
+    """Approximate Punkt sentence segmentation for lowercased, cleaned text.
+
+    unsure decides a period after a likely abbreviation, initial or number:
+    False continues the sentence (Punkt's usual call), None returns None
+    so the caller can ask Punkt itself.
+    """
+    sentences = []
+    start = 0
+    for m in _BOUNDARY_RE.finditer(text):
+        breaks = _breaks_after(text[start:m.start(1)], m.group(1))
+        if breaks is None:
+            if unsure is None:
+                return None
+            breaks = unsure
+        if breaks:
+            sentences.append(text[start:m.end(1)])
+            start = m.end()
+    sentences.append(text[start:])
+    return [s for s in sentences if s.strip()]
+
+
+_punkt_missing = False
+
+
+def _punkt_sentences(text):
+    """nltk.sent_tokenize(text), or None when Punkt's data is not installed"""
+    global _punkt_missing
+    if _punkt_missing:
+        return None
+    from nltk.tokenize import sent_tokenize
+    try:
+        return sent_tokenize(text)
+    except LookupError:
+        _punkt_missing = True
+        return None
+
+
+def tokenize_sentence(sentence):
+    """NLTKWordTokenizer.tokenize restricted to cleaned text"""
+    sentence = _FINAL_PERIOD_RE.sub(r'\1 \2 ', sentence)
+    if ',' in sentence:
+        sentence = _COMMA_RE.sub(r' \1 \2', sentence)
+        sentence = _COMMA_END_RE.sub(r' \1 ', sentence)
+    if '..' in sentence:
+        sentence = _ELLIPSIS_RE.sub(r' \g<0> ', sentence)
+        sentence = _FINAL_PERIOD_RE.sub(r'\1 \2 ', sentence)
+    sentence = _QUESTION_EXCLAIM_RE.sub(r' \g<0> ', sentence)
+    sentence = _CONTRACTIONS_RE.sub(_contraction_split, ' ' + sentence + ' ')
+    return sentence.split()
+
+
+def tokenize(text):
+    """Regex replacement for nltk word_tokenize on cleaned text"""
+    if not any(c in text for c in '.?!'):
+        return tokenize_sentence(text)
+    sentences = split_sentences(text, unsure=None)
+    if sentences is None:
+        sentences = _punkt_sentences(text) or split_sentences(text)
+    tokens = []
+    for sentence in sentences:
+        tokens.extend(tokenize_sentence(sentence))
+    return tokens
+
+
+def clean(text):
+    """Lowercase and strip special characters, keeping ?.!,"""
+    text = text.lower()
+    if text.isascii():
+        return text.translate(_ASCII_DELETE)
+    return _CLEAN_RE.sub('', text)
+
+
+class TextNormalizer:
+    """Normalizes user input for pattern matching and the ML pipeline"""
+
+    def __init__(self, stop_words, lemmatizer, property_terms):
+        self.stop_words = frozenset(stop_words)
+        self.lemmatizer = lemmatizer
+        self.property_terms = dict(property_terms)
+
+    def normalize(self, text):
+        """Normalize one input (same output as the original preprocess_input)"""
+        if not text:
+            return ""
+
+        text = clean(text)
+
+        # Tokenization and lemmatization
+        if self.lemmatizer:
+            stop_words = self.stop_words
+            lemmatize = self.lemmatizer.lemmatize
+            tokens = [lemmatize(token) for token in tokenize(text) if token not in stop_words]
+        else:
+            tokens = text.split()
+
+        # Property term normalization
+        terms = self.property_terms
+        return ' '.join([terms.get(token, token) for token in tokens])
+
+    def normalize_many(self, texts):
+        """Normalize a batch of inputs"""
+        return [self.normalize(text) for text in texts]
+
+
+def legacy_preprocess(text, stop_words, lemmatizer, property_terms):
+    """The original preprocess_input, kept for parity checks"""
+    from nltk.tokenize import word_tokenize
+
+    if not text:
+        return ""
+    text = text.lower()
+    text = re.sub(r'[^\w\s?.!,]', '', text)
+    if lemmatizer:
+        tokens = word_tokenize(text)
+        tokens = [lemmatizer.lemmatize(token) for token in tokens
+                  if token not in stop_words]
+    else:
+        tokens = text.split()
+    return ' '.join(property_terms.get(token, token) for token in tokens)
+
+
+def parity_inputs(bot):
+    """Training questions plus variants exercising punctuation handling"""
+    inputs = []
+    for question, _ in bot.train_data:
+        inputs.append(question)
+        inputs.append(question.upper())
+        inputs.append(question.rstrip('?') + '.')
+        inputs.append(question + '!! Thanks, ' + question.lower())
+        inputs.append(question + '... ' + string.punctuation)
+    return inputs
+
+
+def check_parity(bot=None):
+    """Compare TextNormalizer with the original preprocessing; return mismatches"""
+    if bot is None:
+        from nextopson_bot import NextopsonSupportBot
+        bot = NextopsonSupportBot(load_model=False)
+    normalizer = TextNormalizer(bot.stop_words, bot.lemmatizer, bot.property_terms)
+    mismatches = []
+    for text in parity_inputs(bot):
+        expected = legacy_preprocess(text, bot.stop_words, bot.lemmatizer, bot.property_terms)
+        actual = normalizer.normalize(text)
+        if actual != expected:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+
+if __name__ == '__main__':
+    if '--check-parity' not in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    mismatches = check_parity()
+    for text, expected, actual in mismatches:
+        print(f"MISMATCH {text!r}\n  expected: {expected!r}\n  actual:   {actual!r}")
+    print(f"{len(mismatches)} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,39 @@
+"""Train the Nextopson support model and write it to the artifact store.
+
+Serving processes load the artifact written here instead of retraining
+on startup:
+
+    python train_model.py [--model-dir DIR] [--force]
+"""
+import argparse
+import logging
+import sys
+
+from model_store import ModelStore
+from nextopson_bot import NextopsonSupportBot
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the Nextopson support model')
+    parser.add_argument('--model-dir', help='Artifact directory (default: NEXTOPSON_MODEL_DIR or ./model_artifacts)')
+    parser.add_argument('--force', action='store_true', help='Retrain even if a matching artifact exists')
+    args = parser.parse_args(argv)
+
+    store = ModelStore(args.model_dir)
+    bot = NextopsonSupportBot(model_store=store, load_model=False)
+    key = bot.model_key()
+
+    if store.exists(key) and not args.force:
+        logger.info(f"Artifact {key[:12]} is up to date, nothing to do")
+        return 0
+
+    bot.train_model()
+    path = bot.save_model()
+    logger.info(f"Model {key[:12]} written to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())